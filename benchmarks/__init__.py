@@ -0,0 +1 @@
+"""Offline benchmarks of the agent, running against local fakes (no provider or network needed)."""
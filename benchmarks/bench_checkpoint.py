@@ -0,0 +1,140 @@
+"""Benchmark of the checkpoint write latency and size as a run grows.
+
+Runs a long multi-cycle task against the scripted model with each checkpointer, timing
+every checkpoint write and tracking the stored bytes per checkpoint:
+
+- `sqlite_compact`: `SqliteCheckpointSaver` with the msgpack + zlib serializer,
+- `sqlite_plain`: the same saver with the default LangGraph serializer (no compression),
+- `memory`: the LangGraph in-memory saver (no persistence, latency baseline).
+
+The stored bytes are compared with the size of a full snapshot of the state at each
+checkpoint, which is what a saver writing whole snapshots would store.
+
+Usage:
+    python -m benchmarks.bench_checkpoint --cycles 30
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.common import install_fakes, percentiles
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from react_agent.checkpoint import STATE_TYPES, SqliteCheckpointSaver
+from react_agent.fake import ScriptedChatModel
+from react_agent.graph import workflow
+
+
+def build_checkpointers(directory: Path) -> Dict[str, BaseCheckpointSaver]:
+    """Build the checkpointers to compare."""
+
+    return {
+        "sqlite_compact": SqliteCheckpointSaver(str(directory / "compact.db")),
+        "sqlite_plain": SqliteCheckpointSaver(
+            str(directory / "plain.db"),
+            serde=JsonPlusSerializer(allowed_msgpack_modules=STATE_TYPES),
+        ),
+        "memory": InMemorySaver(),
+    }
+
+
+async def run_checkpointer(
+    checkpointer: BaseCheckpointSaver, args: argparse.Namespace
+) -> Dict[str, Any]:
+    """Run a task with a checkpointer, timing and sizing every checkpoint write."""
+
+    model = ScriptedChatModel(
+        n_steps=args.steps, n_cycles=args.cycles, result_size=args.result_size, seed=args.seed
+    )
+    configurable = install_fakes(model, json.loads(args.configurable))
+    graph = workflow.compile(checkpointer=checkpointer)
+
+    write_latencies: List[float] = []
+    put = checkpointer.aput
+
+    async def timed_put(*put_args: Any, **put_kwargs: Any) -> Any:
+        start = time.perf_counter()
+        result = await put(*put_args, **put_kwargs)
+        write_latencies.append(time.perf_counter() - start)
+        return result
+
+    checkpointer.aput = timed_put
+    config = {
+        "configurable": {**configurable, "thread_id": "bench-checkpoint"},
+        "recursion_limit": 10_000,
+    }
+    start = time.perf_counter()
+    await graph.ainvoke({"messages": [HumanMessage(content="Benchmark task")]}, config)
+    elapsed = time.perf_counter() - start
+
+    report: Dict[str, Any] = {
+        "checkpoints": len(write_latencies),
+        "run_seconds": elapsed,
+        "write_latency_ms": percentiles([latency * 1e3 for latency in write_latencies]),
+        # Mean write latency over each quarter of the run, to see how it grows with the state
+        "write_latency_ms_by_quarter": [
+            sum(quarter) / len(quarter) * 1e3
+            for i in range(4)
+            if (quarter := write_latencies[i * len(write_latencies) // 4 : (i + 1) * len(write_latencies) // 4])
+        ],
+    }
+    if isinstance(checkpointer, SqliteCheckpointSaver):
+        sizes = checkpointer.size()
+        stored = sizes["checkpoints_bytes"] + sizes["blobs_bytes"] + sizes["writes_bytes"]
+        report["stored_bytes"] = stored
+        report["stored_bytes_per_checkpoint"] = stored / max(len(write_latencies), 1)
+        report["file_bytes"] = sum(
+            path.stat().st_size
+            for path in (Path(checkpointer.path), Path(f"{checkpointer.path}-wal"))
+            if path.exists()
+        )
+
+    # Full snapshots of the state, for comparison
+    serializer = JsonPlusSerializer()
+    snapshot_sizes = [
+        len(serializer.dumps_typed(snapshot.checkpoint["channel_values"])[1])
+        async for snapshot in checkpointer.alist(config)
+    ]
+    report["full_snapshot_bytes"] = sum(snapshot_sizes)
+    report["last_snapshot_bytes"] = snapshot_sizes[0] if snapshot_sizes else 0
+    return report
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the benchmark and return its report."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        checkpointers = build_checkpointers(Path(directory))
+        report = {}
+        for name, checkpointer in checkpointers.items():
+            report[name] = await run_checkpointer(checkpointer, args)
+            if isinstance(checkpointer, SqliteCheckpointSaver):
+                checkpointer.close()
+    return report
+
+
+def main() -> None:
+    """Parse the arguments, run the benchmark and print its report as JSON."""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--steps", type=int, default=3, help="Steps of each plan")
+    parser.add_argument("--cycles", type=int, default=30, help="Completed steps before finishing the task")
+    parser.add_argument("--result-size", type=int, default=400, help="Characters of each step result")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the injected randomness")
+    parser.add_argument(
+        "--configurable", default="{}", help="JSON of extra configuration values (e.g. '{\"message_retention\": \"step\"}')"
+    )
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run_benchmark(args)), indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""End-to-end benchmark of the compiled graph against a scripted model and offline search.
+
+Reports the per-node latency, the number of LLM calls and retries, the size of the
+checkpoints and the throughput when many tasks run concurrently. With `--fallback`,
+the scripted model fails over to a second (healthy) scripted model, reporting the
+health of both and the cost and latency of each phase. The retries of the failed steps
+and of the failed LLM calls are reported too (see the retry options of the configuration).
+
+Usage:
+    python -m benchmarks.bench_graph --tasks 20 --concurrency 10 --latency 0.05
+    python -m benchmarks.bench_graph --error-rate 0.3 --fallback
+    python -m benchmarks.bench_graph --check-failure-rate 0.5 --configurable '{"retry_mode": "patch"}'
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from benchmarks.common import BENCH_MODEL, collect_spans, install_fakes, percentiles
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from react_agent.fake import ScriptedChatModel
+from react_agent.deadlines import LLM_LATENCIES
+from react_agent.metrics import (
+    CHECK_TIER_STATS,
+    PHASE_COSTS,
+    PROMPT_CACHE_STATS,
+    RETRY_STATS,
+    TOOL_METRICS,
+)
+from react_agent.parsing import PARSE_STATS
+from react_agent.graph import workflow
+from react_agent.routing import PROVIDER_HEALTH
+from react_agent.utils import MODEL_REGISTRY
+
+FALLBACK_MODEL = "fake/fallback"
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the benchmark and return its report."""
+
+    model = ScriptedChatModel(
+        n_steps=args.steps,
+        n_cycles=args.cycles,
+        latency=args.latency,
+        jitter=args.jitter,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        check_failure_rate=args.check_failure_rate,
+        malformed_rate=args.malformed_rate,
+        error_rate=args.error_rate,
+        on_topic_rate=args.on_topic_rate,
+        searches_per_do=args.searches,
+        seed=args.seed,
+    )
+    configurable = install_fakes(model, json.loads(args.configurable))
+    if args.fallback:
+        fallback = ScriptedChatModel(**{**model.model_dump(), "error_rate": 0.0})
+        MODEL_REGISTRY.get(FALLBACK_MODEL, factory=lambda: fallback)
+        configurable = {"model_fallbacks": {BENCH_MODEL: [FALLBACK_MODEL]}, **configurable}
+    collector = collect_spans()
+    checkpointer = MemorySaver()
+    graph = workflow.compile(checkpointer=checkpointer)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def _run_task(idx: int) -> Dict[str, Any]:
+        config = {
+            "configurable": {**configurable, "thread_id": f"bench-{idx}"},
+            "recursion_limit": 500,
+        }
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                state = await graph.ainvoke(
+                    {"messages": [HumanMessage(content=f"Benchmark task {idx}")]}, config
+                )
+            except Exception as e:
+                state = {"error": repr(e)}
+            latency = time.perf_counter() - start
+
+        checkpoint_sizes = [
+            len(checkpointer.serde.dumps_typed(checkpoint.checkpoint)[1])
+            for checkpoint in checkpointer.list(config)
+        ]
+        return {
+            "latency": latency,
+            "completed": state.get("final_answer") is not None,
+            "error": state.get("error"),
+            "n_checkpoints": len(checkpoint_sizes),
+            "max_checkpoint_size": max(checkpoint_sizes, default=0),
+        }
+
+    start = time.perf_counter()
+    tasks = await asyncio.gather(*(_run_task(idx) for idx in range(args.tasks)))
+    elapsed = time.perf_counter() - start
+
+    node_latencies: Dict[str, List[float]] = defaultdict(list)
+    llm_calls = 0
+    llm_calls_by_model: Dict[str, int] = defaultdict(int)
+    for span in collector.spans:
+        if span.kind == "node":
+            node_latencies[span.name].append(span.duration)
+        elif span.kind == "llm":
+            llm_calls += 1
+            llm_calls_by_model[span.attributes.get("model")] += 1
+
+    return {
+        "tasks": args.tasks,
+        "completed": sum(task["completed"] for task in tasks),
+        "errors": [task["error"] for task in tasks if task["error"]],
+        "concurrency": args.concurrency,
+        "elapsed_s": elapsed,
+        "throughput_tasks_per_s": args.tasks / elapsed,
+        "task_latency_s": percentiles([task["latency"] for task in tasks]),
+        "node_latency_s": {
+            name: percentiles(values) for name, values in sorted(node_latencies.items())
+        },
+        "llm_calls": llm_calls,
+        "llm_calls_per_task": llm_calls / args.tasks,
+        "llm_calls_by_phase": dict(model.calls),
+        "llm_calls_by_model": dict(llm_calls_by_model),
+        "retries": model.injected["failed_checks"],
+        "injected": dict(model.injected),
+        "parse_stats": PARSE_STATS.get(),
+        "prompt_cache": PROMPT_CACHE_STATS.get(),
+        "tools": TOOL_METRICS.get(),
+        "check_tiers": CHECK_TIER_STATS.get(),
+        "llm_latency": LLM_LATENCIES.get(),
+        "phase_costs": PHASE_COSTS.get(),
+        "retry_stats": RETRY_STATS.get(),
+        "model_health": PROVIDER_HEALTH.get(),
+        "checkpoints_per_task": percentiles([task["n_checkpoints"] for task in tasks]),
+        "max_checkpoint_size_bytes": percentiles([task["max_checkpoint_size"] for task in tasks]),
+    }
+
+
+def main() -> None:
+    """Parse the arguments, run the benchmark and print its report as JSON."""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--tasks", type=int, default=10, help="Number of tasks to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="Tasks running at the same time")
+    parser.add_argument("--steps", type=int, default=3, help="Steps of each plan")
+    parser.add_argument("--cycles", type=int, default=3, help="Completed steps before finishing a task")
+    parser.add_argument("--searches", type=int, default=1, help="Web searches requested by each do call")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of latency of each LLM call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random extra latency")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Probability of a slow LLM call")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="Extra seconds of the slow LLM calls")
+    parser.add_argument("--check-failure-rate", type=float, default=0.0, help="Probability of failing a check")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Probability of a malformed output")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a transient LLM error")
+    parser.add_argument(
+        "--fallback", action="store_true", help="Fail over to a second scripted model (without errors)"
+    )
+    parser.add_argument(
+        "--on-topic-rate", type=float, default=1.0, help="Probability of a step result restating its expected outcome"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the injected randomness")
+    parser.add_argument(
+        "--configurable", default="{}", help="JSON of extra configuration values (e.g. '{\"planning_mode\": \"incremental\"}')"
+    )
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run_benchmark(args)), indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
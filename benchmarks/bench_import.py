@@ -0,0 +1,115 @@
+"""Benchmark of the import time of the agent entry points (cold start).
+
+Each entry point is imported in a fresh interpreter with `python -X importtime`, and
+the modules it loads beyond the interpreter startup are reported: their number, their
+total import time, the slowest ones, and whether any of the heavy modules (LangGraph,
+the provider integrations, NumPy, the phases) was loaded eagerly. Building the graph
+(on first access of `graph`) is measured too, for comparison.
+
+With `--max-ms` or `--check`, the process exits with an error when an entry point is
+over the time budget or loads a heavy module, so it can guard against startup
+regressions (e.g. in CI).
+
+Usage:
+    python -m benchmarks.bench_import --runs 5
+    python -m benchmarks.bench_import --check --max-ms 150
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Modules that importing an entry point must not load (they are deferred until first use)
+HEAVY_MODULES = (
+    "langgraph.graph",
+    "langchain.chat_models",
+    "numpy",
+    "react_agent.actions",
+    "langchain_core.output_parsers",
+)
+
+ENTRY_POINTS = {
+    "import react_agent": "import react_agent",
+    "import react_agent.graph": "import react_agent.graph",
+    "build graph": "from react_agent.graph import build_graph; build_graph()",
+}
+
+
+def import_times(statement: str) -> Dict[str, Tuple[int, int]]:
+    """Run a statement in a fresh interpreter and return the (self, cumulative) µs of each imported module."""
+
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(ROOT / "src"), str(ROOT)])}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        env=env,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(statement: str, baseline: Dict[str, Tuple[int, int]], runs: int) -> Dict[str, Any]:
+    """Measure the modules loaded by a statement beyond the interpreter startup."""
+
+    totals: List[float] = []
+    modules: Dict[str, List[int]] = {}
+    for _ in range(runs):
+        times = import_times(statement)
+        loaded = {name: value for name, value in times.items() if name not in baseline}
+        totals.append(sum(self_us for self_us, _ in loaded.values()) / 1000)
+        for name, (self_us, _) in loaded.items():
+            modules.setdefault(name, []).append(self_us)
+    slowest = sorted(modules, key=lambda name: -statistics.median(modules[name]))
+    return {
+        "total_ms": statistics.median(totals),
+        "min_ms": min(totals),
+        "modules": len(modules),
+        "slowest_ms": {name: statistics.median(modules[name]) / 1000 for name in slowest[:10]},
+        "heavy_modules": [name for name in HEAVY_MODULES if name in modules],
+    }
+
+
+def main() -> None:
+    """Parse the arguments, run the benchmark and print its report as JSON."""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--max-ms", type=float, default=None, help="Import time budget of the entry points")
+    parser.add_argument(
+        "--check", action="store_true", help="Fail if importing an entry point loads a heavy module"
+    )
+    args = parser.parse_args()
+
+    baseline = import_times("pass")
+    report = {name: measure(statement, baseline, args.runs) for name, statement in ENTRY_POINTS.items()}
+    print(json.dumps(report, indent=2))  # noqa: T201
+
+    failures = []
+    for name, stats in report.items():
+        if name.startswith("build"):
+            continue
+        if args.max_ms is not None and stats["total_ms"] > args.max_ms:
+            failures.append(f"'{name}' took {stats['total_ms']:.1f}ms (budget: {args.max_ms:g}ms)")
+        if args.check and stats["heavy_modules"]:
+            failures.append(f"'{name}' loaded {', '.join(stats['heavy_modules'])}")
+    if failures:
+        sys.exit("Startup regression: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Benchmark of the indexing and query latency of the retrieval memory as it grows.
+
+Synthetic step results are indexed step by step (a batch of chunks per step) up to
+the largest size, and at each checkpoint size the memory is queried with step-like
+queries. Both the BM25-only memory and the hybrid one (BM25 plus the NumPy vector
+index, with deterministic fake embeddings) are measured.
+
+The characters handed to a phase are also compared: the top-K retrieved chunks against
+the whole results concatenated, which is what the phases receive without the memory.
+
+Usage:
+    python -m benchmarks.bench_memory --sizes 1000 2500 5000 10000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import percentiles
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from react_agent.memory import MemoryChunk, RetrievalMemory, format_chunks
+
+
+def make_vocabulary(rng: random.Random, size: int = 5000) -> List[str]:
+    """Return random words (drawn with Zipf-like weights, the earlier words more often)."""
+
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(3, 9))) for _ in range(size)]
+
+
+def make_chunk(
+    rng: random.Random, vocabulary: List[str], weights: List[float], step_idx: int
+) -> MemoryChunk:
+    """Return a synthetic chunk of the results of a step."""
+
+    words = rng.choices(vocabulary, weights=weights, k=rng.randint(60, 120))
+    return MemoryChunk(
+        text=" ".join(words),
+        step=f"Step {step_idx}: {' '.join(rng.sample(vocabulary[:500], 4))}",
+        expected_outcome="Synthetic results",
+    )
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the benchmark and return its report."""
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    queries = [
+        " ".join(rng.choices(vocabulary, weights=weights, k=12)) for _ in range(args.queries)
+    ]
+    sizes = sorted(args.sizes)
+
+    report: Dict[str, Any] = {}
+    for name, embeddings in (
+        ("bm25", None),
+        ("hybrid", DeterministicFakeEmbedding(size=args.dimensions)),
+    ):
+        chunk_rng = random.Random(args.seed)
+        memory = RetrievalMemory(embeddings=embeddings)
+        all_results: List[str] = []
+        results: Dict[str, Any] = {}
+        index_latencies: List[float] = []
+        step_idx = 0
+        for size in sizes:
+            while len(memory) < size:
+                step_idx += 1
+                chunks = [
+                    make_chunk(chunk_rng, vocabulary, weights, step_idx)
+                    for _ in range(min(args.chunks_per_step, size - len(memory)))
+                ]
+                all_results.extend(chunk.text for chunk in chunks)
+                start = time.perf_counter()
+                await memory.add(chunks)
+                index_latencies.append((time.perf_counter() - start) / len(chunks))
+
+            query_latencies = []
+            retrieved_chars = []
+            for query in queries:
+                start = time.perf_counter()
+                chunks = await memory.search(query, args.top_k)
+                query_latencies.append(time.perf_counter() - start)
+                retrieved_chars.append(len(format_chunks(chunks)))
+            results[str(size)] = {
+                "index_latency_per_chunk_ms": percentiles(
+                    [latency * 1000 for latency in index_latencies]
+                ),
+                "query_latency_ms": percentiles([latency * 1000 for latency in query_latencies]),
+                "retrieved_chars": percentiles(retrieved_chars),
+                "concatenated_results_chars": sum(len(text) for text in all_results),
+            }
+            index_latencies = []
+        report[name] = results
+    return report
+
+
+def main() -> None:
+    """Parse the arguments, run the benchmark and print its report as JSON."""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 2500, 5000, 10000], help="Numbers of chunks measured"
+    )
+    parser.add_argument("--chunks-per-step", type=int, default=10, help="Chunks indexed at once (per step)")
+    parser.add_argument("--queries", type=int, default=100, help="Queries at each size")
+    parser.add_argument("--top-k", type=int, default=5, help="Chunks retrieved by each query")
+    parser.add_argument("--dimensions", type=int, default=384, help="Dimensions of the fake embeddings")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpus")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run_benchmark(args)), indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Microbenchmark of the per-call cost of rendering the phase prompts.
+
+Compares building the templates on every call (`PromptTemplate` and `ChatPromptTemplate`,
+with the format instructions serialized from the Pydantic schema each time) against
+rendering the prompts precompiled by `react_agent.prompting`.
+
+Usage:
+    python -m benchmarks.bench_prompts --iterations 2000
+"""
+
+import argparse
+import json
+import timeit
+from datetime import datetime, timezone
+
+from benchmarks.common import ROOT  # noqa: F401  (sets up the import paths)
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+
+from react_agent.actions import get_phase_prompt
+from react_agent.configuration import SYSTEM_PROMPT
+from react_agent.prompting import compile_prompt
+from src.prompts import DO_ACTION_PROMPT
+from src.structs import DoingOutput
+
+
+SYSTEM_VARIABLES = {
+    "task_description": "Do a research report of Vision Transformers",
+    "phase": "do",
+    "context": "Sections proposed: introduction, architecture, results. " * 20,
+    "previous_feedback": "The section lacks references. " * 5,
+    "current_action": "do",
+}
+DO_VARIABLES = {
+    "current_step": "Write the architecture section",
+    "step_details": "Describe patch embeddings, the encoder and the classification head.",
+    "step_expected_outcome": "A complete architecture section.",
+    "context": SYSTEM_VARIABLES["context"],
+    "previous_feedback": SYSTEM_VARIABLES["previous_feedback"],
+}
+
+
+def render_per_call() -> list:
+    """Render the do prompt the way it was done before precompiling the prompts."""
+
+    parser = PydanticOutputParser(pydantic_object=DoingOutput)
+    prompt = PromptTemplate(
+        template=DO_ACTION_PROMPT,
+        input_variables=list(DO_VARIABLES) + ["format_instructions"],
+    )
+    system_prompt = SYSTEM_PROMPT.format(
+        **SYSTEM_VARIABLES,
+        system_time=datetime.now(tz=timezone.utc).isoformat(),
+        available_tools="web search",
+    )
+    chat_prompt = ChatPromptTemplate.from_messages(
+        [("system", system_prompt), ("human", prompt.template)]
+    )
+    return chat_prompt.invoke(
+        {**DO_VARIABLES, "format_instructions": parser.get_format_instructions()}
+    ).to_messages()
+
+
+def render_precompiled() -> list:
+    """Render the do prompt with the precompiled templates."""
+
+    system_prompt = compile_prompt(SYSTEM_PROMPT, available_tools="web search").render(
+        {**SYSTEM_VARIABLES, "system_time": datetime.now(tz=timezone.utc).isoformat()}
+    )
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=get_phase_prompt("do").render(DO_VARIABLES)),
+    ]
+
+
+def main() -> None:
+    """Time both renderings and print the per-call cost as JSON."""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=2000, help="Renders per measurement")
+    args = parser.parse_args()
+
+    report = {}
+    for name, render in (("per_call", render_per_call), ("precompiled", render_precompiled)):
+        render()
+        seconds = min(timeit.repeat(render, number=args.iterations, repeat=3))
+        report[f"{name}_us"] = seconds / args.iterations * 1e6
+    report["speedup"] = report["per_call_us"] / report["precompiled_us"]
+    print(json.dumps(report, indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Benchmark of the state size and per-step copy cost over a long task.
+
+Runs a single many-cycle task against the scripted model and walks its checkpoints,
+reporting for each cycle:
+
+- the serialized size of the whole state, and of its bookkeeping channels (everything
+  but the messages and the task context and results, whose growth is governed by the
+  message retention policy and the act phase),
+- the size of the step history (`processed_step_ids` and `step_records`), and the size
+  it would have with the former `already_processed_steps` layout (a list of full
+  `PlanningStep` models, extended with the current step twice at every check),
+  replayed from the same run,
+- the bytes and time of serializing the bookkeeping channels written at each
+  super-step, and the time of building the `State` handed to the nodes.
+
+Usage:
+    python -m benchmarks.bench_state --cycles 50
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from benchmarks.common import install_fakes, percentiles
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from react_agent.checkpoint import STATE_TYPES
+from react_agent.fake import ScriptedChatModel
+from react_agent.graph import workflow
+from react_agent.state import State
+
+HISTORY_CHANNELS = ("processed_step_ids", "step_records")
+CONTENT_CHANNELS = ("messages", "context", "results")
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the benchmark and return its report."""
+
+    model = ScriptedChatModel(
+        n_steps=args.steps,
+        n_cycles=args.cycles,
+        check_failure_rate=args.check_failure_rate,
+        seed=args.seed,
+    )
+    configurable = install_fakes(model, json.loads(args.configurable))
+    checkpointer = InMemorySaver()
+    graph = workflow.compile(checkpointer=checkpointer)
+    config = {
+        "configurable": {**configurable, "thread_id": "bench-state"},
+        "recursion_limit": 20 * args.cycles + 50,
+    }
+    await graph.ainvoke({"messages": [HumanMessage(content="Long benchmark task")]}, config)
+
+    serde = JsonPlusSerializer(allowed_msgpack_modules=STATE_TYPES)
+    state_fields = set(State.__dataclass_fields__)
+    checkpoints = list(reversed(list(checkpointer.list(config))))
+
+    cycle = 0
+    legacy_history: List[Any] = []
+    previous_versions: Dict[str, Any] = {}
+    by_cycle: Dict[int, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+    for checkpoint_tuple in checkpoints:
+        checkpoint = checkpoint_tuple.checkpoint
+        values = checkpoint["channel_values"]
+        written = [
+            channel
+            for channel, version in checkpoint["channel_versions"].items()
+            if previous_versions.get(channel) != version and channel in values
+        ]
+        bookkeeping = [channel for channel in values if channel not in CONTENT_CHANNELS]
+        previous_versions = dict(checkpoint["channel_versions"])
+        if "feedback" in written and values.get("next_steps"):
+            # The former check phase extended the history with the current step twice
+            legacy_history = legacy_history + [values["next_steps"][0]] * 2
+        if "current_status" in written:
+            cycle += 1
+
+        start = time.perf_counter()
+        written_bytes = sum(
+            len(serde.dumps_typed(values[channel])[1]) for channel in written if channel in bookkeeping
+        )
+        serialize_time = time.perf_counter() - start
+        start = time.perf_counter()
+        State(**{name: value for name, value in values.items() if name in state_fields})
+        build_time = time.perf_counter() - start
+
+        stats = by_cycle[cycle]
+        stats["state_bytes"].append(sum(len(serde.dumps_typed(value)[1]) for value in values.values()))
+        stats["bookkeeping_bytes"].append(
+            sum(len(serde.dumps_typed(values[channel])[1]) for channel in bookkeeping)
+        )
+        stats["history_bytes"].append(
+            sum(len(serde.dumps_typed(values[channel])[1]) for channel in HISTORY_CHANNELS if channel in values)
+        )
+        stats["legacy_history_bytes"].append(len(serde.dumps_typed(legacy_history)[1]))
+        stats["written_bytes"].append(written_bytes)
+        stats["serialize_ms"].append(serialize_time * 1000)
+        stats["build_state_ms"].append(build_time * 1000)
+
+    reported = sorted({1, *range(args.report_every, cycle + 1, args.report_every), cycle})
+    return {
+        "cycles": cycle,
+        "checkpoints": len(checkpoints),
+        "by_cycle": {
+            str(idx): {
+                "state_bytes": max(by_cycle[idx]["state_bytes"]),
+                "bookkeeping_bytes": max(by_cycle[idx]["bookkeeping_bytes"]),
+                "history_bytes": max(by_cycle[idx]["history_bytes"]),
+                "legacy_history_bytes": max(by_cycle[idx]["legacy_history_bytes"]),
+                "written_bytes_per_step": percentiles(by_cycle[idx]["written_bytes"]),
+                "serialize_ms_per_step": percentiles(by_cycle[idx]["serialize_ms"]),
+                "build_state_ms": percentiles(by_cycle[idx]["build_state_ms"]),
+            }
+            for idx in reported
+            if idx in by_cycle
+        },
+    }
+
+
+def main() -> None:
+    """Parse the arguments, run the benchmark and print its report as JSON."""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--cycles", type=int, default=50, help="Completed steps before finishing the task")
+    parser.add_argument("--steps", type=int, default=3, help="Steps of each plan")
+    parser.add_argument("--check-failure-rate", type=float, default=0.0, help="Probability of failing a check")
+    parser.add_argument("--report-every", type=int, default=10, help="Cycles between reported rows")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the injected randomness")
+    parser.add_argument(
+        "--configurable",
+        default='{"message_retention": "last_n"}',
+        help="JSON of extra configuration values",
+    )
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run_benchmark(args)), indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Shared helpers of the offline benchmarks."""
+
+import statistics
+import sys
+from logging import DEBUG, Handler, LogRecord
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+# Make both `react_agent` and `src.*` importable when running from the repository root
+ROOT = Path(__file__).resolve().parents[1]
+for path in (str(ROOT / "src"), str(ROOT)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from react_agent.configuration import Configuration  # noqa: E402
+from react_agent.fake import ScriptedChatModel, fake_search_results  # noqa: E402
+from react_agent.search_cache import get_search_cache  # noqa: E402
+from react_agent.utils import MODEL_REGISTRY  # noqa: E402
+from src.settings import tracer  # noqa: E402
+
+
+BENCH_MODEL = "fake/bench"
+
+
+class SpanCollector(Handler):
+    """Logging handler keeping the finished spans in memory."""
+
+    def __init__(self) -> None:
+        """Initialize an empty collector."""
+
+        super().__init__(level=DEBUG)
+        self.spans: List[Any] = []
+
+    def emit(self, record: LogRecord) -> None:
+        """Keep the span of the record."""
+
+        span = getattr(record, "span", None)
+        if span is not None:
+            self.spans.append(span)
+
+
+def collect_spans() -> SpanCollector:
+    """Enable tracing and collect the spans in memory (synchronously, to keep them in order)."""
+
+    collector = SpanCollector()
+    tracer.logger.setLevel(DEBUG)
+    tracer.logger.handlers = [collector]
+    return collector
+
+
+def install_fakes(model: ScriptedChatModel, configurable: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Serve the scripted model and offline search results to the graph.
+
+    Args:
+        model (ScriptedChatModel): The model answering every LLM call.
+        configurable (Dict[str, Any]): Extra configuration of the runs.
+
+    Returns:
+        Dict[str, Any]: The configurable values to run the graph with.
+    """
+
+    MODEL_REGISTRY.clear()
+    MODEL_REGISTRY.get(BENCH_MODEL, factory=lambda: model)
+    configurable = {"model": BENCH_MODEL, "search_cache": "offline", **configurable}
+    configuration = Configuration(**configurable)
+    search_cache = get_search_cache(configuration)
+    for idx in range(5):
+        query = f"query {idx}"
+        search_cache.cache.put(
+            search_cache.make_key(query, configuration.max_search_results),
+            fake_search_results(query),
+        )
+    return configurable
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    """Return the mean, p50, p95 and max of a series of values."""
+
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+    return {
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[int(0.50 * (len(ordered) - 1))],
+        "p95": ordered[int(0.95 * (len(ordered) - 1))],
+        "max": ordered[-1],
+    }
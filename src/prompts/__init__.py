@@ -4,3 +4,5 @@ from src.prompts.do import *
 from src.prompts.plan import *
 from src.prompts.system import *
 from src.prompts.final_answer import *
+from src.prompts.summarize import *
+from src.prompts.fix_output import *
@@ -30,6 +30,7 @@ Follow these instructions:
 - Be clear and direct, focusing on the immediate task status and its implications.
 - MAKE SURE YOU ARE EVALUATING THE TASK COMPLETION, NOT THE STEP. Think, is the current result of the main task answering the request of the task description?
 - Do not be over demanding when evaluating the status. Check within the next steps, some would be useful, but if none is needed mark it as complete.
+- Only flag that a new plan is needed if the context changed materially and the remaining planned steps are no longer valid.
 
 PLEASE, express your response as a JSON object. Not providing more information than requested, just provide the following JSON.
 {format_instructions}
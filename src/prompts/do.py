@@ -24,3 +24,25 @@ Ensure that:
 PLEASE, express your response as a JSON object. Not providing more information than requested, just provide the following JSON.
 {format_instructions}
 """
+
+
+DO_PATCH_PROMPT = """You are revising the result of a step that did not pass its review, which contributes to solving a larger task.
+The step of the plan: "{current_step}".
+
+Expected outcome of the step: "{step_expected_outcome}".
+
+Previous result of the step:
+"{previous_result}"
+
+Comments of the review: "{comments}"
+
+Suggestions of the review: "{suggestions}"
+
+Instead of rewriting the whole result, return only the edits addressing the review:
+- Each edit replaces an exact passage of the previous result (`find`) with its revision (`replace`).
+- An edit with an empty `find` appends its text to the end of the result.
+- Keep the edits minimal, leaving the rest of the result untouched.
+
+PLEASE, express your response as a JSON object. Not providing more information than requested, just provide the following JSON.
+{format_instructions}
+"""
@@ -0,0 +1,14 @@
+FIX_OUTPUT_PROMPT = """The following answer was expected to be a JSON object, but it could not be used:
+```
+{output}
+```
+
+The error found was:
+```
+{error}
+```
+
+Fix the answer so that it is a valid JSON object following the instructions below. Keep its content, only fixing what is needed.
+Not providing more information than requested, just provide the following JSON.
+{format_instructions}
+"""
@@ -20,6 +20,7 @@ Follow these instructions:
 - Avoid unnecessary steps, if just one step could be enough (and its not too complex) propose just one step.
 - Remember this is LLM-based. No images, videos or audios should be included.
 - DO NOT REPEAT STEPS ALREADY MADE.
+- Give each step a short unique id, and list in its dependencies the ids of the steps whose results it needs. Leave the dependencies empty for steps that can be executed independently (e.g. writing different sections of a report).
 
 Ensure that your plan addresses any challenges noted in the feedback and stays relevant to the current context.
 Also, make sure that the proposed steps are achievable by an LLM, and are not far fetched.
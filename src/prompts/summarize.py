@@ -0,0 +1,13 @@
+SUMMARIZE_FIELD_PROMPT = """You are excellent at condensing long texts without losing the information that matters.
+Summarize the following text, which is used as "{field}" by an autonomous agent working on the task "{task_description}".
+
+```
+{text}
+```
+
+Follow these instructions:
+- Keep every fact, figure, name and conclusion that is relevant to the task.
+- Keep the structure of the text (e.g. sections of a report) when possible.
+- The summary must not be longer than {max_tokens} tokens.
+- Only answer with the summary, without any introduction or comment.
+"""
@@ -2,8 +2,31 @@
 
 This module defines a custom reasoning and action agent graph.
 It invokes tools in a simple loop.
+
+The graph is built on first access of `graph`, keeping the import of the package light.
 """
 
-from react_agent.graph import graph
+import sys
+import types
+from typing import Any
 
 __all__ = ["graph"]
+
+
+class _Package(types.ModuleType):
+    """The package module, resolving `graph` to the compiled graph (not to its submodule)."""
+
+    @property
+    def graph(self) -> Any:
+        """Return the compiled agent graph, building it on first access."""
+
+        from react_agent.graph import graph
+
+        return graph
+
+    @graph.setter
+    def graph(self, module: types.ModuleType) -> None:
+        """Ignore the binding of the `react_agent.graph` submodule done by the import system."""
+
+
+sys.modules[__name__].__class__ = _Package
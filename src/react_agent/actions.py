@@ -1,44 +1,120 @@
-from ast import literal_eval
-from datetime import datetime, timezone
+import functools
 import json
-from typing import List, Literal, cast
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    cast,
+)
 
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AnyMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
 from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.messages import AIMessage
-from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import BaseModel
 
+from react_agent.budget import TOKEN_REPORTS, fit_to_budget
+from react_agent.checking import heuristic_check
 from react_agent.configuration import Configuration
-from react_agent.state import State
-from react_agent.tools import TOOLS
-from react_agent.utils import load_chat_model
+from react_agent.deadlines import PhaseTimeoutError, deadline_exceeded, timed_call
+from react_agent.llm_cache import get_response_cache
+from react_agent.memory import RETRIEVAL_MEMORIES, format_chunks
+from react_agent.metrics import (
+    CHECK_TIER_STATS,
+    PHASE_COSTS,
+    PROMPT_CACHE_STATS,
+    RETRY_STATS,
+    record_llm_call,
+)
+from react_agent.parsing import OutputParsingError, parse_output, repair_json
+from react_agent.prompting import (
+    CompiledPrompt,
+    compile_prompt,
+    format_system_time,
+    render_state_block,
+)
+from react_agent.ratelimit import throttle
+from react_agent.retention import apply_message_retention
+from react_agent.retry import PatchError, RetryPolicy, apply_patch
+from react_agent.scheduler import assign_step_ids, run_dag
+from react_agent.state import State, record_processed_steps
+from react_agent.tools import TOOLS, run_tool_calls
+from react_agent.utils import (
+    bind_task_id,
+    get_run_id,
+    load_routed_model,
+    stream_chat_model,
+)
 from src.prompts import (
-    PLAN_ACTION_PROMPT,
-    DO_ACTION_PROMPT,
-    CHECK_ACTION_PROMPT,
     ACT_ACTION_PROMPT,
+    CHECK_ACTION_PROMPT,
+    DO_ACTION_PROMPT,
+    DO_PATCH_PROMPT,
     FINAL_ANSWER_PROMPT,
+    PLAN_ACTION_PROMPT,
 )
-from src.settings import custom_logger
+from src.settings import custom_logger, tracer
 from src.structs import (
-    PlanningOutput,
-    DoingOutput,
-    CheckingOutput,
     ActingOutput,
+    CheckingOutput,
     DemingAction,
+    DoingOutput,
+    PatchOutput,
+    PlanningOutput,
+    PlanningStep,
 )
 
-
 logger = custom_logger("Actions")
 
-MAX_N_RETRIES = 3
 
+# Template and structured output of each phase
+PHASE_PROMPTS: Dict[str, Tuple[str, Optional[Type[BaseModel]]]] = {
+    "plan": (PLAN_ACTION_PROMPT, PlanningOutput),
+    "do": (DO_ACTION_PROMPT, DoingOutput),
+    "patch": (DO_PATCH_PROMPT, PatchOutput),
+    "check": (CHECK_ACTION_PROMPT, CheckingOutput),
+    "act": (ACT_ACTION_PROMPT, ActingOutput),
+    "final": (FINAL_ANSWER_PROMPT, None),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_phase_prompt(phase: str) -> CompiledPrompt:
+    """
+    Return the prompt of a phase, compiled on first use.
+
+    The format instructions of the phase are rendered from the JSON schema of its
+    structured output, so the Pydantic parsers are only built when a phase first runs.
+
+    Args:
+        phase (str): The phase ('plan', 'do', 'check', 'act' or 'final'), or 'patch' for the
+            patch retries of the do phase.
+
+    Returns:
+        CompiledPrompt: The compiled prompt of the phase.
+    """
 
-# Pydantic Output Parsers
-planning_parser = PydanticOutputParser(pydantic_object=PlanningOutput)
-doing_parser = PydanticOutputParser(pydantic_object=DoingOutput)
-checking_parser = PydanticOutputParser(pydantic_object=CheckingOutput)
-acting_parser = PydanticOutputParser(pydantic_object=ActingOutput)
+    template, output_schema = PHASE_PROMPTS[phase]
+    if output_schema is None:
+        return CompiledPrompt(template)
+    parser = PydanticOutputParser(pydantic_object=output_schema)
+    return CompiledPrompt(template, format_instructions=parser.get_format_instructions())
 
 
 def extract_json(content: str) -> str:
@@ -52,24 +128,177 @@ def extract_json(content: str) -> str:
         str: The JSON content extracted from the string
     """
 
+    return repair_json(content)
+
+
+async def parse_action_output(
+    response: AIMessage,
+    schema: Type[BaseModel],
+    action: DemingAction,
+    config: RunnableConfig,
+    model_name: Optional[str] = None,
+) -> BaseModel:
+    """
+    Parse the response of a phase into its structured output.
+
+    Args:
+        response (AIMessage): The response of the phase.
+        schema (Type[BaseModel]): The structured output of the phase.
+        action (DemingAction): The phase of the response.
+        config (RunnableConfig): The configuration for the agent.
+        model_name (str, optional): The model re-asked on failures. Defaults to the model of the phase.
+
+    Returns:
+        BaseModel: The validated structured output.
+    """
+
+    configuration = Configuration.from_runnable_config(config)
+    return await parse_output(
+        response,
+        schema,
+        phase=action.value,
+        model_name=model_name or configuration.get_model(action.value),
+        config=config,
+        max_reasks=configuration.max_output_reasks,
+    )
+
+
+async def invoke_model(
+    model: BaseChatModel,
+    message_value: Any,
+    config: RunnableConfig,
+    phase: str,
+    stream: bool = False,
+    output_schema: Optional[Type[BaseModel]] = None,
+    model_name: Optional[str] = None,
+) -> AIMessage:
+    """
+    Get the response of a model, either streamed, natively structured or plain.
+
+    With native structured output, the provider constrains the response to the JSON
+    schema of the output (falling back to a plain call if it is not supported), and
+    the validated output is returned as the JSON content of the response.
+
+    The call is bounded by the timeout of its phase and, if `hedge_requests` is enabled,
+    duplicated when it runs past the usual (p95) latency of its model and phase. Transport
+    errors are retried with exponential backoff (up to `llm_max_retries` times).
+
+    Args:
+        model (BaseChatModel): The model to call.
+        message_value (Any): The prompt of the model.
+        config (RunnableConfig): The configuration for the agent.
+        phase (str): The phase issuing the call.
+        stream (bool, optional): If True, stream the tokens of the response. Defaults to False.
+        output_schema (Type[BaseModel], optional): Structured output to request natively. Defaults to None.
+        model_name (str, optional): Name of the model, keying its latency statistics. Defaults to the model of the phase.
+
+    Returns:
+        AIMessage: The response from the model
+
+    Raises:
+        PhaseTimeoutError: If no response came within the timeout of the phase.
+    """
+
+    configuration = Configuration.from_runnable_config(config)
+    policy = RetryPolicy.from_configuration(configuration)
+    run_id = get_run_id(config)
+    model_name = model_name or configuration.get_model(phase)
+    structured_model = (
+        bind_structured_output(model, model_name, output_schema) if output_schema is not None else None
+    )
+
+    async def _call() -> AIMessage:
+        await throttle("llm", configuration)
+        return await _invoke_model_once(
+            model, message_value, config, phase, stream, structured_model
+        )
+
+    return await timed_call(
+        lambda: policy.call_with_backoff(_call, on_retry=lambda _: RETRY_STATS.record(run_id, "transport")),
+        configuration,
+        model_name,
+        phase,
+        hedge=not stream,
+    )
+
+
+# Models not supporting native structured output, prompted for their structured output instead
+_PROMPTED_OUTPUT_MODELS: Set[str] = set()
+
+
+def bind_structured_output(
+    model: BaseChatModel, model_name: str, schema: Type[BaseModel]
+) -> Optional[Runnable]:
+    """
+    Bind a model to the native structured output of a schema.
+
+    Providers not supporting it are remembered, so the binding is only attempted once per model.
+
+    Args:
+        model (BaseChatModel): The model to bind.
+        model_name (str): Name of the model.
+        schema (Type[BaseModel]): The structured output to request.
+
+    Returns:
+        Optional[Runnable]: The bound model (returning the raw and parsed responses), or None if
+            the provider does not support native structured output.
+    """
+
+    if model_name in _PROMPTED_OUTPUT_MODELS:
+        return None
     try:
-        content = content.replace("```json", "")
-        content = content.replace("```", "")
-        content = content.replace("\n", "")
-        content = content.strip()
-        content = json.loads(content)
-        return content
-    except ValueError as e:
-        raise ValueError("JSON could not be extracted")
+        return model.with_structured_output(schema, method="json_schema", include_raw=True)
+    except (NotImplementedError, ValueError) as e:
+        logger.warning(
+            "Native structured output not supported by '%s', falling back to prompting: %r",
+            model_name,
+            e,
+        )
+        _PROMPTED_OUTPUT_MODELS.add(model_name)
+        return None
+
+
+async def _invoke_model_once(
+    model: BaseChatModel,
+    message_value: Any,
+    config: RunnableConfig,
+    phase: str,
+    stream: bool,
+    structured_model: Optional[Runnable],
+) -> AIMessage:
+    """Make a single call of a model, or of its natively structured binding (see `invoke_model`)."""
+
+    if structured_model is not None:
+        result = await structured_model.ainvoke(message_value, config)
+        response = cast(AIMessage, result["raw"])
+        if result.get("parsed") is not None:
+            response = response.model_copy(
+                update={"content": json.dumps(result["parsed"].model_dump())}
+            )
+        return response
+
+    if stream:
+        response = await stream_chat_model(model, message_value, config, stream_name=phase)
+        logger.info(
+            "Time to first token (%s): %.3fs",
+            phase,
+            response.response_metadata["time_to_first_token"],
+        )
+        return response
+    return cast(AIMessage, await model.ainvoke(message_value, config))
 
 
 async def call_model(
     state: State,
     config: RunnableConfig,
-    custom_prompt: str,
+    custom_prompt: CompiledPrompt,
     action: DemingAction,
     allow_tools: bool = False,
     input_variables: dict = None,
+    extra_messages: Optional[Sequence[AnyMessage]] = None,
+    stream: bool = False,
+    output_schema: Optional[Type[BaseModel]] = None,
+    model_name: Optional[str] = None,
 ) -> AIMessage:
     """
     Call a model with a given prompt and input variables.
@@ -77,51 +306,148 @@ async def call_model(
     Args:
         state (State): The current state of the agent
         config (RunnableConfig): The configuration for the agent
-        custom_prompt (str): The custom prompt to use for the model
+        custom_prompt (CompiledPrompt): The custom prompt to use for the model
         action (DemingAction): The current action of the agent
         allow_tools (bool, optional): If True, allow the model to use tools. Defaults to False.
         input_variables (dict, optional): The input variables to use for the model. Defaults to None.
+        extra_messages (Sequence[AnyMessage], optional): Messages appended after the rendered prompt. Defaults to None.
+        stream (bool, optional): If True, stream the tokens of the response. Defaults to False.
+        output_schema (Type[BaseModel], optional): Structured output of the phase, requested natively
+            when `structured_output` is 'native'. Defaults to None.
+        model_name (str, optional): The model to call. Defaults to the model of the phase.
 
     Returns:
         AIMessage: The response from the model
     """
 
     configuration = Configuration.from_runnable_config(config)
-
-    # Create a prompt template. Customize this to change the agent's behavior.
-    system_prompt = configuration.system_prompt.format(
+    phase = action.value if action is not None else "final"
+    model_name = model_name or configuration.get_model(phase)
+
+    # Fit the prompt variables (including the ones of the system prompt) to the phase budget
+    budgeted_variables, token_report = await fit_to_budget(
+        phase,
+        {
+            **(input_variables or {}),
+            "system_context": state.context,
+            "system_previous_feedback": (
+                None if state.feedback is None else state.feedback.comments
+            ),
+        },
+        configuration,
+        config,
         task_description=state.task_description,
-        phase=state.current_action,
-        context=state.context,
-        system_time=datetime.now(tz=timezone.utc).isoformat(),
-        previous_feedback=None if state.feedback is None else state.feedback.comments,
-        available_tools="web search",
-        current_action=action,
     )
-
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt),
-            ("human", custom_prompt.template),
+    if token_report.budget is not None:
+        TOKEN_REPORTS.add(get_run_id(config), token_report)
+    system_context = budgeted_variables.pop("system_context")
+    system_previous_feedback = budgeted_variables.pop("system_previous_feedback")
+    input_variables = budgeted_variables
+
+    # Render the system and phase prompts. Customize the templates to change the agent's behavior.
+    system_template = compile_prompt(configuration.system_prompt, available_tools="web search")
+    cache_friendly = configuration.prompt_layout == "cache_friendly"
+    cache_policy = configuration.llm_cache_policies.get(phase, "off")
+    system_variables = {
+        "task_description": state.task_description,
+        "phase": state.current_action,
+        "context": system_context,
+        # A full precision time would make every prompt (and response cache key) unique
+        "system_time": format_system_time(
+            configuration.system_time_resolution
+            if cache_friendly or cache_policy != "off"
+            else None
+        ),
+        "previous_feedback": system_previous_feedback,
+        "current_action": action,
+    }
+    if cache_friendly:
+        # Static instructions first (byte-stable across calls), volatile values last
+        state_values = {
+            name: variables[name]
+            for variables, template in (
+                (system_variables, system_template),
+                (input_variables, custom_prompt),
+            )
+            for name in template.input_variables
+        }
+        message_value = [
+            SystemMessage(content=system_template.static_text),
+            HumanMessage(
+                content=f"{custom_prompt.static_text}\n{render_state_block(state_values)}"
+            ),
         ]
-    )
-
-    # Initialize the model with tool binding. Change the model or add more tools here.
-    if allow_tools:
-        model = load_chat_model(configuration.model).bind_tools(TOOLS)
     else:
-        model = load_chat_model(configuration.model)
-
-    # Prepare the input for the model, including the current system time
-    message_value = await prompt.ainvoke(
-        input_variables,
-        config,
-    )
-    print(f"Message value (LLM call): {message_value}")
+        message_value = [
+            SystemMessage(content=system_template.render(system_variables)),
+            HumanMessage(content=custom_prompt.render(input_variables)),
+        ]
+    message_value.extend(extra_messages or [])
+
+    # Get a warm model (tool-bound if needed) from the registry. Change the model or add more tools here.
+    model = load_routed_model(model_name, configuration, tools=TOOLS if allow_tools else None)
+    logger.debug("Message value (LLM call): %s", message_value)
+
+    with tracer.span(f"llm:{phase}", kind="llm", phase=phase, model=model_name) as span:
+        # Serve the response from the cache if enabled for this phase
+        response = None
+        if cache_policy != "off":
+            response_cache = get_response_cache(configuration)
+            tool_names = [tool.__name__ for tool in TOOLS] if allow_tools else None
+            response, cache_key, prompt_vector = await response_cache.alookup(
+                phase,
+                message_value,
+                model_name,
+                tools=tool_names,
+                use_semantic=cache_policy == "semantic",
+            )
+
+        # Get the model's response
+        fresh_response = response is None
+        if fresh_response:
+            start = time.perf_counter()
+            response = await invoke_model(
+                model,
+                message_value,
+                config,
+                phase,
+                stream=stream,
+                output_schema=(
+                    output_schema
+                    if configuration.structured_output == "native" and not allow_tools
+                    else None
+                ),
+                model_name=model_name,
+            )
+            latency = time.perf_counter() - start
+            if cache_policy != "off":
+                response_cache.update(
+                    cache_key,
+                    response,
+                    model_name,
+                    tools=tool_names,
+                    vector=prompt_vector,
+                )
 
-    # Get the model's response
-    response = cast(AIMessage, await model.ainvoke(message_value, config))
-    print(f"Model call response (type: {type(response)}): {response}")
+        usage = response.usage_metadata or {}
+        cached_tokens = (
+            PROMPT_CACHE_STATS.record(get_run_id(config), phase, response) if fresh_response else None
+        )
+        # The model that served the response (a fallback, if the router failed over)
+        served_model = response.response_metadata.get("routed_model", model_name)
+        if fresh_response:
+            record_llm_call(config, phase, model_name, response, latency)
+        span.set(
+            cache_hit=not fresh_response,
+            served_model=served_model if served_model != model_name else None,
+            cached_input_tokens=cached_tokens,
+            prompt_variable_tokens=token_report.total or None,
+            input_tokens=usage.get("input_tokens"),
+            output_tokens=usage.get("output_tokens"),
+            time_to_first_token=response.response_metadata.get("time_to_first_token"),
+            tool_calls=len(response.tool_calls) or None,
+        )
+    logger.debug("Model call response (type: %s): %s", type(response), response)
 
     # Handle the case when it's the last step and the model still wants to use a tool
     if state.is_last_step and response.tool_calls:
@@ -149,44 +475,216 @@ async def plan_action(state: State, config: RunnableConfig) -> None:
         None: The function updates the state with the planned next steps and does not return a value.
     """
 
-    # Set task description if not set
-    if state.task_description is None:
-        state.task_description = state.messages[0].content
-
-    prompt = PromptTemplate(
-        template=PLAN_ACTION_PROMPT,
-        input_variables=["context", "previous_steps", "format_instructions"],
+    # Set the task description, deadline and LLM usage baseline when a task starts: on the first
+    # plan of a thread, or when a new input is given on a reused thread (the retention policies may
+    # leave the task message last, so a task is identified by the id of its message)
+    task_message = next(
+        (message for message in reversed(state.messages) if isinstance(message, HumanMessage)),
+        state.messages[0],
     )
-    print(f"Planning prompt: {prompt}")
+    if state.task_description is None or task_message.id != state.task_message_id:
+        state.task_id = uuid.uuid4().hex
+        bind_task_id(state.task_id)
+        state.task_message_id = task_message.id
+        state.task_description = task_message.content
+        task_deadline = Configuration.from_runnable_config(config).task_deadline
+        if task_deadline is not None:
+            state.deadline_at = time.time() + task_deadline
+        # The LLM budgets only count the calls of this task, not the earlier ones of its thread
+        state.llm_usage_baseline = PHASE_COSTS.totals(get_run_id(config))
 
     action_response = await call_model(
         state,
         config=config,
-        custom_prompt=prompt,
+        custom_prompt=get_phase_prompt("plan"),
         input_variables={
             "context": state.context,
             "previous_steps": (
-                ", ".join(
-                    [plan_step.step for plan_step in state.already_processed_steps]
-                )
-                if isinstance(state.already_processed_steps, list)
+                ", ".join(state.step_records[key] for key in state.processed_step_ids)
+                if state.processed_step_ids
                 else None
             ),
-            "format_instructions": planning_parser.get_format_instructions(),
         },
         allow_tools=False,
         action=DemingAction.PLAN,
+        output_schema=PlanningOutput,
+    )
+    logger.debug("Planning phase: %s", action_response)
+    action_content = await parse_action_output(
+        action_response, PlanningOutput, DemingAction.PLAN, config
     )
-    print(f"Planning phase: {action_response}")
-    action_content = extract_json(action_response.content)
-    action_content = PlanningOutput(**action_content)
     return {
-        "next_steps": action_content.next_steps,
+        "next_steps": assign_step_ids(action_content.next_steps),
         "messages": [action_response],
+        "task_id": state.task_id,
+        "task_message_id": state.task_message_id,
         "task_description": state.task_description,
+        "deadline_at": state.deadline_at,
+        "llm_usage_baseline": state.llm_usage_baseline,
     }
 
 
+def memory_id(state: State, config: RunnableConfig) -> str:
+    """Return the key of the retrieval memory of the task (a reused thread runs several tasks)."""
+
+    return state.task_id or get_run_id(config, state)
+
+
+async def recall_results(state: State, config: RunnableConfig, step: PlanningStep) -> Optional[str]:
+    """
+    Retrieve the chunks of the previous results of the task most relevant to a step.
+
+    Args:
+        state (State): The current state of the agent.
+        config (RunnableConfig): The configuration settings for the agent's execution.
+        step (PlanningStep): The step about to be executed or evaluated.
+
+    Returns:
+        str, optional: The rendered chunks, or None if the retrieval memory is disabled (or empty).
+    """
+
+    configuration = Configuration.from_runnable_config(config)
+    if not configuration.retrieval_memory:
+        return None
+    memory = RETRIEVAL_MEMORIES.get(memory_id(state, config), configuration)
+    chunks = await memory.search(
+        f"{step.step} {step.details} {step.expected_outcome}", configuration.retrieval_top_k
+    )
+    return format_chunks(chunks) if chunks else None
+
+
+async def remember_step(
+    state: State,
+    config: RunnableConfig,
+    step: PlanningStep,
+    results: Optional[str],
+    tool_outputs: Iterable[str] = (),
+) -> None:
+    """Index the results of a finished step (and its search snippets) in the retrieval memory."""
+
+    configuration = Configuration.from_runnable_config(config)
+    if not configuration.retrieval_memory:
+        return
+    memory = RETRIEVAL_MEMORIES.get(memory_id(state, config), configuration)
+    n_chunks = await memory.add_step(step, results, tool_outputs)
+    logger.debug("Indexed %s chunks of the step '%s' (%s in memory)", n_chunks, step.step, len(memory))
+
+
+async def execute_step(
+    state: State,
+    config: RunnableConfig,
+    step: PlanningStep,
+    feedback: Optional[CheckingOutput] = None,
+    allow_tools: bool = True,
+    context: Optional[str] = None,
+    extra_messages: Optional[Sequence[AnyMessage]] = None,
+) -> AIMessage:
+    """
+    Call the model for executing a single step of the plan.
+
+    Args:
+        state (State): The current state of the agent.
+        config (RunnableConfig): The configuration settings for the agent's execution.
+        step (PlanningStep): The step to execute.
+        feedback (CheckingOutput, optional): Feedback from a previous attempt of the step. Defaults to None.
+        allow_tools (bool, optional): If True, allow the model to use tools. Defaults to True.
+        context (str, optional): Context overriding the one in the state. Defaults to None.
+        extra_messages (Sequence[AnyMessage], optional): Messages appended after the prompt. Defaults to None.
+
+    Returns:
+        AIMessage: The response from the model
+    """
+
+    context = state.context if context is None else context
+    recalled = await recall_results(state, config, step)
+    if recalled:
+        context = f"{context}\n\nRelevant results of the previous steps:\n{recalled}"
+
+    return await call_model(
+        state,
+        config=config,
+        custom_prompt=get_phase_prompt("do"),
+        input_variables={
+            "current_step": step.step,
+            "step_details": step.details,
+            "step_expected_outcome": step.expected_outcome,
+            "context": context,
+            "previous_feedback": feedback,
+        },
+        allow_tools=allow_tools,
+        action=DemingAction.DO,
+        extra_messages=extra_messages,
+        stream=Configuration.from_runnable_config(config).stream_do_results,
+        output_schema=DoingOutput,
+    )
+
+
+async def patch_step(
+    state: State,
+    config: RunnableConfig,
+    step: PlanningStep,
+    previous_result: str,
+    feedback: CheckingOutput,
+) -> Tuple[AIMessage, Optional[DoingOutput]]:
+    """
+    Retry a step that failed its check by asking for edits of its previous result.
+
+    Only the step, its previous result and the comments and suggestions of the check
+    are given to the model, which answers with edits (instead of the whole result) that
+    are then applied to the previous result.
+
+    Args:
+        state (State): The current state of the agent.
+        config (RunnableConfig): The configuration settings for the agent's execution.
+        step (PlanningStep): The step to retry.
+        previous_result (str): The result of the previous attempt of the step.
+        feedback (CheckingOutput): The evaluation of the previous attempt.
+
+    Returns:
+        Tuple[AIMessage, Optional[DoingOutput]]: The response from the model, and the revised
+            output of the step (None if the patch could not be parsed or applied).
+    """
+
+    run_id = get_run_id(config)
+    response = await call_model(
+        state,
+        config=config,
+        custom_prompt=get_phase_prompt("patch"),
+        input_variables={
+            "current_step": step.step,
+            "step_expected_outcome": step.expected_outcome,
+            "previous_result": previous_result,
+            "comments": feedback.comments,
+            "suggestions": feedback.suggestions,
+        },
+        allow_tools=False,
+        action=DemingAction.DO,
+        output_schema=PatchOutput,
+    )
+    try:
+        patch = await parse_action_output(response, PatchOutput, DemingAction.DO, config)
+        result = apply_patch(previous_result, patch.edits)
+    except (OutputParsingError, PatchError) as e:
+        logger.warning("Could not patch the result of the step '%s', retrying it fully: %s", step.step, e)
+        RETRY_STATS.record(run_id, "patch_failed", response.usage_metadata)
+        return response, None
+    RETRY_STATS.record(run_id, "patch", response.usage_metadata)
+    return response, DoingOutput(result=result, obstacles=patch.obstacles)
+
+
+def stop_retrying(
+    policy: RetryPolicy, n_failures: int, run_id: str, baseline: Optional[Dict[str, int]]
+) -> bool:
+    """Return whether a step that failed its check `n_failures` times is given up, recording why."""
+
+    if policy.should_retry_step(n_failures, run_id, baseline):
+        return False
+    RETRY_STATS.record(
+        run_id, "given_up" if n_failures > policy.max_step_retries else "budget_exhausted"
+    )
+    return True
+
+
 async def do_action(
     state: State,
     config: RunnableConfig,
@@ -199,6 +697,10 @@ async def do_action(
     calls a model to execute the step, and updates the state with the step's results
     and any relevant messages.
 
+    A step that failed its check is retried following the retry policy: by patching its
+    previous result in 'patch' retry mode (when the check suggested fixes), or by running
+    it again.
+
     Args:
         state (State): The current state of the agent, containing task context and history.
         config (RunnableConfig): The configuration settings for the agent's execution.
@@ -207,109 +709,480 @@ async def do_action(
         None: The function updates the state with the results of the executed step and does not return a value.
     """
 
-    prompt = PromptTemplate(
-        template=DO_ACTION_PROMPT,
-        input_variables=[
-            "current_step",
-            "current_step",
-            "step_expected_outcome",
-            "context",
-            "previous_feedback",
-            "format_instructions",
-        ],
+    configuration = Configuration.from_runnable_config(config)
+    policy = RetryPolicy.from_configuration(configuration)
+    logger.debug("Step tool rounds: %s", state.step_tool_rounds)
+
+    # A failed step being retried (and not resuming the tool calls of its retry)
+    retrying = (
+        state.feedback is not None
+        and not state.feedback.success
+        and not isinstance(state.messages[-1], ToolMessage)
     )
-    print(f"Step search triggered: {state.step_search_triggered}")
+    if retrying and policy.use_patch(state.step_results, state.feedback):
+        try:
+            patch_response, patched = await patch_step(
+                state, config, state.next_steps[0], state.step_results, state.feedback
+            )
+        except PhaseTimeoutError as e:
+            # Like a timed out execution, a timed out patch counts as a failed attempt
+            timeout_message = AIMessage(content=f"The patch of the step timed out: {e}")
+            return {
+                "step_results": None,
+                "step_obstacles": str(timeout_message.content),
+                "messages": [timeout_message],
+            }
+        if patched is not None:
+            return {
+                "step_results": patched.result,
+                "step_obstacles": patched.obstacles,
+                "messages": [patch_response],
+            }
 
-    action_response = await call_model(
-        state,
-        config=config,
-        custom_prompt=prompt,
-        input_variables={
-            "current_step": state.next_steps[0].step,
-            "step_details": state.next_steps[0].details,
-            "step_expected_outcome": state.next_steps[0].expected_outcome,
-            "context": state.context,
-            "previous_feedback": state.feedback,
-            "format_instructions": doing_parser.get_format_instructions(),
-        },
-        allow_tools=True if state.step_search_triggered == False else False,
-        action=DemingAction.DO,
+    try:
+        action_response = await execute_step(
+            state,
+            config,
+            step=state.next_steps[0],
+            feedback=state.feedback,
+            allow_tools=state.step_tool_rounds < configuration.max_tool_rounds,
+            extra_messages=(
+                [format_search_results(state.step_tool_results.values())]
+                if state.step_tool_results
+                else None
+            ),
+        )
+    except PhaseTimeoutError as e:
+        # A timed out attempt counts as a failed one, so the step is retried (or given up)
+        timeout_message = AIMessage(content=f"The execution of the step timed out: {e}")
+        return {
+            "step_results": None,
+            "step_obstacles": str(timeout_message.content),
+            "messages": [timeout_message],
+        }
+    logger.debug("Execution phase: %s", action_response)
+    if retrying:
+        RETRY_STATS.record(get_run_id(config), "full", action_response.usage_metadata)
+
+    time_to_first_token = action_response.response_metadata.get("time_to_first_token")
+    time_to_first_token = (
+        {} if time_to_first_token is None else {"do": time_to_first_token}
     )
-    print(f"Execution phase: {action_response}")
 
     # Check if tool calling was triggered
-    if action_response.response_metadata["finish_reason"] == "tool_calls":
-        return {"messages": [action_response], "step_search_triggered": True}
-
-    action_content = extract_json(action_response.content)
-    action_content = DoingOutput(**action_content)
+    if action_response.response_metadata.get("finish_reason") == "tool_calls":
+        return {
+            "messages": [action_response],
+            "time_to_first_token": time_to_first_token,
+        }
+
+    action_content = await parse_action_output(
+        action_response, DoingOutput, DemingAction.DO, config
+    )
     return {
         "step_results": action_content.result,
         "step_obstacles": action_content.obstacles,
-        "n_retries": state.n_retries + 1,
         "messages": [action_response],
+        "time_to_first_token": time_to_first_token,
     }
 
 
-async def check_action(state: State, config: RunnableConfig) -> None:
+async def tools_action(state: State, config: RunnableConfig) -> dict:
     """
-    Evaluate the results of the current step and generate feedback.
+    Execute the tool calls requested by the do phase.
 
-    This function is responsible for setting up the evaluation prompt,
-    calling a model to generate the evaluation, and updating the state
-    with the evaluation and any relevant messages.
+    The tool calls of the last message are executed concurrently (up to
+    `max_parallel_tool_calls` at a time). Calls identical to another one of the step
+    are answered with its output instead of being executed again. The outputs are kept
+    in the state, so the do phase can use every result gathered for the step.
 
     Args:
-        state (State): The current state of the agent, containing task context and history.
+        state (State): The current state of the agent.
         config (RunnableConfig): The configuration settings for the agent's execution.
 
     Returns:
-        None: The function updates the state with the evaluation and does not return a value.
+        dict: The tool messages, the outputs of the step's tool calls and the number of tool rounds.
     """
 
-    prompt = PromptTemplate(
-        template=CHECK_ACTION_PROMPT,
-        input_variables=[
-            "current_step",
-            "step_results",
-            "results",
-            "obstacles",
-            "context",
-            "previous_feedback",
-            "format_instructions",
-        ],
+    configuration = Configuration.from_runnable_config(config)
+    step = state.next_steps[0]
+    tool_messages, new_results = await run_tool_calls(
+        state.messages[-1].tool_calls,
+        config,
+        max_concurrency=configuration.max_parallel_tool_calls,
+        known_results=state.step_tool_results,
+        rank_text=f"{step.step} {step.expected_outcome}",
     )
+    return {
+        "messages": tool_messages,
+        "step_tool_results": {**state.step_tool_results, **new_results},
+        "step_tool_rounds": state.step_tool_rounds + 1,
+    }
+
+
+async def evaluate_step(
+    state: State,
+    config: RunnableConfig,
+    step: PlanningStep,
+    step_results: Optional[str],
+    obstacles: Optional[str],
+    feedback: Optional[CheckingOutput] = None,
+    context: Optional[str] = None,
+) -> Tuple[AIMessage, CheckingOutput]:
+    """
+    Evaluate the results of a single step.
+
+    In 'tiered' check mode, deterministic checks run first, then the cheaper `check_model`,
+    and the model of the check phase is only called when neither is confident. The tier
+    resolving each evaluation is recorded.
+
+    Args:
+        state (State): The current state of the agent.
+        config (RunnableConfig): The configuration settings for the agent's execution.
+        step (PlanningStep): The step that was executed.
+        step_results (str, optional): The results of the step.
+        obstacles (str, optional): The obstacles found while executing the step.
+        feedback (CheckingOutput, optional): Feedback from a previous attempt of the step. Defaults to None.
+        context (str, optional): Context overriding the one in the state. Defaults to None.
+
+    Returns:
+        Tuple[AIMessage, CheckingOutput]: The response from the model and its parsed evaluation
+    """
+
+    configuration = Configuration.from_runnable_config(config)
+    run_id = get_run_id(config)
+    model_tiers: List[Tuple[str, Optional[str]]] = [("model", None)]
+    if configuration.check_mode == "tiered":
+        action_content = heuristic_check(
+            step, step_results, obstacles, configuration.check_keyword_overlap
+        )
+        if action_content is not None:
+            CHECK_TIER_STATS.record(run_id, "heuristic", action_content.success)
+            logger.debug("Evaluation resolved by the deterministic checks: %s", action_content)
+            return (
+                AIMessage(content=action_content.model_dump_json(), name="heuristic_check"),
+                action_content,
+            )
+        CHECK_TIER_STATS.record_escalation(run_id, "heuristic")
+        if configuration.check_model:
+            model_tiers.insert(0, ("check_model", configuration.check_model))
+
+    recalled = await recall_results(state, config, step)
+    for tier, model_name in model_tiers:
+        action_response, action_content = await _call_check_model(
+            state,
+            config,
+            step,
+            step_results=step_results,
+            obstacles=obstacles,
+            results=state.results if recalled is None else recalled,
+            feedback=feedback,
+            context=context,
+            model_name=model_name,
+        )
+        confident = (
+            action_content.confidence is not None
+            and action_content.confidence >= configuration.check_confidence_threshold
+        )
+        if tier == "model" or confident:
+            break
+        CHECK_TIER_STATS.record_escalation(run_id, tier)
+        logger.debug("Evaluation of the check model not confident enough: %s", action_content)
+
+    CHECK_TIER_STATS.record(run_id, tier, action_content.success)
+    return action_response, action_content
+
+
+async def _call_check_model(
+    state: State,
+    config: RunnableConfig,
+    step: PlanningStep,
+    step_results: Optional[str],
+    obstacles: Optional[str],
+    results: Optional[str],
+    feedback: Optional[CheckingOutput],
+    context: Optional[str],
+    model_name: Optional[str],
+) -> Tuple[AIMessage, CheckingOutput]:
+    """Call a model (the model of the check phase by default) for evaluating a step."""
 
     action_response = await call_model(
         state,
         config=config,
-        custom_prompt=prompt,
+        custom_prompt=get_phase_prompt("check"),
         input_variables={
-            "current_step": state.next_steps[0].step,
-            "step_results": state.step_results,
-            "results": state.results,
-            "obstacles": state.step_obstacles,
-            "context": state.context,
-            "previous_feedback": state.feedback,
-            "format_instructions": checking_parser.get_format_instructions(),
+            "current_step": step.step,
+            "step_results": step_results,
+            "results": results,
+            "obstacles": obstacles,
+            "context": state.context if context is None else context,
+            "previous_feedback": feedback,
         },
         allow_tools=False,
         action=DemingAction.CHECK,
+        output_schema=CheckingOutput,
+        model_name=model_name,
+    )
+    logger.debug("Evaluation phase: %s", action_response)
+    action_content = await parse_action_output(
+        action_response, CheckingOutput, DemingAction.CHECK, config, model_name=model_name
     )
-    print(f"Evaluation phase: {action_response}")
-    action_content = extract_json(action_response.content)
-    action_content = CheckingOutput(**action_content)
-
-    already_processed_steps = (
-        state.already_processed_steps + [state.next_steps[0]]
-        if isinstance(state.already_processed_steps, list)
-        else [state.next_steps[0]]
+    return action_response, action_content
+
+
+async def check_action(state: State, config: RunnableConfig) -> None:
+    """
+    Evaluate the results of the current step and generate feedback.
+
+    This function is responsible for setting up the evaluation prompt,
+    calling a model to generate the evaluation, and updating the state
+    with the evaluation and any relevant messages.
+
+    Args:
+        state (State): The current state of the agent, containing task context and history.
+        config (RunnableConfig): The configuration settings for the agent's execution.
+
+    Returns:
+        None: The function updates the state with the evaluation and does not return a value.
+    """
+
+    action_response, action_content = await evaluate_step(
+        state,
+        config,
+        step=state.next_steps[0],
+        step_results=state.step_results,
+        obstacles=state.step_obstacles,
+        feedback=state.feedback,
     )
+
+    # Retries are counted by outcome: only failed checks count
+    n_retries = state.n_retries
+    if not action_content.success:
+        n_retries += 1
+        run_id = get_run_id(config)
+        policy = RetryPolicy.from_configuration(Configuration.from_runnable_config(config))
+        RETRY_STATS.record(run_id, "failed_check")
+        # Records whether the step is given up (the router takes the same decision)
+        stop_retrying(policy, n_retries, run_id, state.llm_usage_baseline)
     return {
+        **record_processed_steps(state, state.next_steps[:1]),
         "success": action_content.success,
+        "n_retries": n_retries,
         "feedback": action_content,
         "messages": [action_response],
-        "already_processed_steps": already_processed_steps + [state.next_steps[0]],
+    }
+
+
+@dataclass
+class StepOutcome:
+    """Outcome of a step executed by the parallel scheduler."""
+
+    step: PlanningStep
+    result: Optional[str] = None
+    obstacles: Optional[str] = None
+    feedback: Optional[CheckingOutput] = None
+    n_attempts: int = 0
+    messages: List[AnyMessage] = field(default_factory=list)
+
+
+def format_search_results(tool_outputs: Iterable[str]) -> HumanMessage:
+    """Wrap the outputs of the tools executed for a step into a single message for the model."""
+
+    outputs = "\n\n".join(tool_outputs)
+    return HumanMessage(
+        content=f"Results of the web searches performed for this step:\n```\n{outputs}\n```"
+    )
+
+
+async def run_step_cycle(
+    state: State,
+    config: RunnableConfig,
+    step: PlanningStep,
+    dependency_results: Dict[str, StepOutcome],
+) -> StepOutcome:
+    """
+    Run the do/check loop of a single step, as done by the sequential graph.
+
+    The step is executed (with up to `max_tool_rounds` rounds of tool calls) and evaluated,
+    retrying until the evaluation succeeds or the retry policy gives up on the step. With the
+    'patch' retry mode, a failed step with review suggestions is retried by patching its result.
+
+    Args:
+        state (State): The current state of the agent.
+        config (RunnableConfig): The configuration settings for the agent's execution.
+        step (PlanningStep): The step to run.
+        dependency_results (Dict[str, StepOutcome]): Outcomes of the steps this step depends on.
+
+    Returns:
+        StepOutcome: The results, obstacles and evaluation of the step.
+    """
+
+    context = state.context
+    if dependency_results:
+        dependencies = "\n".join(
+            f"- {outcome.step.step}: {outcome.result}"
+            for outcome in dependency_results.values()
+        )
+        context = f"{context}\n\nResults of the previous steps this step depends on:\n{dependencies}"
+
+    configuration = Configuration.from_runnable_config(config)
+    policy = RetryPolicy.from_configuration(configuration)
+    run_id = get_run_id(config)
+    outcome = StepOutcome(step=step)
+    tool_results: Dict[str, str] = {}
+    n_failures = 0
+    while True:
+        outcome.n_attempts += 1
+        if n_failures and policy.use_patch(outcome.result, outcome.feedback):
+            try:
+                response, doing_output = await patch_step(
+                    state, config, step, outcome.result, outcome.feedback
+                )
+            except PhaseTimeoutError as e:
+                response, doing_output = AIMessage(content=f"The patch of the step timed out: {e}"), None
+            outcome.messages.append(response)
+            if doing_output is not None:
+                outcome.result, outcome.obstacles = doing_output.result, doing_output.obstacles
+        else:
+            doing_output = None
+        if doing_output is None:
+            if n_failures:
+                RETRY_STATS.record(run_id, "full")
+            outcome.result, outcome.obstacles = await _execute_in_full(
+                state, config, step, outcome, context, tool_results, configuration
+            )
+
+        check_response, outcome.feedback = await evaluate_step(
+            state,
+            config,
+            step,
+            step_results=outcome.result,
+            obstacles=outcome.obstacles,
+            feedback=outcome.feedback,
+            context=context,
+        )
+        outcome.messages.append(check_response)
+        if not outcome.feedback.success:
+            n_failures += 1
+            RETRY_STATS.record(run_id, "failed_check")
+        if outcome.feedback.success or stop_retrying(
+            policy, n_failures, run_id, state.llm_usage_baseline
+        ):
+            await remember_step(state, config, step, outcome.result, tool_results.values())
+            return outcome
+
+
+async def _execute_in_full(
+    state: State,
+    config: RunnableConfig,
+    step: PlanningStep,
+    outcome: StepOutcome,
+    context: str,
+    tool_results: Dict[str, str],
+    configuration: Configuration,
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Execute a step of the do/check loop in full, with its rounds of tool calls.
+
+    The responses are appended to the messages of the outcome and the tool results are
+    added to `tool_results`, so they are kept across the attempts of the step.
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: The result and the obstacles of the step.
+    """
+
+    tool_rounds = sum(1 for message in outcome.messages if getattr(message, "tool_calls", None))
+    while True:
+        try:
+            response = await execute_step(
+                state,
+                config,
+                step,
+                feedback=outcome.feedback,
+                allow_tools=tool_rounds < configuration.max_tool_rounds,
+                context=context,
+                extra_messages=(
+                    [format_search_results(tool_results.values())] if tool_results else None
+                ),
+            )
+        except PhaseTimeoutError as e:
+            response = None
+            outcome.messages.append(
+                AIMessage(content=f"The execution of the step timed out: {e}")
+            )
+            break
+        outcome.messages.append(response)
+        if not response.tool_calls or tool_rounds >= configuration.max_tool_rounds:
+            break
+        tool_rounds += 1
+        _, new_results = await run_tool_calls(
+            response.tool_calls,
+            config,
+            max_concurrency=configuration.max_parallel_tool_calls,
+            known_results=tool_results,
+            rank_text=f"{step.step} {step.expected_outcome}",
+        )
+        tool_results.update(new_results)
+
+    if response is None:
+        return None, str(outcome.messages[-1].content)
+    doing_output = await parse_action_output(response, DoingOutput, DemingAction.DO, config)
+    return doing_output.result, doing_output.obstacles
+
+
+async def parallel_steps_action(state: State, config: RunnableConfig) -> dict:
+    """
+    Execute every step of the current plan, running independent steps concurrently.
+
+    Steps are scheduled following their declared dependencies, each one running its own
+    do/check loop. Their results are then merged (in plan order) into the step results,
+    so that a single act phase can update the task results for the whole plan.
+
+    Args:
+        state (State): The current state of the agent, containing task context and history.
+        config (RunnableConfig): The configuration settings for the agent's execution.
+
+    Returns:
+        dict: The merged step results, obstacles and feedback, along with the messages of every step.
+    """
+
+    configuration = Configuration.from_runnable_config(config)
+    steps = assign_step_ids(state.next_steps)
+
+    async def _run(step: PlanningStep, dependency_results: Dict[str, StepOutcome]):
+        return await run_step_cycle(state, config, step, dependency_results)
+
+    outcomes = await run_dag(
+        steps, _run, max_concurrency=configuration.max_parallel_steps
+    )
+    ordered = [outcomes[step.id] for step in steps]
+    logger.debug("Parallel execution phase: %s steps", len(ordered))
+
+    feedback = CheckingOutput(
+        success=all(outcome.feedback.success for outcome in ordered),
+        comments="\n".join(
+            f"- {outcome.step.step}: {outcome.feedback.comments}" for outcome in ordered
+        ),
+        suggestions="\n".join(
+            f"- {outcome.step.step}: {outcome.feedback.suggestions}"
+            for outcome in ordered
+            if outcome.feedback.suggestions
+        )
+        or None,
+    )
+    return {
+        **record_processed_steps(state, steps),
+        "step_results": "\n\n".join(
+            f"## {outcome.step.step}\n{outcome.result}" for outcome in ordered
+        ),
+        "step_obstacles": "\n".join(
+            f"- {outcome.step.step}: {outcome.obstacles}"
+            for outcome in ordered
+            if outcome.obstacles
+        ),
+        "success": feedback.success,
+        "feedback": feedback,
+        "messages": [message for outcome in ordered for message in outcome.messages],
     }
 
 
@@ -331,22 +1204,16 @@ async def act_action(state: State, config: RunnableConfig) -> None:
               results, and messages from the action response.
     """
 
-    prompt = PromptTemplate(
-        template=ACT_ACTION_PROMPT,
-        input_variables=[
-            "success" "comments",
-            "suggestions",
-            "context",
-            "result",
-            "step_result",
-            "format_instructions",
-        ],
-    )
+    # Steps run by the parallel scheduler are indexed as they finish
+    if Configuration.from_runnable_config(config).execution_mode == "sequential":
+        await remember_step(
+            state, config, state.next_steps[0], state.step_results, state.step_tool_results.values()
+        )
 
     action_response = await call_model(
         state,
         config=config,
-        custom_prompt=prompt,
+        custom_prompt=get_phase_prompt("act"),
         input_variables={
             "task_description": state.task_description,
             "success": state.success,
@@ -355,18 +1222,20 @@ async def act_action(state: State, config: RunnableConfig) -> None:
             "context": state.context,
             "result": state.results,
             "step_result": state.step_results,
-            "format_instructions": acting_parser.get_format_instructions(),
         },
         allow_tools=False,
         action=DemingAction.ACT,
+        output_schema=ActingOutput,
+    )
+    logger.debug("Act phase: %s", action_response.content)
+    action_content = await parse_action_output(
+        action_response, ActingOutput, DemingAction.ACT, config
     )
-    print(f"Act phase: {action_response.content}")
-    action_content = extract_json(action_response.content)
-    action_content = ActingOutput(**action_content)
     return {
         "current_status": action_content.current_status,
         "context": action_content.context,
         "results": action_content.result,
+        "replan": action_content.replan,
         "messages": [action_response],
     }
 
@@ -380,7 +1249,8 @@ async def generate_final_answer(
 
     This function constructs a final answer prompt using the task description
     and the current results, then calls a model to generate the final answer.
-    The generated answer is returned as a formatted string.
+    The generated answer is returned as a formatted string. If `stream_final_answer`
+    is enabled, its tokens are streamed as they are generated.
 
     Args:
         state (State): The current state of the agent, containing task context and relevant results.
@@ -390,77 +1260,127 @@ async def generate_final_answer(
         dict: A dictionary containing the final answer in Markdown format.
     """
 
-    prompt = PromptTemplate(
-        template=FINAL_ANSWER_PROMPT,
-        input_variables=[
-            "task_description",
-            "current_result",
-        ],
-    )
-    print(f"Step search triggered: {state.step_search_triggered}")
+    # The steps of the task are over, so its retrieval memory is no longer needed
+    RETRIEVAL_MEMORIES.clear(memory_id(state, config))
 
     action_response = await call_model(
         state,
         config=config,
-        custom_prompt=prompt,
+        custom_prompt=get_phase_prompt("final"),
         input_variables={
             "task_description": state.task_description,
             "current_result": state.results,
         },
         allow_tools=False,
         action=None,
+        stream=Configuration.from_runnable_config(config).stream_final_answer,
     )
-    print(f"Final answer generation phase: {action_response}")
+    logger.debug("Final answer generation phase: %s", action_response)
     action_content = action_response.content
-    return {"final_answer": action_content}
+    time_to_first_token = action_response.response_metadata.get("time_to_first_token")
+    return {
+        "final_answer": action_content,
+        "time_to_first_token": (
+            {} if time_to_first_token is None else {"final": time_to_first_token}
+        ),
+    }
 
 
-def route_after_check_phase(state: State) -> Literal["act", "do"]:
+def past_task_limits(state: State, config: RunnableConfig) -> bool:
+    """
+    Return whether the task deadline is past or the task used up its budget of LLM calls or
+    tokens, in which case the final answer is generated right away.
+    """
+
+    if deadline_exceeded(state.deadline_at):
+        logger.warning("Task deadline exceeded, generating the final answer from the current results")
+        return True
+    run_id = get_run_id(config, state)
+    policy = RetryPolicy.from_configuration(Configuration.from_runnable_config(config))
+    if policy.budget_exhausted(run_id, state.llm_usage_baseline):
+        logger.warning("LLM budget exhausted, generating the final answer from the current results")
+        return True
+    return False
+
+
+def route_after_check_phase(
+    state: State, config: RunnableConfig
+) -> Literal["act", "do", "final_answer_generation"]:
     """
     Determine whether to proceed with acting or redoing the current step.
 
-    If the step was successful or the maximum number of retries has been exceeded, proceed to the act phase.
-    Otherwise, redo the current step.
+    If the step was successful or the retry policy gives up on it, proceed to the act phase.
+    Otherwise, redo the current step. Past the task deadline (or once the LLM budget is used up),
+    generate the final answer instead.
     """
 
-    if state.success or state.n_retries > MAX_N_RETRIES:
+    if past_task_limits(state, config):
+        return "final_answer_generation"
+    policy = RetryPolicy.from_configuration(Configuration.from_runnable_config(config))
+    if state.success or not policy.should_retry_step(
+        state.n_retries, get_run_id(config, state), state.llm_usage_baseline
+    ):
         return "act"
     else:
         return "do"
 
 
+def route_after_plan_phase(
+    state: State, config: RunnableConfig
+) -> Literal["do", "parallel_steps", "final_answer_generation"]:
+    """
+    Determine whether the planned steps are executed one at a time or concurrently.
+
+    In 'parallel' execution mode, the whole plan is handed to the parallel scheduler.
+    Otherwise, the first step of the plan proceeds to the do phase. Past the task
+    deadline, the final answer is generated instead.
+    """
+
+    if past_task_limits(state, config):
+        return "final_answer_generation"
+    configuration = Configuration.from_runnable_config(config)
+    if configuration.execution_mode == "parallel":
+        return "parallel_steps"
+    return "do"
+
+
 def route_after_act_phase(
-    state: State,
+    state: State, config: RunnableConfig
 ) -> Literal["final_answer_generation", "clean_vars"]:
     """
     Determine the next step in the workflow based on the current status of the task.
 
-    If the task is completed, proceed to the final answer generation phase.
+    If the task is completed (or the task deadline or LLM budget is past), proceed to the final answer generation phase.
     Otherwise, proceed to the clean variables phase to clean up variables used during the current step.
     """
 
-    if state.current_status == "completed":
+    if state.current_status == "completed" or past_task_limits(state, config):
         return "final_answer_generation"
     else:
         return "clean_vars"
 
 
 def route_tools_usage(
-    state: State,
-) -> Literal["check", "tools"]:
+    state: State, config: RunnableConfig
+) -> Literal["check", "tools", "final_answer_generation"]:
     """
     Route the workflow to the check or tools phase based on the existence of tool calls in the last message.
 
     If the last message contains tool calls, the workflow proceeds to the tools phase to execute the requested actions.
     Otherwise, it proceeds to the check phase to evaluate the results of the current step.
+    Past the task deadline, the final answer is generated instead.
 
     Args:
         state (State): The current state of the agent.
+        config (RunnableConfig): The configuration settings for the agent's execution.
 
     Returns:
-        Literal["check", "tools"]: The next phase in the workflow.
+        Literal["check", "tools", "final_answer_generation"]: The next phase in the workflow.
     """
 
+    if past_task_limits(state, config):
+        return "final_answer_generation"
+
     last_message = state.messages[-1]
     if not isinstance(last_message, AIMessage):
         raise ValueError(
@@ -474,7 +1394,7 @@ def route_tools_usage(
     return "tools"
 
 
-def clean_step_vars(state: State) -> None:
+def clean_step_vars(state: State, config: RunnableConfig) -> None:
     """
     Reset step-specific variables to their default values.
 
@@ -482,18 +1402,64 @@ def clean_step_vars(state: State) -> None:
     such as the step results, obstacles, number of retries, success status, and
     feedback. This is done to prepare for the next step in the workflow.
 
+    In 'incremental' planning mode the finished step is popped from the plan, keeping
+    the remaining steps unless a new plan is needed (the step failed after all its
+    retries, or the act phase flagged that the context changed materially). The
+    configured message retention policy is also applied to the finished step.
+
     Args:
         state (State): The current state of the agent.
+        config (RunnableConfig): The configuration settings for the agent's execution.
 
     Returns:
         dict: A dictionary with the default values for the step-specific variables.
     """
 
+    configuration = Configuration.from_runnable_config(config)
+    remaining_steps = []
+    plan_calls_avoided = state.plan_calls_avoided
+    if (
+        configuration.planning_mode == "incremental"
+        and configuration.execution_mode == "sequential"
+        and state.success
+        and not state.replan
+    ):
+        remaining_steps = state.next_steps[1:]
+        if remaining_steps:
+            plan_calls_avoided += 1
+            logger.info(
+                "Skipping re-planning, %s planned steps remaining (%s plan calls avoided)",
+                len(remaining_steps),
+                plan_calls_avoided,
+            )
+
     return {
+        **apply_message_retention(state, configuration),
         "step_results": None,
         "step_obstacles": None,
         "n_retries": 0,
         "success": False,
         "feedback": None,
-        "step_search_triggered": False,
+        "step_tool_rounds": 0,
+        "step_tool_results": {},
+        "replan": False,
+        "next_steps": remaining_steps,
+        "plan_calls_avoided": plan_calls_avoided,
     }
+
+
+def route_after_clean_phase(
+    state: State, config: RunnableConfig
+) -> Literal["plan", "do", "final_answer_generation"]:
+    """
+    Determine whether a new plan is needed before executing the next step.
+
+    If planned steps remain (only in 'incremental' planning mode), proceed straight to the do phase.
+    Otherwise, go back to the plan phase. Past the task deadline, generate the final answer instead.
+    """
+
+    if past_task_limits(state, config):
+        return "final_answer_generation"
+    if state.next_steps:
+        return "do"
+    return "plan"
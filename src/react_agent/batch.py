@@ -0,0 +1,280 @@
+"""Batch execution of many PDCA tasks on a single event loop.
+
+Tasks run concurrently up to a limit, pulling the next task from the input only when
+a running one finishes, so arbitrarily large inputs are consumed lazily. Every task
+shares the process-wide rate limits of the LLM provider and the search tool (see
+`rate_limits` in the configuration), has an optional timeout, and its result is
+yielded as soon as it finishes.
+
+Usage (one task per line, either plain text or JSON with 'id' and 'task'):
+    python -m react_agent.batch tasks.jsonl --concurrency 20 --timeout 600 > results.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Union
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from react_agent.ratelimit import RATE_LIMITERS
+from src.settings import custom_logger
+
+
+logger = custom_logger("Batch")
+
+
+@dataclass
+class TaskResult:
+    """Outcome of a task of a batch."""
+
+    id: str
+    task: str
+    status: str  # 'completed', 'timeout' or 'error'
+    latency: float
+    llm_calls: int
+    final_answer: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchReport:
+    """Aggregate statistics of a batch."""
+
+    results: List[TaskResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def add(self, result: TaskResult) -> None:
+        """Record the result of a task."""
+
+        self.results.append(result)
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the throughput, latency percentiles and LLM calls of the batch."""
+
+        latencies = sorted(result.latency for result in self.results)
+        statuses: Dict[str, int] = {}
+        for result in self.results:
+            statuses[result.status] = statuses.get(result.status, 0) + 1
+        return {
+            "tasks": len(self.results),
+            **statuses,
+            "elapsed": self.elapsed,
+            "throughput_tasks_per_second": (
+                len(self.results) / self.elapsed if self.elapsed else 0.0
+            ),
+            "latency_p50": _percentile(latencies, 0.50),
+            "latency_p95": _percentile(latencies, 0.95),
+            "llm_calls_per_task": (
+                statistics.fmean(result.llm_calls for result in self.results)
+                if self.results
+                else 0.0
+            ),
+            "rate_limits": RATE_LIMITERS.stats(),
+        }
+
+
+def _percentile(ordered: List[float], quantile: float) -> Optional[float]:
+    """Return a quantile of sorted values (nearest rank)."""
+
+    return ordered[int(quantile * (len(ordered) - 1))] if ordered else None
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Callback counting the chat model calls of a task."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        """Initialize the counter."""
+
+        self.calls = 0
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, **kwargs: Any) -> None:
+        """Count a chat model call."""
+
+        self.calls += 1
+
+
+def _parse_task(index: int, task: Union[str, Dict[str, Any]]) -> Dict[str, str]:
+    """Normalize a task into its id and description."""
+
+    if isinstance(task, str):
+        return {"id": str(index), "task": task}
+    return {"id": str(task.get("id", index)), "task": task["task"]}
+
+
+async def run_task(
+    graph: Runnable,
+    task_id: str,
+    task: str,
+    config: Optional[RunnableConfig] = None,
+    timeout: Optional[float] = None,
+) -> TaskResult:
+    """
+    Run a single task through the graph, catching its errors and timeout.
+
+    Args:
+        graph (Runnable): The compiled graph.
+        task_id (str): The id of the task (also used as its thread id).
+        task (str): The description of the task.
+        config (RunnableConfig, optional): The base config of the runs. Defaults to None.
+        timeout (float, optional): Maximum seconds for the task. Defaults to None (no limit).
+
+    Returns:
+        TaskResult: The outcome of the task.
+    """
+
+    config = config or {}
+    counter = LLMCallCounter()
+    task_config: RunnableConfig = {
+        **config,
+        "callbacks": [*(config.get("callbacks") or []), counter],
+        "configurable": {**config.get("configurable", {}), "thread_id": task_id},
+    }
+    start = time.perf_counter()
+    try:
+        state = await asyncio.wait_for(
+            graph.ainvoke({"messages": [HumanMessage(content=task)]}, task_config),
+            timeout,
+        )
+        status, final_answer, error = "completed", state.get("final_answer"), None
+    except asyncio.TimeoutError:
+        status, final_answer, error = "timeout", None, f"Timed out after {timeout}s"
+    except Exception as e:
+        logger.warning("Task '%s' failed: %r", task_id, e)
+        status, final_answer, error = "error", None, repr(e)
+    return TaskResult(
+        id=task_id,
+        task=task,
+        status=status,
+        latency=time.perf_counter() - start,
+        llm_calls=counter.calls,
+        final_answer=final_answer,
+        error=error,
+    )
+
+
+async def run_batch(
+    tasks: Iterable[Union[str, Dict[str, Any]]],
+    graph: Optional[Runnable] = None,
+    config: Optional[RunnableConfig] = None,
+    concurrency: int = 10,
+    timeout: Optional[float] = None,
+    report: Optional[BatchReport] = None,
+) -> AsyncIterator[TaskResult]:
+    """
+    Run many tasks concurrently, yielding their results as they finish.
+
+    Args:
+        tasks (Iterable[Union[str, Dict[str, Any]]]): The tasks, as descriptions or
+            dictionaries with a 'task' (and optionally an 'id'). Consumed lazily.
+        graph (Runnable, optional): The compiled graph. Defaults to the agent graph.
+        config (RunnableConfig, optional): The base config of the runs (e.g. its 'configurable'). Defaults to None.
+        concurrency (int, optional): Maximum number of tasks running at the same time. Defaults to 10.
+        timeout (float, optional): Maximum seconds for each task. Defaults to None (no limit).
+        report (BatchReport, optional): Report collecting the results and the elapsed time. Defaults to None.
+
+    Yields:
+        TaskResult: The outcome of each task, in completion order.
+    """
+
+    if graph is None:
+        from react_agent.graph import graph
+
+    start = time.perf_counter()
+    pending: set = set()
+    inputs = iter(enumerate(tasks))
+    exhausted = False
+    try:
+        while pending or not exhausted:
+            # Keep the pipeline full without reading the input ahead of the running tasks
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    index, task = next(inputs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                parsed = _parse_task(index, task)
+                pending.add(
+                    asyncio.ensure_future(
+                        run_task(graph, parsed["id"], parsed["task"], config, timeout)
+                    )
+                )
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if report is not None:
+                    report.add(result)
+                    report.elapsed = time.perf_counter() - start
+                yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _read_tasks(path: str) -> Iterable[Union[str, Dict[str, Any]]]:
+    """Read the tasks of a file (or stdin if '-'), one per line."""
+
+    with open(path) if path != "-" else sys.stdin as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line) if line.startswith("{") else line
+
+
+async def _main(args: argparse.Namespace) -> None:
+    """Run the batch of the CLI, writing a JSON line per finished task."""
+
+    report = BatchReport()
+    config: RunnableConfig = {"configurable": json.loads(args.configurable)}
+    if args.recursion_limit:
+        config["recursion_limit"] = args.recursion_limit
+    output = open(args.output, "w") if args.output != "-" else sys.stdout
+    try:
+        async for result in run_batch(
+            _read_tasks(args.tasks),
+            config=config,
+            concurrency=args.concurrency,
+            timeout=args.timeout,
+            report=report,
+        ):
+            output.write(json.dumps(asdict(result)) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        # Close the pooled search connections while their event loop is still running
+        from react_agent.search_backends import close_search_backends
+
+        await close_search_backends()
+    print(json.dumps(report.summary(), indent=2), file=sys.stderr)  # noqa: T201
+
+
+def main() -> None:
+    """Parse the arguments of the CLI and run the batch."""
+
+    parser = argparse.ArgumentParser(description="Run many PDCA tasks concurrently.")
+    parser.add_argument("tasks", help="File with one task per line (text or JSON with 'id' and 'task'), '-' for stdin")
+    parser.add_argument("--output", default="-", help="File for the JSON lines of the results ('-' for stdout)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Tasks running at the same time")
+    parser.add_argument("--timeout", type=float, default=None, help="Maximum seconds for each task")
+    parser.add_argument("--recursion-limit", type=int, default=None, help="Recursion limit of each run")
+    parser.add_argument(
+        "--configurable",
+        default="{}",
+        help="JSON of configuration values (e.g. '{\"rate_limits\": {\"llm\": 5, \"search\": 1}}')",
+    )
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""Token budgets for the variables rendered into the phase prompts.
+
+The context, the global results and the feedback are rendered into every phase prompt,
+so input tokens (and latency) grow with every PDCA cycle. Each phase can be given a
+budget for these variables: when the prompt variables exceed it, the largest fields
+are truncated, windowed or summarized until they fit, and a per-field token report
+is recorded for every LLM call of the phase. Phases without a budget are left alone
+(their variables are not even tokenized).
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+
+from react_agent.configuration import Configuration
+from react_agent.utils import RunRecords
+from src.settings import custom_logger
+
+
+logger = custom_logger("Token Budget")
+
+# Prompt variables that can be shortened to fit a budget
+TRIMMABLE_FIELDS: Set[str] = {
+    "context",
+    "previous_feedback",
+    "previous_steps",
+    "results",
+    "result",
+    "current_result",
+    "step_results",
+    "step_result",
+    "obstacles",
+    "comments",
+    "suggestions",
+    "system_context",
+    "system_previous_feedback",
+}
+
+_ELLIPSIS = "\n[...]\n"
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(name: str):
+    """Return the tiktoken encoding, or None if it is not available (e.g. offline)."""
+
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning("Tokenizer '%s' not available, approximating token counts: %r", name, e)
+        return None
+
+
+async def load_encoding(name: str = "o200k_base") -> None:
+    """Load the tiktoken encoding in a worker thread, as it may be downloaded on first use."""
+
+    await asyncio.to_thread(_encoding, name)
+
+
+def count_tokens(text: str, encoding: str = "o200k_base") -> int:
+    """
+    Count the tokens of a text.
+
+    Uses tiktoken when available, and approximates 4 characters per token otherwise.
+
+    Args:
+        text (str): The text to measure.
+        encoding (str): Name of the tiktoken encoding.
+
+    Returns:
+        int: The number of tokens.
+    """
+
+    if not text:
+        return 0
+    enc = _encoding(encoding)
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _slice_tokens(text: str, start: int, end: Optional[int], encoding: str) -> str:
+    """Return the text between two token positions."""
+
+    enc = _encoding(encoding)
+    if enc is None:
+        return text[start * 4 : None if end is None else end * 4]
+    return enc.decode(enc.encode(text, disallowed_special=())[start:end])
+
+
+def truncate_tokens(text: str, max_tokens: int, strategy: str, encoding: str = "o200k_base") -> str:
+    """
+    Shorten a text to a number of tokens.
+
+    Args:
+        text (str): The text to shorten.
+        max_tokens (int): The maximum number of tokens to keep.
+        strategy (str): 'truncate' keeps the beginning of the text, 'window' keeps its end.
+        encoding (str): Name of the tiktoken encoding.
+
+    Returns:
+        str: The shortened text, marked with an ellipsis where content was dropped.
+    """
+
+    n_tokens = count_tokens(text, encoding)
+    if n_tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return _ELLIPSIS.strip()
+    if strategy == "window":
+        return _ELLIPSIS.lstrip() + _slice_tokens(text, n_tokens - max_tokens, None, encoding)
+    return _slice_tokens(text, 0, max_tokens, encoding) + _ELLIPSIS.rstrip()
+
+
+def allocate_budget(sizes: Dict[str, int], budget: int) -> Dict[str, int]:
+    """
+    Split a token budget between fields, shrinking only the largest ones.
+
+    Fields smaller than their fair share keep their size, and the remaining budget is
+    split evenly between the larger fields (water-filling).
+
+    Args:
+        sizes (Dict[str, int]): The number of tokens of each field.
+        budget (int): The total number of tokens available.
+
+    Returns:
+        Dict[str, int]: The number of tokens allowed for each field.
+    """
+
+    allowed = {}
+    remaining = dict(sizes)
+    budget = max(budget, 0)
+    while remaining:
+        share = budget // len(remaining)
+        small = {name: size for name, size in remaining.items() if size <= share}
+        if not small:
+            for name in remaining:
+                allowed[name] = share
+            break
+        for name, size in small.items():
+            allowed[name] = size
+            budget -= size
+            del remaining[name]
+    return allowed
+
+
+@dataclass
+class TokenReport:
+    """Token usage by prompt variable of a single LLM call."""
+
+    phase: str
+    budget: Optional[int]
+    tokens: Dict[str, int] = field(default_factory=dict)
+    trimmed: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        """Return the total number of tokens of the (trimmed) prompt variables."""
+
+        return sum(self.trimmed.get(name, tokens) for name, tokens in self.tokens.items())
+
+
+class TokenReports:
+    """Per-run record of the token reports of every LLM call."""
+
+    def __init__(self) -> None:
+        """Initialize an empty record."""
+
+        self._reports: Dict[str, List[TokenReport]] = RunRecords(list)
+        self._lock = threading.Lock()
+
+    def add(self, run_id: str, report: TokenReport) -> None:
+        """Record the report of an LLM call."""
+
+        with self._lock:
+            self._reports[run_id].append(report)
+
+    def get(self, run_id: str = "default") -> List[TokenReport]:
+        """Return the reports of a run."""
+
+        with self._lock:
+            return list(self._reports.get(run_id, []))
+
+    def clear(self, run_id: str = None) -> None:
+        """Clear the reports of a run, or every report if no run is given."""
+
+        with self._lock:
+            if run_id is None:
+                self._reports.clear()
+            else:
+                self._reports.pop(run_id, None)
+
+
+TOKEN_REPORTS = TokenReports()
+
+
+async def _summarize(
+    phase: str,
+    name: str,
+    text: str,
+    max_tokens: int,
+    task_description: Optional[str],
+    configuration: Configuration,
+    config: RunnableConfig,
+) -> str:
+    """Summarize a field with the model, falling back to truncation on failure."""
+
+    # Imported here to avoid a circular import with the utilities loading the models
+    from react_agent.metrics import record_llm_call
+    from react_agent.ratelimit import throttle
+    from react_agent.utils import get_message_text, load_routed_model
+    from src.prompts import SUMMARIZE_FIELD_PROMPT
+
+    try:
+        await throttle("llm", configuration)
+        start = time.perf_counter()
+        response = await load_routed_model(configuration.model, configuration).ainvoke(
+            SUMMARIZE_FIELD_PROMPT.format(
+                field=name,
+                task_description=task_description,
+                text=text,
+                max_tokens=max_tokens,
+            ),
+            config,
+        )
+        # Counted in the costs of the phase (and in the LLM budgets of the task)
+        record_llm_call(config, phase, configuration.model, response, time.perf_counter() - start)
+        summary = get_message_text(response)
+    except Exception as e:
+        logger.warning("Could not summarize '%s', truncating it instead: %r", name, e)
+        summary = text
+    return truncate_tokens(summary, max_tokens, "truncate")
+
+
+async def fit_to_budget(
+    phase: str,
+    variables: Dict[str, Any],
+    configuration: Configuration,
+    config: RunnableConfig,
+    task_description: Optional[str] = None,
+) -> Tuple[Dict[str, Any], TokenReport]:
+    """
+    Shorten the prompt variables of a phase so they fit its token budget.
+
+    Only the fields in `TRIMMABLE_FIELDS` are shortened; the other variables
+    (e.g. the format instructions or the step description) count towards the
+    budget but are never modified.
+
+    Args:
+        phase (str): The phase issuing the LLM call.
+        variables (Dict[str, Any]): The prompt variables.
+        configuration (Configuration): The agent configuration.
+        config (RunnableConfig): The configuration of the run (used for summarizing).
+        task_description (str, optional): The main task, given as context when summarizing.
+
+    Returns:
+        Tuple[Dict[str, Any], TokenReport]: The variables fitting the budget and the token report.
+    """
+
+    budget = configuration.prompt_budgets.get(phase)
+    if budget is None:
+        return variables, TokenReport(phase=phase, budget=None)
+
+    await load_encoding()
+    texts = {name: "" if value is None else str(value) for name, value in variables.items()}
+    report = TokenReport(
+        phase=phase,
+        budget=budget,
+        tokens={name: count_tokens(text) for name, text in texts.items()},
+    )
+    if report.total <= budget:
+        return variables, report
+
+    trimmable = {
+        name: tokens
+        for name, tokens in report.tokens.items()
+        if name in TRIMMABLE_FIELDS and tokens
+    }
+    fixed = report.total - sum(trimmable.values())
+    allowed = allocate_budget(trimmable, budget - fixed)
+
+    fitted = dict(variables)
+    for name, max_tokens in allowed.items():
+        if trimmable[name] <= max_tokens:
+            continue
+        strategy = configuration.prompt_budget_strategies.get(
+            name, configuration.prompt_budget_strategy
+        )
+        if strategy == "summarize":
+            fitted[name] = await _summarize(
+                phase, name, texts[name], max_tokens, task_description, configuration, config
+            )
+        else:
+            fitted[name] = truncate_tokens(texts[name], max_tokens, strategy)
+        report.trimmed[name] = count_tokens(fitted[name])
+
+    logger.info(
+        "Prompt variables of phase '%s' trimmed to %s tokens (budget: %s): %s",
+        phase,
+        report.total,
+        budget,
+        report.trimmed,
+    )
+    return fitted, report
@@ -0,0 +1,423 @@
+"""Generic cache stores shared by the agent's caching layers.
+
+It includes an in-memory LRU store, persistent SQLite and mmap-backed stores and a
+tiered store combining them, plus a small TTL policy (with stale-while-revalidate support) on top.
+"""
+
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, Literal, Optional, Sequence, Tuple
+
+
+@dataclass
+class CacheEntry:
+    """A cached value along with the time (epoch seconds) it was stored."""
+
+    value: Any
+    created_at: float
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters of a cache."""
+
+    hits: int = 0
+    stale_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Return the ratio of lookups served from the cache."""
+
+        served = self.hits + self.stale_hits + self.semantic_hits
+        lookups = served + self.misses
+        return served / lookups if lookups else 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        """Return the counters (and hit rate) as a dictionary."""
+
+        return {**asdict(self), "hit_rate": self.hit_rate}
+
+
+class CacheStore:
+    """Interface of a key-value store holding `CacheEntry` objects."""
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry stored under the key, if any."""
+
+        raise NotImplementedError
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        """Store an entry under the key."""
+
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """Remove the entry stored under the key, if any."""
+
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Remove every entry."""
+
+        raise NotImplementedError
+
+    def items(self) -> Iterator[Tuple[str, CacheEntry]]:
+        """Iterate over every (key, entry) pair."""
+
+        raise NotImplementedError
+
+
+class MemoryStore(CacheStore):
+    """Thread-safe in-memory store with LRU eviction."""
+
+    def __init__(self, max_size: int = 1024) -> None:
+        """
+        Initialize the store.
+
+        Args:
+            max_size (int): Maximum number of entries kept before evicting the least recently used.
+        """
+
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry stored under the key, if any."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        """Store an entry under the key, evicting the least recently used ones if full."""
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        """Remove the entry stored under the key, if any."""
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def items(self) -> Iterator[Tuple[str, CacheEntry]]:
+        """Iterate over a snapshot of every (key, entry) pair."""
+
+        with self._lock:
+            return iter(list(self._entries.items()))
+
+
+class SqliteStore(CacheStore):
+    """Persistent store backed by a SQLite table, with JSON-encoded values."""
+
+    def __init__(self, path: str, table: str = "cache") -> None:
+        """
+        Initialize the store, creating the table if needed.
+
+        Args:
+            path (str): Path to the SQLite database file.
+            table (str): Name of the table holding the entries.
+        """
+
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry stored under the key, if any."""
+
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(value=json.loads(row[0]), created_at=row[1])
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        """Store an entry under the key."""
+
+        value = json.dumps(entry.value, default=str)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, entry.created_at),
+            )
+
+    def delete(self, key: str) -> None:
+        """Remove the entry stored under the key, if any."""
+
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        """Remove every entry."""
+
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def items(self) -> Iterator[Tuple[str, CacheEntry]]:
+        """Iterate over every (key, entry) pair."""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value, created_at FROM {self.table}"
+            ).fetchall()
+        for key, value, created_at in rows:
+            yield key, CacheEntry(value=json.loads(value), created_at=created_at)
+
+
+class MmapStore(CacheStore):
+    """
+    Persistent append-only store, read through a memory map.
+
+    Entries are appended to a file as JSON lines, and an in-memory index keeps the
+    offset of the latest record of each key, so lookups are a single slice of the
+    mapped file. Deleted keys are recorded as tombstones. The file can be compacted
+    to drop overwritten records.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize the store, rebuilding the index from the file if it exists.
+
+        Args:
+            path (str): Path to the file holding the entries.
+        """
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._file = open(path, "a+b")
+        self._mmap: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        self._file.seek(0)
+        offset = 0
+        for line in self._file:
+            record = json.loads(line)
+            if record.get("deleted"):
+                self._index.pop(record["key"], None)
+            else:
+                self._index[record["key"]] = (offset, len(line))
+            offset += len(line)
+
+    def _read(self, offset: int, length: int) -> bytes:
+        """Read a record, remapping the file if it grew since the last mapping."""
+
+        if self._mmap is None or offset + length > self._mapped_size:
+            if self._mmap is not None:
+                self._mmap.close()
+            self._file.flush()
+            self._mapped_size = os.fstat(self._file.fileno()).st_size
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap[offset : offset + length]
+
+    def _append(self, record: Dict[str, Any]) -> Tuple[int, int]:
+        """Append a record to the file, returning its offset and length."""
+
+        line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(line)
+        self._file.flush()
+        return offset, len(line)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry stored under the key, if any."""
+
+        with self._lock:
+            location = self._index.get(key)
+            if location is None:
+                return None
+            record = json.loads(self._read(*location))
+        return CacheEntry(value=record["value"], created_at=record["created_at"])
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        """Store an entry under the key."""
+
+        with self._lock:
+            self._index[key] = self._append(
+                {"key": key, "value": entry.value, "created_at": entry.created_at}
+            )
+
+    def delete(self, key: str) -> None:
+        """Remove the entry stored under the key, if any."""
+
+        with self._lock:
+            if self._index.pop(key, None) is not None:
+                self._append({"key": key, "deleted": True})
+
+    def clear(self) -> None:
+        """Remove every entry."""
+
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._file.truncate(0)
+            self._index.clear()
+
+    def items(self) -> Iterator[Tuple[str, CacheEntry]]:
+        """Iterate over every (key, entry) pair."""
+
+        with self._lock:
+            keys = list(self._index)
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                yield key, entry
+
+    def compact(self) -> None:
+        """Rewrite the file keeping only the latest record of each live key."""
+
+        entries = list(self.items())
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._file.truncate(0)
+            self._index = {
+                key: self._append(
+                    {"key": key, "value": entry.value, "created_at": entry.created_at}
+                )
+                for key, entry in entries
+            }
+
+
+class TieredStore(CacheStore):
+    """Store chaining several stores, from the fastest to the most persistent one."""
+
+    def __init__(self, stores: Sequence[CacheStore]) -> None:
+        """
+        Initialize the store.
+
+        Args:
+            stores (Sequence[CacheStore]): The stores to chain, fastest first.
+        """
+
+        self.stores = list(stores)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry from the first store holding it, back-filling the faster stores."""
+
+        for idx, store in enumerate(self.stores):
+            entry = store.get(key)
+            if entry is not None:
+                for upper in self.stores[:idx]:
+                    upper.set(key, entry)
+                return entry
+        return None
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        """Store an entry in every store."""
+
+        for store in self.stores:
+            store.set(key, entry)
+
+    def delete(self, key: str) -> None:
+        """Remove the entry from every store."""
+
+        for store in self.stores:
+            store.delete(key)
+
+    def clear(self) -> None:
+        """Remove every entry from every store."""
+
+        for store in self.stores:
+            store.clear()
+
+    def items(self) -> Iterator[Tuple[str, CacheEntry]]:
+        """Iterate over every (key, entry) pair of the most persistent store."""
+
+        return self.stores[-1].items()
+
+
+class TTLCache:
+    """
+    Time-to-live policy on top of a `CacheStore`.
+
+    Entries younger than `ttl` are fresh. Entries older than `ttl` but within the
+    `stale_ttl` window are stale: they can still be served while being refreshed in
+    the background (stale-while-revalidate). Older entries are treated as misses.
+    A `ttl` of None means entries never expire.
+    """
+
+    def __init__(
+        self,
+        store: CacheStore,
+        ttl: Optional[float] = None,
+        stale_ttl: float = 0.0,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            store (CacheStore): The store holding the entries.
+            ttl (float, optional): Seconds during which an entry is fresh. Defaults to None (no expiration).
+            stale_ttl (float): Extra seconds during which an expired entry can be served as stale.
+        """
+
+        self.store = store
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def lookup(
+        self, key: str, ignore_ttl: bool = False
+    ) -> Tuple[Optional[Any], Literal["fresh", "stale", "miss"]]:
+        """
+        Look up a key, classifying the result as fresh, stale or miss.
+
+        Args:
+            key (str): The key to look up.
+            ignore_ttl (bool): If True, any stored entry is considered fresh.
+
+        Returns:
+            Tuple[Optional[Any], str]: The cached value (None on a miss) and its status.
+        """
+
+        entry = self.store.get(key)
+        if entry is None:
+            return None, "miss"
+        if ignore_ttl or self.ttl is None:
+            return entry.value, "fresh"
+
+        age = time.time() - entry.created_at
+        if age <= self.ttl:
+            return entry.value, "fresh"
+        if age <= self.ttl + self.stale_ttl:
+            return entry.value, "stale"
+        return None, "miss"
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a value under the key, timestamped now."""
+
+        self.store.set(key, CacheEntry(value=value, created_at=time.time()))
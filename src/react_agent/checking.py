@@ -0,0 +1,111 @@
+"""Deterministic checks of the results of a step, the first tier of the tiered check phase.
+
+Trivially failed steps (no results, or malformed JSON for a step expected to produce
+JSON) are rejected and steps whose
+results cover the expected outcome with no obstacles are accepted without calling
+any model. Anything else is left to the model tiers.
+"""
+
+import json
+import re
+from typing import Optional
+
+from react_agent.ranking import tokenize
+from src.structs import CheckingOutput, PlanningStep
+
+
+# Obstacles reported by the do phase meaning there were none
+_NO_OBSTACLES = re.compile(
+    r"^(none|n/?a|no|nothing|-|no (obstacles|issues|blockers)( (found|identified|encountered))?)\.?$"
+)
+
+_JSON = re.compile(r"\bjson\b", re.IGNORECASE)
+
+
+def has_obstacles(obstacles: Optional[str]) -> bool:
+    """Return whether the do phase reported actual obstacles."""
+
+    if obstacles is None:
+        return False
+    return not _NO_OBSTACLES.match(obstacles.strip().lower())
+
+
+def expects_json(step: PlanningStep) -> bool:
+    """Return whether a step is expected to produce JSON (as said by its details or expected outcome)."""
+
+    return bool(_JSON.search(f"{step.details} {step.expected_outcome}"))
+
+
+def keyword_overlap(expected_outcome: str, results: str) -> float:
+    """
+    Return the share of the keywords of the expected outcome found in the results.
+
+    Args:
+        expected_outcome (str): The expected outcome of the step.
+        results (str): The results of the step.
+
+    Returns:
+        float: The share of the (non stopword) terms of the expected outcome found in the results.
+    """
+
+    keywords = set(tokenize(expected_outcome))
+    if not keywords:
+        return 0.0
+    return len(keywords & set(tokenize(results))) / len(keywords)
+
+
+def heuristic_check(
+    step: PlanningStep,
+    results: Optional[str],
+    obstacles: Optional[str],
+    min_keyword_overlap: float = 0.6,
+) -> Optional[CheckingOutput]:
+    """
+    Evaluate the results of a step without calling a model, when the verdict is obvious.
+
+    Args:
+        step (PlanningStep): The step that was executed.
+        results (str, optional): The results of the step.
+        obstacles (str, optional): The obstacles found while executing the step.
+        min_keyword_overlap (float, optional): Minimum share of the keywords of the expected
+            outcome found in the results for passing the step. Defaults to 0.6.
+
+    Returns:
+        CheckingOutput, optional: The evaluation, or None if it must be left to a model.
+    """
+
+    if not results or not results.strip():
+        return CheckingOutput(
+            success=False,
+            comments="The step produced no results.",
+            suggestions="Execute the step again, reporting what was found or done.",
+            confidence=1.0,
+        )
+
+    # Results opening with a bracket are often plain Markdown ("[1] Source", "[Paris](url)")
+    stripped = results.strip()
+    if stripped[0] in "{[" and expects_json(step):
+        try:
+            json.loads(stripped)
+        except ValueError:
+            return CheckingOutput(
+                success=False,
+                comments="The results of the step are malformed JSON.",
+                suggestions="Report the results as valid JSON.",
+                confidence=1.0,
+            )
+
+    if has_obstacles(obstacles):
+        return None
+    overlap = keyword_overlap(step.expected_outcome, results)
+    if overlap >= min_keyword_overlap:
+        return CheckingOutput(
+            success=True,
+            comments=(
+                f"The results cover {overlap:.0%} of the keywords of the expected outcome, "
+                "with no obstacles."
+            ),
+            suggestions=None,
+            confidence=overlap,
+        )
+    return None
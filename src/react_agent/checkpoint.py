@@ -0,0 +1,513 @@
+"""Local persistent checkpointer, for resuming interrupted runs.
+
+Checkpoints are stored in SQLite the same way the LangGraph savers do: the value of
+each channel is saved as a separate blob, keyed by its version, and only when the
+channel changed during the super-step. A checkpoint itself only records the versions
+of the channels, so growing channels that are rarely updated (e.g. the plan or the
+results) are not rewritten at every super-step.
+
+Values are serialized with msgpack (through the LangGraph serializer) and compressed
+with zlib when large enough, which keeps the message lists and the `PlanningStep`
+lists compact on disk.
+
+Runs checkpointed with a thread id can be resumed after a crash or a restart by
+invoking the graph again with no input and the same thread id: the completed
+super-steps (and the successful writes of a failed one) are not executed again.
+"""
+
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from src.settings import custom_logger
+from src.structs import (
+    ActingOutput,
+    CheckingOutput,
+    DemingAction,
+    DoingOutput,
+    PlanningOutput,
+    PlanningStep,
+)
+
+
+logger = custom_logger("Checkpoint")
+
+COMPRESSED_SUFFIX = "+zlib"
+
+# Types of the agent state deserialized from the checkpoints (besides the LangGraph ones)
+STATE_TYPES = (ActingOutput, CheckingOutput, DemingAction, DoingOutput, PlanningOutput, PlanningStep)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """Msgpack serializer compressing the values above a size threshold with zlib."""
+
+    def __init__(self, threshold: int = 256, level: int = 6, **kwargs: Any) -> None:
+        """
+        Initialize the serializer.
+
+        Args:
+            threshold (int, optional): Minimum size (in bytes) of the values to compress. Defaults to 256.
+            level (int, optional): The zlib compression level. Defaults to 6.
+            **kwargs: Arguments of the LangGraph serializer.
+        """
+
+        super().__init__(**kwargs)
+        self.threshold = threshold
+        self.level = level
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        """Serialize a value, compressing it if it is large enough and it pays off."""
+
+        type_, data = super().dumps_typed(obj)
+        if len(data) >= self.threshold:
+            compressed = zlib.compress(data, self.level)
+            if len(compressed) < len(data):
+                return type_ + COMPRESSED_SUFFIX, compressed
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        """Deserialize a value, decompressing it if needed."""
+
+        type_, payload = data
+        if type_.endswith(COMPRESSED_SUFFIX):
+            type_ = type_[: -len(COMPRESSED_SUFFIX)]
+            payload = zlib.decompress(payload)
+        return super().loads_typed((type_, payload))
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[int]):
+    """Checkpoint saver storing compact, per-channel checkpoints in a local SQLite database."""
+
+    def __init__(self, path: str, serde: Optional[SerializerProtocol] = None) -> None:
+        """
+        Open (or create) the database.
+
+        Args:
+            path (str): Path of the database file (':memory:' for a temporary database).
+            serde (SerializerProtocol, optional): The serializer. Defaults to a `CompactSerializer`.
+        """
+
+        super().__init__(
+            serde=serde or CompactSerializer(allowed_msgpack_modules=STATE_TYPES)
+        )
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def _ids(config: RunnableConfig) -> Tuple[str, str]:
+        """Return the thread id and checkpoint namespace of a config."""
+
+        configurable = config["configurable"]
+        return configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+    def _load_blobs(
+        self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions
+    ) -> Dict[str, Any]:
+        """Load the channel values of a checkpoint."""
+
+        values = {}
+        for channel, version in versions.items():
+            row = self._conn.execute(
+                "SELECT type, value FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is not None and row[0] != "empty":
+                values[channel] = self.serde.loads_typed(row)
+        return values
+
+    def _load_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str
+    ) -> List[Tuple[str, str, Any]]:
+        """Load the pending writes of a checkpoint."""
+
+        rows = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? "
+            "AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [
+            (task_id, channel, self.serde.loads_typed((type_, value)))
+            for task_id, channel, type_, value in rows
+        ]
+
+    def _build_tuple(self, row: Sequence[Any]) -> CheckpointTuple:
+        """Build a checkpoint tuple from a row of the checkpoints table."""
+
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, data, metadata_type, metadata = row
+        checkpoint = self.serde.loads_typed((type_, data))
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(
+                    thread_id, checkpoint_ns, checkpoint["channel_versions"]
+                ),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=self._load_writes(thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """
+        Get a checkpoint, or the latest one of the thread if the config has no checkpoint id.
+
+        Args:
+            config (RunnableConfig): The config of the checkpoint.
+
+        Returns:
+            Optional[CheckpointTuple]: The checkpoint, or None if not found.
+        """
+
+        thread_id, checkpoint_ns = self._ids(config)
+        query = "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params: Tuple[Any, ...] = (thread_id, checkpoint_ns)
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+            return self._build_tuple(row) if row is not None else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """
+        List the checkpoints matching the criteria, the latest first.
+
+        Args:
+            config (RunnableConfig, optional): Config with the thread (and namespace / checkpoint id) to list.
+            filter (Dict[str, Any], optional): Values the metadata must match.
+            before (RunnableConfig, optional): Only list the checkpoints created before this one.
+            limit (int, optional): Maximum number of checkpoints to list.
+
+        Yields:
+            CheckpointTuple: The matching checkpoints.
+        """
+
+        conditions, params = [], []
+        if config is not None:
+            configurable = config["configurable"]
+            conditions.append("thread_id = ?")
+            params.append(configurable["thread_id"])
+            if configurable.get("checkpoint_ns") is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(configurable["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            conditions.append("checkpoint_id < ?")
+            params.append(before_id)
+        query = "SELECT * FROM checkpoints"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                checkpoint_tuple = self._build_tuple(row)
+            yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """
+        Save a checkpoint, storing only the channels updated since the previous one.
+
+        Args:
+            config (RunnableConfig): The config of the parent checkpoint.
+            checkpoint (Checkpoint): The checkpoint to save.
+            metadata (CheckpointMetadata): The metadata of the checkpoint.
+            new_versions (ChannelVersions): The channels updated in this super-step, with their new versions.
+
+        Returns:
+            RunnableConfig: The config of the saved checkpoint.
+        """
+
+        thread_id, checkpoint_ns = self._ids(config)
+        checkpoint = checkpoint.copy()
+        values = checkpoint.pop("channel_values")
+        blobs = [
+            (
+                thread_id,
+                checkpoint_ns,
+                channel,
+                str(version),
+                *(self.serde.dumps_typed(values[channel]) if channel in values else ("empty", None)),
+            )
+            for channel, version in new_versions.items()
+        ]
+        type_, data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        type_,
+                        data,
+                        metadata_type,
+                        metadata_data,
+                    ),
+                )
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """
+        Save the writes of a task, so they are not repeated when resuming from the checkpoint.
+
+        Args:
+            config (RunnableConfig): The config of the checkpoint.
+            writes (Sequence[Tuple[str, Any]]): The (channel, value) writes of the task.
+            task_id (str): The id of the task.
+            task_path (str, optional): The path of the task. Defaults to "".
+        """
+
+        thread_id, checkpoint_ns = self._ids(config)
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special writes (e.g. errors, interrupts) replace the previous ones, regular writes are kept
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        rows = [
+            (
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+                task_path,
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO writes "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Delete the checkpoints, blobs and writes of a thread.
+
+        Args:
+            thread_id (str): The id of the thread.
+        """
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                for table in ("checkpoints", "blobs", "writes"):
+                    self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Asynchronous version of `get_tuple` (local database, run inline)."""
+
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Asynchronous version of `list` (local database, run inline)."""
+
+        for checkpoint_tuple in self.list(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Asynchronous version of `put` (local database, run inline)."""
+
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Asynchronous version of `put_writes` (local database, run inline)."""
+
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Asynchronous version of `delete_thread` (local database, run inline)."""
+
+        self.delete_thread(thread_id)
+
+    def size(self) -> Dict[str, int]:
+        """Return the number of rows and stored bytes of each table."""
+
+        with self._lock:
+            sizes = {}
+            for table, column in (("checkpoints", "checkpoint"), ("blobs", "value"), ("writes", "value")):
+                rows, size = self._conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(LENGTH({column})), 0) FROM {table}"
+                ).fetchone()
+                sizes[f"{table}_rows"] = rows
+                sizes[f"{table}_bytes"] = size
+            return sizes
+
+    def close(self) -> None:
+        """Close the database."""
+
+        with self._lock:
+            self._conn.close()
+
+
+def get_checkpointer(spec: Optional[str]) -> Optional[BaseCheckpointSaver]:
+    """
+    Build a checkpointer from its specification.
+
+    Args:
+        spec (str, optional): 'memory' for an in-memory checkpointer, or 'sqlite:<path>' for
+            a persistent local one. Empty or None disables checkpointing.
+
+    Returns:
+        Optional[BaseCheckpointSaver]: The checkpointer, or None.
+
+    Raises:
+        ValueError: If the specification is not supported.
+    """
+
+    if not spec:
+        return None
+    kind, _, target = spec.partition(":")
+    if kind == "memory":
+        return InMemorySaver()
+    if kind == "sqlite" and target:
+        logger.info("Checkpointing runs to '%s'", target)
+        return SqliteCheckpointSaver(target)
+    raise ValueError(f"Unsupported checkpointer '{spec}' (use 'memory' or 'sqlite:<path>')")
@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field, fields
-from typing import Annotated, Optional
+from typing import Annotated, Literal, Optional
 
 from langchain_core.runnables import RunnableConfig, ensure_config
 
@@ -64,6 +64,87 @@ class Configuration:
         },
     )
 
+    phase_models: dict[str, str] = field(
+        default_factory=dict,
+        metadata={
+            "description": "The model of each phase (plan, do, check, act and final), e.g. a cheaper one for "
+            "the check phase. Phases without one use the main model. Should be in the form: provider/model-name."
+        },
+    )
+
+    model_fallbacks: dict[str, list[str]] = field(
+        default_factory=dict,
+        metadata={
+            "description": "The models to fail over to (in order) when the provider of a model errors out or "
+            "rate-limits a call, e.g. {\"openai/gpt-4o-mini\": [\"anthropic/claude-3-5-haiku-latest\"]}. "
+            "Should be in the form: provider/model-name."
+        },
+    )
+
+    circuit_breaker_failures: int = field(
+        default=3,
+        metadata={
+            "description": "Consecutive failures of a model after which it is skipped by the model router "
+            "(its circuit is opened)."
+        },
+    )
+
+    circuit_breaker_reset: float = field(
+        default=30.0,
+        metadata={
+            "description": "Seconds before a model skipped by the model router is probed again with a single call."
+        },
+    )
+
+    router_min_health: float = field(
+        default=0.5,
+        metadata={
+            "description": "Health score (moving average of the successes of its calls, from 0 to 1) under "
+            "which a model is tried after its fallbacks."
+        },
+    )
+
+    model_prices: dict[str, dict[str, float]] = field(
+        default_factory=dict,
+        metadata={
+            "description": "Price (USD per million tokens) of the 'input', 'output' and optionally "
+            "'cached_input' tokens of each model, for the cost report of each phase."
+        },
+    )
+
+    check_mode: Literal["full", "tiered"] = field(
+        default="full",
+        metadata={
+            "description": "How the steps are evaluated. 'full' always calls the check model, while 'tiered' "
+            "first runs deterministic checks (empty results, malformed JSON, obstacles, keywords of the "
+            "expected outcome), then the cheaper check_model, and only calls the check model when the "
+            "previous tiers are not confident."
+        },
+    )
+
+    check_model: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "The cheaper model of the second tier of the 'tiered' check mode (skipped if not set). "
+            "Should be in the form: provider/model-name."
+        },
+    )
+
+    check_confidence_threshold: float = field(
+        default=0.8,
+        metadata={
+            "description": "Minimum confidence of the check_model evaluation for accepting it without the check model."
+        },
+    )
+
+    check_keyword_overlap: float = field(
+        default=0.6,
+        metadata={
+            "description": "Minimum share of the keywords of the expected outcome found in the results for "
+            "passing a step without obstacles with the deterministic checks alone."
+        },
+    )
+
     max_search_results: int = field(
         default=10,
         metadata={
@@ -71,6 +152,440 @@ class Configuration:
         },
     )
 
+    search_backend: Literal["tavily", "fixture", "sqlite"] = field(
+        default="tavily",
+        metadata={
+            "description": "Where the web searches are made. 'tavily' uses the Tavily API, while 'fixture' "
+            "(a JSON file of recorded results by query) and 'sqlite' (a SQLite full-text index of "
+            "documents) are local stand-ins read from search_backend_path."
+        },
+    )
+
+    search_backend_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "Path to the fixture file or the SQLite index of the local search backends."
+        },
+    )
+
+    search_timeout: float = field(
+        default=10.0,
+        metadata={
+            "description": "Seconds before a search request times out."
+        },
+    )
+
+    search_max_retries: int = field(
+        default=2,
+        metadata={
+            "description": "Retries (with exponential backoff) of a search request failing with a "
+            "transport error, rate limiting or a server error."
+        },
+    )
+
+    search_result_processing: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether the search results are deduplicated (by URL and near-duplicate snippets), "
+            "ranked against the step and trimmed before entering the prompts."
+        },
+    )
+
+    search_results_top_k: int = field(
+        default=5,
+        metadata={
+            "description": "The maximum number of results of each search kept after ranking."
+        },
+    )
+
+    search_results_max_chars: Optional[int] = field(
+        default=4000,
+        metadata={
+            "description": "The character budget of the snippets kept from each search (None for no budget)."
+        },
+    )
+
+    search_results_dedupe_threshold: float = field(
+        default=0.8,
+        metadata={
+            "description": "Minimum similarity (Jaccard of the word shingles) of two snippets for "
+            "dropping one of them as a near-duplicate."
+        },
+    )
+
+    search_cache: Literal["off", "on", "offline"] = field(
+        default="on",
+        metadata={
+            "description": "Caching of the search results. 'on' serves repeated (normalized) queries from "
+            "the cache, 'offline' only replays the recorded cache and never hits the network, and 'off' "
+            "disables the cache."
+        },
+    )
+
+    search_cache_ttl: Optional[float] = field(
+        default=3600.0,
+        metadata={
+            "description": "Seconds during which a cached search result is considered fresh (None for no expiration)."
+        },
+    )
+
+    search_cache_stale_ttl: float = field(
+        default=0.0,
+        metadata={
+            "description": "Extra seconds during which an expired search result is still served while being "
+            "refreshed in the background (stale-while-revalidate). 0 disables it."
+        },
+    )
+
+    search_cache_size: int = field(
+        default=1024,
+        metadata={
+            "description": "The maximum number of search results kept in the in-memory cache."
+        },
+    )
+
+    search_cache_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "Path to a SQLite file persisting the search cache (e.g. for replaying it offline)."
+        },
+    )
+
+    llm_cache_policies: dict[str, Literal["off", "exact", "semantic"]] = field(
+        default_factory=lambda: {
+            "plan": "off",
+            "do": "off",
+            "check": "off",
+            "act": "off",
+            "final": "off",
+        },
+        metadata={
+            "description": "The response cache policy of each phase (plan, do, check, act and final). "
+            "'exact' serves calls with the same rendered prompt, model and tools from the cache, and "
+            "'semantic' also serves near-duplicate prompts (requires llm_cache_embedding_model)."
+        },
+    )
+
+    llm_cache_store: Literal["memory", "sqlite", "mmap"] = field(
+        default="memory",
+        metadata={
+            "description": "Where the LLM responses are cached. 'sqlite' and 'mmap' persist them in "
+            "llm_cache_path, behind an in-memory LRU."
+        },
+    )
+
+    llm_cache_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "Path to the file persisting the LLM response cache."
+        },
+    )
+
+    llm_cache_size: int = field(
+        default=512,
+        metadata={
+            "description": "The maximum number of LLM responses kept in the in-memory cache."
+        },
+    )
+
+    llm_cache_ttl: Optional[float] = field(
+        default=None,
+        metadata={
+            "description": "Seconds during which a cached LLM response can be served (None for no expiration)."
+        },
+    )
+
+    llm_cache_embedding_model: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "The embedding model used by the semantic LLM cache tier. "
+            "Should be in the form: provider/model-name."
+        },
+    )
+
+    llm_cache_similarity_threshold: float = field(
+        default=0.97,
+        metadata={
+            "description": "Minimum cosine similarity for serving a near-duplicate prompt from the semantic cache."
+        },
+    )
+
+    message_retention: Literal["all", "last_n", "step", "summarize"] = field(
+        default="all",
+        metadata={
+            "description": "How messages are retained once a step is finished. 'all' keeps every message, "
+            "'last_n' keeps the task and the last max_messages messages, 'step' drops tool calls and "
+            "results once the step is finished, and 'summarize' drops the step messages, folding a "
+            "digest of the step into the context."
+        },
+    )
+
+    max_messages: int = field(
+        default=20,
+        metadata={
+            "description": "The number of messages kept by the 'last_n' message retention policy."
+        },
+    )
+
+    track_state_size: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to measure the serialized size of the state at every super-step."
+        },
+    )
+
+    prompt_budgets: dict[str, int] = field(
+        default_factory=dict,
+        metadata={
+            "description": "The token budget of the prompt variables of each phase (plan, do, check, act "
+            "and final), such as the context, results and feedback. Phases without a budget are not trimmed."
+        },
+    )
+
+    prompt_budget_strategy: Literal["truncate", "window", "summarize"] = field(
+        default="truncate",
+        metadata={
+            "description": "How fields over budget are shortened. 'truncate' keeps their beginning, 'window' "
+            "keeps their end, and 'summarize' condenses them with the model."
+        },
+    )
+
+    prompt_budget_strategies: dict[str, Literal["truncate", "window", "summarize"]] = field(
+        default_factory=lambda: {"context": "window", "previous_steps": "window"},
+        metadata={
+            "description": "Per-field overrides of prompt_budget_strategy (e.g. {'results': 'summarize'})."
+        },
+    )
+
+    stream_final_answer: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to stream the tokens of the final answer as they are generated."
+        },
+    )
+
+    stream_do_results: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to stream the tokens of the do phase (intermediate step results)."
+        },
+    )
+
+    structured_output: Literal["prompt", "native"] = field(
+        default="prompt",
+        metadata={
+            "description": "How the structured outputs of the phases are obtained. 'prompt' relies on the "
+            "format instructions of the prompt, while 'native' uses the provider's JSON schema output "
+            "when supported (phases calling tools always use the prompt)."
+        },
+    )
+
+    max_output_reasks: int = field(
+        default=1,
+        metadata={
+            "description": "Maximum number of targeted re-asks for fixing an output that could not be parsed."
+        },
+    )
+
+    prompt_layout: Literal["default", "cache_friendly"] = field(
+        default="default",
+        metadata={
+            "description": "Layout of the prompt messages. 'cache_friendly' keeps the instructions of the "
+            "system and phase prompts (with the format instructions) first and byte-stable, and moves the "
+            "volatile values (task, context, feedback, step details, time) to a state block at the end, "
+            "so the prefix can be served from the provider's prompt cache."
+        },
+    )
+
+    system_time_resolution: Literal["second", "minute", "hour", "day"] = field(
+        default="hour",
+        metadata={
+            "description": "Resolution of the system time given to the model with the 'cache_friendly' "
+            "prompt layout, or in the phases with a response cache policy (otherwise, the default layout "
+            "keeps the full precision)."
+        },
+    )
+
+    rate_limits: dict[str, Optional[float]] = field(
+        default_factory=lambda: {"llm": None, "search": None},
+        metadata={
+            "description": "Maximum requests per second to the LLM provider ('llm') and to the web search "
+            "('search'), shared by every task of the process. None disables the limit."
+        },
+    )
+
+    rate_limit_burst: int = field(
+        default=5,
+        metadata={
+            "description": "Number of requests that can be made at once before the rate limits apply."
+        },
+    )
+
+    phase_timeouts: dict[str, float] = field(
+        default_factory=dict,
+        metadata={
+            "description": "Seconds before an LLM call of each phase (plan, do, check, act and final) is "
+            "abandoned, along with its hedged request. A timed out do call counts as a failed attempt of "
+            "the step, while in the other phases the timeout error is raised."
+        },
+    )
+
+    hedge_requests: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether a duplicate request is fired when an LLM call runs past the hedge_quantile "
+            "of the latencies observed for its model and phase, using whichever response comes first (the "
+            "other one is cancelled). Streamed calls are never hedged."
+        },
+    )
+
+    hedge_quantile: float = field(
+        default=0.95,
+        metadata={
+            "description": "Quantile of the observed latencies after which a call is hedged."
+        },
+    )
+
+    hedge_min_samples: int = field(
+        default=20,
+        metadata={
+            "description": "Number of latencies observed for a model and phase before its calls are hedged."
+        },
+    )
+
+    max_step_retries: int = field(
+        default=3,
+        metadata={
+            "description": "Maximum number of times a step failing its check is retried, before moving on "
+            "with its last results."
+        },
+    )
+
+    retry_mode: Literal["full", "patch"] = field(
+        default="full",
+        metadata={
+            "description": "How a step failing its check is retried. 'full' runs the whole do phase again, "
+            "while 'patch' (when the check suggested fixes) only gives the do phase the previous result "
+            "and the suggestions, asking for edits of the result, which costs far fewer tokens. A patch "
+            "that cannot be applied falls back to a full retry."
+        },
+    )
+
+    llm_max_retries: int = field(
+        default=0,
+        metadata={
+            "description": "Retries of an LLM call failing on a transport error or a rate limit (with "
+            "exponential backoff), after the model router tried every fallback."
+        },
+    )
+
+    llm_retry_backoff: float = field(
+        default=0.5,
+        metadata={
+            "description": "Seconds before the first retry of a failed LLM call, doubled at each retry (with jitter)."
+        },
+    )
+
+    max_llm_calls: Optional[int] = field(
+        default=None,
+        metadata={
+            "description": "Maximum number of LLM calls of the phases of a task (counted from its start). Once used up, "
+            "failed steps are no longer retried and the final answer is generated. None for no limit."
+        },
+    )
+
+    max_llm_tokens: Optional[int] = field(
+        default=None,
+        metadata={
+            "description": "Maximum number of tokens (input and output) of the LLM calls of the phases of a "
+            "task (counted from its start), enforced like max_llm_calls. None for no limit."
+        },
+    )
+
+    task_deadline: Optional[float] = field(
+        default=None,
+        metadata={
+            "description": "Seconds after the start of a task after which no new phase is started and the "
+            "final answer is generated from the current results. None for no deadline."
+        },
+    )
+
+    max_tool_rounds: int = field(
+        default=1,
+        metadata={
+            "description": "Maximum number of rounds of tool calls (e.g. web searches) the do phase can "
+            "make for each step."
+        },
+    )
+
+    max_parallel_tool_calls: int = field(
+        default=4,
+        metadata={
+            "description": "Maximum number of tool calls of a response executed at the same time."
+        },
+    )
+
+    retrieval_memory: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether the results of the finished steps (and the snippets of their searches) "
+            "are indexed, so the do and check phases only receive the retrieval_top_k chunks most "
+            "relevant to the step instead of the whole task results."
+        },
+    )
+
+    retrieval_top_k: int = field(
+        default=5,
+        metadata={
+            "description": "The number of chunks of previous results retrieved for each do and check call."
+        },
+    )
+
+    retrieval_chunk_chars: int = field(
+        default=800,
+        metadata={
+            "description": "The maximum characters of each chunk indexed by the retrieval memory."
+        },
+    )
+
+    retrieval_embedding_model: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "The embedding model of the vector index of the retrieval memory (requires numpy). "
+            "Without it, chunks are only ranked with BM25. Should be in the form: provider/model-name."
+        },
+    )
+
+    execution_mode: Literal["sequential", "parallel"] = field(
+        default="sequential",
+        metadata={
+            "description": "How the planned steps are executed. 'sequential' runs one step per PDCA cycle, "
+            "while 'parallel' runs independent steps of the plan concurrently (each with its own "
+            "do/check loop) and merges their results before a single act phase."
+        },
+    )
+
+    max_parallel_steps: int = field(
+        default=4,
+        metadata={
+            "description": "The maximum number of steps executed concurrently in 'parallel' execution mode."
+        },
+    )
+
+    planning_mode: Literal["full", "incremental"] = field(
+        default="full",
+        metadata={
+            "description": "How the plan is consumed. 'full' re-plans after every step, while 'incremental' "
+            "goes straight to the next planned step, only re-planning when a step failed after all "
+            "its retries or when the act phase flags that the context changed materially."
+        },
+    )
+
+    def get_model(self, phase: Optional[str]) -> str:
+        """Return the model of a phase (the main model if it has none)."""
+
+        return self.phase_models.get(phase) or self.model
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
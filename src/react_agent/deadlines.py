@@ -0,0 +1,202 @@
+"""Latency budgets of the LLM calls: phase timeouts, hedged requests and the task deadline.
+
+The latency of every LLM call is recorded per model and phase. Once enough calls are
+observed, a call running past the configured quantile (p95 by default) of its model
+and phase fires a duplicate (hedged) request, and whichever response comes first is
+used, the other one being cancelled. Calls running past their phase timeout are
+abandoned altogether.
+"""
+
+import asyncio
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from react_agent.configuration import Configuration
+from src.settings import custom_logger
+
+
+logger = custom_logger("Deadlines")
+
+T = TypeVar("T")
+
+
+class PhaseTimeoutError(TimeoutError):
+    """An LLM call (and its hedged request, if any) ran past the timeout of its phase."""
+
+
+class LatencyTracker:
+    """Process-wide record of the latency of the LLM calls and of the hedged requests, by model and phase."""
+
+    def __init__(self, window: int = 200) -> None:
+        """
+        Initialize an empty record.
+
+        Args:
+            window (int, optional): Number of latest latencies kept per model and phase. Defaults to 200.
+        """
+
+        self.window = window
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = defaultdict(
+            lambda: deque(maxlen=self.window)
+        )
+        self._counts: Dict[str, Counter] = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def record(self, model: str, phase: str, latency: float) -> None:
+        """Record the latency of a successful call."""
+
+        with self._lock:
+            self._latencies[(model, phase)].append(latency)
+
+    def count(self, phase: str, event: str) -> None:
+        """Count an event ('calls', 'hedged', 'hedge_wins', 'hedge_losses' or 'timeouts') of a phase."""
+
+        with self._lock:
+            self._counts[phase][event] += 1
+
+    def quantile(self, model: str, phase: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Return a quantile of the latencies of a model and phase (None if not enough were observed)."""
+
+        with self._lock:
+            latencies = sorted(self._latencies.get((model, phase), ()))
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+    def get(self) -> Dict[str, Dict[str, Any]]:
+        """Return the counts of each phase, along with the p50/p95 latency of each model and phase."""
+
+        with self._lock:
+            counts = {phase: dict(events) for phase, events in self._counts.items()}
+            keys = list(self._latencies)
+        for model, phase in keys:
+            stats = counts.setdefault(phase, {})
+            stats.setdefault("latency", {})[model] = {
+                "p50": self.quantile(model, phase, 0.5),
+                "p95": self.quantile(model, phase, 0.95),
+            }
+        return counts
+
+    def clear(self) -> None:
+        """Clear every record."""
+
+        with self._lock:
+            self._latencies.clear()
+            self._counts.clear()
+
+
+LLM_LATENCIES = LatencyTracker()
+
+
+async def run_hedged(
+    make_call: Callable[[], Awaitable[T]],
+    timeout: Optional[float] = None,
+    hedge_after: Optional[float] = None,
+) -> Tuple[T, int, bool]:
+    """
+    Await a call, firing a duplicate of it if it is slow, within a timeout.
+
+    The first successful response wins and the pending call is cancelled (and awaited,
+    so nothing is left running). If one of the calls fails, the other one can still win.
+
+    Args:
+        make_call (Callable[[], Awaitable[T]]): Starts a new call.
+        timeout (float, optional): Seconds before giving up on the call(s). Defaults to None (no timeout).
+        hedge_after (float, optional): Seconds before firing the duplicate. Defaults to None (no hedging).
+
+    Returns:
+        Tuple[T, int, bool]: The response, the call it came from (0 the original one, 1 the
+            hedged one) and whether the hedged call was fired.
+
+    Raises:
+        PhaseTimeoutError: If no call finished within the timeout.
+    """
+
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    tasks = {asyncio.ensure_future(make_call()): 0}
+    hedge_at = None if hedge_after is None else loop.time() + hedge_after
+    error: Optional[BaseException] = None
+    try:
+        while tasks:
+            wake_at = min((t for t in (deadline, hedge_at) if t is not None), default=None)
+            done, _ = await asyncio.wait(
+                tasks,
+                timeout=None if wake_at is None else max(0.0, wake_at - loop.time()),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                index = tasks.pop(task)
+                if task.exception() is None:
+                    return task.result(), index, hedge_after is not None and hedge_at is None
+                error = task.exception()
+            if deadline is not None and loop.time() >= deadline:
+                raise PhaseTimeoutError(f"No response within {timeout:g}s")
+            if hedge_at is not None and loop.time() >= hedge_at and len(tasks) == 1:
+                tasks[asyncio.ensure_future(make_call())] = 1
+                hedge_at = None
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def timed_call(
+    make_call: Callable[[], Awaitable[T]],
+    configuration: Configuration,
+    model_name: str,
+    phase: str,
+    hedge: bool = True,
+) -> T:
+    """
+    Await an LLM call within the timeout of its phase, hedging it when enabled.
+
+    Args:
+        make_call (Callable[[], Awaitable[T]]): Starts a new call (timing its own latency is done here).
+        configuration (Configuration): The agent configuration.
+        model_name (str): The model called.
+        phase (str): The phase issuing the call.
+        hedge (bool, optional): Whether the call can be hedged (e.g. not when streaming). Defaults to True.
+
+    Returns:
+        T: The response of the call.
+
+    Raises:
+        PhaseTimeoutError: If no response came within the timeout of the phase.
+    """
+
+    hedge_after = None
+    if hedge and configuration.hedge_requests:
+        hedge_after = LLM_LATENCIES.quantile(
+            model_name, phase, configuration.hedge_quantile, configuration.hedge_min_samples
+        )
+
+    async def _timed() -> Tuple[T, float]:
+        start = time.perf_counter()
+        response = await make_call()
+        return response, time.perf_counter() - start
+
+    LLM_LATENCIES.count(phase, "calls")
+    try:
+        (response, latency), index, hedged = await run_hedged(
+            _timed, timeout=configuration.phase_timeouts.get(phase), hedge_after=hedge_after
+        )
+    except PhaseTimeoutError:
+        LLM_LATENCIES.count(phase, "timeouts")
+        logger.warning("LLM call of phase '%s' (%s) timed out", phase, model_name)
+        raise
+    LLM_LATENCIES.record(model_name, phase, latency)
+    if hedged:
+        LLM_LATENCIES.count(phase, "hedged")
+        LLM_LATENCIES.count(phase, "hedge_wins" if index else "hedge_losses")
+    return response
+
+
+def deadline_exceeded(deadline_at: Optional[float]) -> bool:
+    """Return whether the deadline of a task (a wall-clock timestamp) is past."""
+
+    return deadline_at is not None and time.time() >= deadline_at
@@ -0,0 +1,401 @@
+"""Scripted local chat model, for running the graph without any provider.
+
+The model recognizes the phase of each call from its prompt and answers with valid
+structured outputs (`PlanningOutput`, `DoingOutput`, `PatchOutput`, `CheckingOutput`,
+`ActingOutput`) or a Markdown final answer. Latency, tool calls and failures can be injected, so it can
+be used for benchmarks and tests of the orchestration layer. The cached input tokens of
+a provider-side prompt cache are simulated too.
+
+It is registered as the 'fake' provider, e.g. `model="fake/scripted"`.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field, PrivateAttr
+
+from react_agent.utils import get_message_text, register_model_provider, to_message_chunk
+from src.structs import (
+    ActingOutput,
+    CheckingOutput,
+    DoingOutput,
+    PatchEdit,
+    PatchOutput,
+    PlanningOutput,
+    PlanningStep,
+)
+
+
+# Opening sentence of the prompt of each phase
+PHASE_MARKERS = {
+    "plan": "You excel at planning the steps",
+    "do": "You excel at executing individual steps",
+    "patch": "You are revising the result of a step",
+    "check": "You are excellent at reviewing and assessing",
+    "act": "You are tasked with determining the current status",
+    "final": "You are tasked with creating a well-structured",
+}
+
+# Number of chunks of a streamed answer
+STREAM_CHUNKS = 4
+
+# Re-asks for fixing an output only carry the format instructions of the phase
+FIX_OUTPUT_MARKER = "was expected to be a JSON object"
+SCHEMA_FIELDS = {
+    "plan": '"next_steps"',
+    "act": '"current_status"',
+    "check": '"suggestions"',
+    "patch": '"edits"',
+    "do": '"obstacles"',
+}
+
+_COMPLETED_STEPS = re.compile(r"Completed (\d+) steps")
+# Expected outcome of the step, in the state block (cache-friendly layout) or inline
+_EXPECTED_OUTCOME = (
+    re.compile(r"<step_expected_outcome>\n(.*?)\n</step_expected_outcome>"),
+    re.compile(r'Expected outcome of the step: "([^"]*)"'),
+)
+
+
+class TransientModelError(RuntimeError):
+    """Injected error simulating a transport failure of the provider."""
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model answering every PDCA phase with scripted, valid outputs."""
+
+    n_steps: int = Field(default=3, description="Number of steps of each plan")
+    n_cycles: int = Field(
+        default=3, description="Number of completed steps after which the task is completed"
+    )
+    parallel_plan: bool = Field(
+        default=True, description="Whether the planned steps are independent from each other"
+    )
+    search_in_do: bool = Field(
+        default=True, description="Whether the do phase requests a web search when tools are bound"
+    )
+    searches_per_do: int = Field(
+        default=1, description="Number of web searches requested at once by the do phase"
+    )
+    latency: float = Field(default=0.0, description="Seconds of latency of each call")
+    jitter: float = Field(default=0.0, description="Maximum random seconds added to the latency")
+    slow_rate: float = Field(
+        default=0.0, description="Probability of a call being slow (a latency tail)"
+    )
+    slow_latency: float = Field(default=0.0, description="Extra seconds of latency of the slow calls")
+    error_rate: float = Field(default=0.0, description="Probability of raising a transient error")
+    malformed_rate: float = Field(
+        default=0.0, description="Probability of answering with malformed JSON"
+    )
+    check_failure_rate: float = Field(
+        default=0.0, description="Probability of the check phase failing a step"
+    )
+    check_confidence: float = Field(
+        default=0.9, description="Confidence reported by the check phase in its evaluations"
+    )
+    result_size: int = Field(default=400, description="Characters of each step result")
+    on_topic_rate: float = Field(
+        default=1.0,
+        description="Probability of the do phase results restating the expected outcome of the step",
+    )
+    seed: Optional[int] = Field(default=None, description="Seed of the injected randomness")
+    tools_bound: bool = Field(default=False, description="Whether tools are bound to the model")
+    cache_block_size: int = Field(
+        default=512,
+        description="Characters of each block of the simulated prompt cache (0 disables it)",
+    )
+
+    _random: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: Counter = PrivateAttr(default_factory=Counter)
+    _injected: Counter = PrivateAttr(default_factory=Counter)
+    _cached_prefixes: set = PrivateAttr(default_factory=set)
+    _parent: Optional["ScriptedChatModel"] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        """Initialize the random generator."""
+
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        """Return the type of the model."""
+
+        return "scripted-fake"
+
+    @property
+    def calls(self) -> Counter:
+        """Return the number of calls of each phase (shared with the tool-bound copies)."""
+
+        return self._parent.calls if self._parent is not None else self._calls
+
+    @property
+    def injected(self) -> Counter:
+        """Return the number of injected errors, malformed outputs and failed checks."""
+
+        return self._parent.injected if self._parent is not None else self._injected
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        """Return a copy of the model that requests web searches in the do phase (if bound to `search`)."""
+
+        tool_names = {getattr(tool, "name", getattr(tool, "__name__", None)) for tool in tools}
+        bound = self.model_copy(update={"tools_bound": "search" in tool_names})
+        bound._random = self._random
+        bound._lock = self._lock
+        bound._parent = self._parent or self
+        return bound
+
+    def _cached_chars(self, prompt: str) -> int:
+        """
+        Simulate the prompt cache of a provider, returning the characters of the prompt served from it.
+
+        Like the providers, the longest previously seen prefix is cached, in whole blocks.
+        """
+
+        if not self.cache_block_size:
+            return 0
+        cached_prefixes = (self._parent or self)._cached_prefixes
+        digest = hashlib.sha1()
+        prefixes = []
+        for start in range(0, len(prompt) - self.cache_block_size + 1, self.cache_block_size):
+            digest.update(prompt[start : start + self.cache_block_size].encode())
+            prefixes.append(digest.hexdigest())
+        with self._lock:
+            n_cached = 0
+            while n_cached < len(prefixes) and prefixes[n_cached] in cached_prefixes:
+                n_cached += 1
+            cached_prefixes.update(prefixes)
+        return n_cached * self.cache_block_size
+
+    def _roll(self, probability: float, event: str) -> bool:
+        """Draw a random event with the given probability, counting it when it happens."""
+
+        with self._lock:
+            happened = self._random.random() < probability
+            if happened:
+                self.injected[event] += 1
+            return happened
+
+    def _detect_phase(self, messages: List[BaseMessage]) -> str:
+        """Return the phase of the call, based on the prompt."""
+
+        for message in reversed(messages):
+            text = get_message_text(message)
+            if FIX_OUTPUT_MARKER in text:
+                for phase, schema_field in SCHEMA_FIELDS.items():
+                    if schema_field in text:
+                        return phase
+            for phase, marker in PHASE_MARKERS.items():
+                if marker in text:
+                    return phase
+        return "other"
+
+    def _answer(self, phase: str, prompt: str, has_search_results: bool) -> AIMessage:
+        """Build the scripted answer of a phase."""
+
+        with self._lock:
+            self.calls[phase] += 1
+            call_number = self.calls[phase]
+
+        if phase == "do" and self.tools_bound and self.search_in_do and not has_search_results:
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": "search",
+                        "args": {"query": f"query {(call_number + idx) % 5}"},
+                        "id": f"call_{call_number}_{idx}",
+                        "type": "tool_call",
+                    }
+                    for idx in range(self.searches_per_do)
+                ],
+                response_metadata={"finish_reason": "tool_calls"},
+            )
+
+        if phase == "final":
+            return AIMessage(
+                content="# Final answer\n\n**TL;DR**: scripted answer.\n\n## Conclusion\nDone.",
+                response_metadata={"finish_reason": "stop"},
+            )
+        if phase == "other":
+            return AIMessage(content="Scripted summary.", response_metadata={"finish_reason": "stop"})
+
+        if self._roll(self.malformed_rate, "malformed_outputs"):
+            return AIMessage(content='{"malformed": ', response_metadata={"finish_reason": "stop"})
+
+        if phase == "plan":
+            # Each new plan continues from the steps completed so far
+            match = _COMPLETED_STEPS.search(prompt)
+            offset = int(match.group(1)) if match else 0
+            output = PlanningOutput(
+                next_steps=[
+                    PlanningStep(
+                        id=f"step-{idx}",
+                        step=f"Scripted step {offset + idx}",
+                        details=f"Details of scripted step {offset + idx}",
+                        expected_outcome=f"Outcome of scripted step {offset + idx}",
+                        depends_on=[] if self.parallel_plan or idx == 1 else [f"step-{idx - 1}"],
+                    )
+                    for idx in range(1, self.n_steps + 1)
+                ],
+                feedback=None,
+            )
+        elif phase == "do":
+            match = _EXPECTED_OUTCOME[0].search(prompt) or _EXPECTED_OUTCOME[1].search(prompt)
+            on_topic = match is not None and not (
+                self.on_topic_rate < 1 and self._roll(1 - self.on_topic_rate, "off_topic_results")
+            )
+            output = DoingOutput(
+                result=(f"{match.group(1)}: " if on_topic else "")
+                + "x" * self.result_size,
+                obstacles="none",
+            )
+        elif phase == "patch":
+            output = PatchOutput(
+                edits=[PatchEdit(find="", replace="Revised following the review suggestions.")],
+                obstacles="none",
+            )
+        elif phase == "check":
+            success = not self._roll(self.check_failure_rate, "failed_checks")
+            output = CheckingOutput(
+                success=success,
+                comments="Scripted evaluation.",
+                suggestions=None if success else "Scripted suggestion.",
+                confidence=self.check_confidence,
+            )
+        else:
+            match = _COMPLETED_STEPS.search(prompt)
+            completed = (int(match.group(1)) if match else 0) + 1
+            output = ActingOutput(
+                current_status=(
+                    "completed" if completed >= self.n_cycles else "close to completion"
+                ),
+                context=f"Completed {completed} steps",
+                result="r" * (self.result_size * completed),
+            )
+        return AIMessage(
+            content=json.dumps(output.model_dump()),
+            response_metadata={"finish_reason": "stop"},
+        )
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        """Answer the messages, injecting errors when configured."""
+
+        if self._roll(self.error_rate, "errors"):
+            raise TransientModelError("Injected transient error")
+        phase = self._detect_phase(messages)
+        prompt = "\n".join(get_message_text(message) for message in messages)
+        message = self._answer(
+            phase, prompt, has_search_results="Results of the web searches" in prompt
+        )
+        message.usage_metadata = {
+            "input_tokens": len(prompt) // 4,
+            "input_token_details": {"cache_read": self._cached_chars(prompt) // 4},
+            "output_tokens": len(get_message_text(message)) // 4,
+            "total_tokens": (len(prompt) + len(get_message_text(message))) // 4,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _delay(self) -> float:
+        """Return the latency of a call."""
+
+        slow = self.slow_rate > 0 and self._roll(self.slow_rate, "slow_calls")
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter) + (self.slow_latency if slow else 0.0)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """Answer the messages synchronously."""
+
+        time.sleep(self._delay())
+        return self._respond(messages)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """Answer the messages asynchronously."""
+
+        await asyncio.sleep(self._delay())
+        return self._respond(messages)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """Stream the answer in a few chunks, the latency of the call preceding the first one."""
+
+        await asyncio.sleep(self._delay())
+        message = self._respond(messages).generations[0].message
+        chunk = to_message_chunk(message)
+        text = get_message_text(message)
+        if chunk.tool_call_chunks or len(text) < 2:
+            yield ChatGenerationChunk(message=chunk)
+            return
+        size = -(-len(text) // STREAM_CHUNKS)
+        for start in range(0, len(text), size):
+            last = start + size >= len(text)
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=text[start : start + size],
+                    id=message.id,
+                    # The metadata and usage are carried once, by the last chunk
+                    response_metadata=message.response_metadata if last else {},
+                    usage_metadata=message.usage_metadata if last else None,
+                )
+            )
+            await asyncio.sleep(0)
+
+
+def _build_scripted_model(model: str, **kwargs: Any) -> ScriptedChatModel:
+    """Build a scripted model (the model name is ignored)."""
+
+    return ScriptedChatModel(**kwargs)
+
+
+register_model_provider("fake", _build_scripted_model)
+
+
+def fake_search_results(query: str, n_results: int = 8) -> List[Dict[str, Any]]:
+    """
+    Return deterministic search results for a query.
+
+    Like real searches, the last results repeat earlier ones: the same page with
+    tracking parameters, and a mirror of a page on another host.
+    """
+
+    page = zlib.crc32(query.encode()) % 1000
+    results = [
+        {
+            "url": f"https://example.com/{page}/{idx}",
+            "content": f"Scripted result {idx} for '{query}'. " * 5,
+        }
+        for idx in range(max(n_results - 2, 1))
+    ]
+    duplicates = [
+        {**results[0], "url": f"{results[0]['url']}?utm_source=feed"},
+        {**results[-1], "url": f"https://mirror.example.org/{page}/{len(results) - 1}"},
+    ]
+    return results + duplicates[: n_results - len(results)]
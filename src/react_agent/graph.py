@@ -1,53 +1,127 @@
 """Define a custom Reasoning and Action agent.
 
 Works with a chat model with tool calling support.
+
+The workflow and the compiled graph are built on first access of the `workflow` and
+`graph` attributes (or with `build_workflow` and `build_graph`), so importing this
+module does not load LangGraph, the phases, their prompts and parsers, or the model
+providers. This keeps the startup of the server workers (and serverless cold starts)
+fast.
 """
 
-from langgraph.graph import StateGraph
-from langgraph.prebuilt import ToolNode
-
-from react_agent.actions import (
-    plan_action,
-    do_action,
-    check_action,
-    act_action,
-    generate_final_answer,
-    route_after_check_phase,
-    route_after_act_phase,
-    route_tools_usage,
-    clean_step_vars,
-)
-from react_agent.configuration import Configuration
-from react_agent.state import InputState, State
-from react_agent.tools import TOOLS
-
-
-# Define a new graph
-workflow = StateGraph(State, input=InputState, config_schema=Configuration)
-
-# Define the nodes in the desired order
-workflow.add_node("plan", plan_action)
-workflow.add_node("do", do_action)
-workflow.add_node("check", check_action)
-workflow.add_node("act", act_action)
-workflow.add_node("tools", ToolNode(TOOLS))
-workflow.add_node("clean_vars", clean_step_vars)
-workflow.add_node("final_answer_generation", generate_final_answer)
-
-# Add edges
-workflow.add_edge("__start__", "plan")
-workflow.add_edge("plan", "do")
-workflow.add_conditional_edges("do", route_tools_usage)
-workflow.add_edge("tools", "do")
-workflow.add_conditional_edges("check", route_after_check_phase)
-workflow.add_conditional_edges("act", route_after_act_phase)
-workflow.add_edge("clean_vars", "plan")
-workflow.add_edge("final_answer_generation", "__end__")
-
-
-# Compile the workflow into an executable graph
-graph = workflow.compile(
-    interrupt_before=[],  # Add node names here to update state before they're called
-    interrupt_after=[],  # Add node names here to update state after they're called
-)
-graph.name = "PDCA Agent"
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+    from langgraph.graph.state import CompiledStateGraph
+
+
+_lock = threading.Lock()
+
+
+def build_workflow() -> "StateGraph":
+    """
+    Build the (uncompiled) workflow of the agent.
+
+    Returns:
+        StateGraph: The workflow, with its nodes and edges.
+    """
+
+    from langgraph.graph import StateGraph
+
+    from react_agent.actions import (
+        plan_action,
+        do_action,
+        tools_action,
+        check_action,
+        act_action,
+        generate_final_answer,
+        parallel_steps_action,
+        route_after_plan_phase,
+        route_after_check_phase,
+        route_after_act_phase,
+        route_after_clean_phase,
+        route_tools_usage,
+        clean_step_vars,
+    )
+    from react_agent.configuration import Configuration
+    from react_agent.metrics import track_state_size
+    from react_agent.state import InputState, State
+    from react_agent.utils import bind_task
+    from src.settings import trace_node
+
+    # Define a new graph
+    workflow = StateGraph(State, input=InputState, config_schema=Configuration)
+
+    # Define the nodes in the desired order
+    workflow.add_node("plan", trace_node(track_state_size(bind_task(plan_action))))
+    workflow.add_node("do", trace_node(track_state_size(bind_task(do_action))))
+    workflow.add_node("check", trace_node(track_state_size(bind_task(check_action))))
+    workflow.add_node("act", trace_node(track_state_size(bind_task(act_action))))
+    workflow.add_node(
+        "parallel_steps", trace_node(track_state_size(bind_task(parallel_steps_action)))
+    )
+    workflow.add_node("tools", trace_node(track_state_size(bind_task(tools_action))))
+    workflow.add_node("clean_vars", trace_node(track_state_size(bind_task(clean_step_vars))))
+    workflow.add_node(
+        "final_answer_generation", trace_node(track_state_size(bind_task(generate_final_answer)))
+    )
+
+    # Add edges
+    workflow.add_edge("__start__", "plan")
+    workflow.add_conditional_edges("plan", route_after_plan_phase)
+    workflow.add_conditional_edges("do", route_tools_usage)
+    workflow.add_edge("tools", "do")
+    workflow.add_conditional_edges("check", route_after_check_phase)
+    workflow.add_edge("parallel_steps", "act")
+    workflow.add_conditional_edges("act", route_after_act_phase)
+    workflow.add_conditional_edges("clean_vars", route_after_clean_phase)
+    workflow.add_edge("final_answer_generation", "__end__")
+    return workflow
+
+
+def build_graph(checkpointer: Optional[Any] = None) -> "CompiledStateGraph":
+    """
+    Build and compile the graph of the agent.
+
+    Args:
+        checkpointer (Any, optional): The checkpointer of the runs. Defaults to the one set by the
+            CHECKPOINTER env variable (e.g. 'sqlite:.checkpoints/runs.db'), so the runs can be
+            resumed with their thread id.
+
+    Returns:
+        CompiledStateGraph: The compiled graph.
+    """
+
+    from react_agent.checkpoint import get_checkpointer
+
+    graph = _get_workflow().compile(
+        checkpointer=checkpointer if checkpointer is not None else get_checkpointer(os.getenv("CHECKPOINTER")),
+        interrupt_before=[],  # Add node names here to update state before they're called
+        interrupt_after=[],  # Add node names here to update state after they're called
+    )
+    graph.name = "PDCA Agent"
+    return graph
+
+
+def _get_workflow() -> "StateGraph":
+    """Return the workflow of the module, building it once."""
+
+    with _lock:
+        if "workflow" not in globals():
+            globals()["workflow"] = build_workflow()
+        return globals()["workflow"]
+
+
+def __getattr__(name: str) -> Any:
+    """Build the `workflow` and the compiled `graph` on first access."""
+
+    if name == "workflow":
+        return _get_workflow()
+    if name == "graph":
+        graph = build_graph()
+        with _lock:
+            return globals().setdefault("graph", graph)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
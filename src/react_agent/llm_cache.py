@@ -0,0 +1,281 @@
+"""Response cache for the LLM calls of the PDCA phases.
+
+Responses are keyed on the rendered prompt messages, the model name and the tools bound
+to the model, so identical calls (retried tasks, regression suites, the same task
+submitted by several users) are served without calling the provider. An optional
+semantic tier serves near-duplicate prompts, matched by embedding similarity.
+"""
+
+import hashlib
+import json
+import math
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict
+
+from react_agent.cache import (
+    CacheStats,
+    CacheStore,
+    MemoryStore,
+    MmapStore,
+    SqliteStore,
+    TieredStore,
+    TTLCache,
+)
+from react_agent.configuration import Configuration
+from src.settings import custom_logger
+
+
+logger = custom_logger("LLM Cache")
+
+
+def _serialize_messages(messages: Sequence[BaseMessage]) -> List[Dict[str, Any]]:
+    """Return a stable representation of the messages, ignoring volatile ids."""
+
+    return [
+        {
+            "type": message.type,
+            "content": message.content,
+            "tool_calls": getattr(message, "tool_calls", None) or None,
+        }
+        for message in messages
+    ]
+
+
+def make_cache_key(
+    messages: Sequence[BaseMessage], model: str, tools: Optional[Sequence[str]] = None
+) -> str:
+    """
+    Build the cache key of an LLM call.
+
+    Args:
+        messages (Sequence[BaseMessage]): The rendered prompt messages.
+        model (str): The fully specified model name.
+        tools (Sequence[str], optional): Names of the tools bound to the model.
+
+    Returns:
+        str: A SHA-256 digest identifying the call.
+    """
+
+    payload = json.dumps(
+        {
+            "model": model,
+            "tools": sorted(tools) if tools else None,
+            "messages": _serialize_messages(messages),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
+    """Return the cosine similarity between two vectors."""
+
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SemanticIndex:
+    """In-memory index of prompt embeddings, matching near-duplicate prompts."""
+
+    def __init__(self, embedding_model: str, threshold: float, max_size: int) -> None:
+        """
+        Initialize the index.
+
+        Args:
+            embedding_model (str): Embedding model name in the format 'provider/model'.
+            threshold (float): Minimum cosine similarity for considering two prompts equivalent.
+            max_size (int): Maximum number of embeddings kept per scope.
+        """
+
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.max_size = max_size
+        self._embeddings = None
+        self._vectors: Dict[str, List[Tuple[List[float], str]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _embedder(self):
+        """Load the embedding model on first use."""
+
+        if self._embeddings is None:
+            from langchain.embeddings import init_embeddings
+
+            provider, model = self.embedding_model.split("/", maxsplit=1)
+            self._embeddings = init_embeddings(model, provider=provider)
+        return self._embeddings
+
+    async def aembed(self, messages: Sequence[BaseMessage]) -> List[float]:
+        """Embed the text of the prompt messages."""
+
+        text = "\n".join(str(message.content) for message in messages)
+        return await self._embedder().aembed_query(text)
+
+    def search(self, scope: str, vector: List[float]) -> Optional[str]:
+        """Return the key of the most similar prompt within a scope, if above the threshold."""
+
+        with self._lock:
+            candidates = list(self._vectors[scope])
+        best_key, best_score = None, self.threshold
+        for candidate, key in candidates:
+            score = _cosine_similarity(vector, candidate)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def add(self, scope: str, vector: List[float], key: str) -> None:
+        """Index the embedding of a prompt within a scope."""
+
+        with self._lock:
+            vectors = self._vectors[scope]
+            vectors.append((vector, key))
+            if len(vectors) > self.max_size:
+                del vectors[0]
+
+
+class ResponseCache:
+    """Exact (and optionally semantic) cache of model responses, with per-phase statistics."""
+
+    def __init__(self, cache: TTLCache, semantic: Optional[SemanticIndex] = None) -> None:
+        """
+        Initialize the response cache.
+
+        Args:
+            cache (TTLCache): The TTL cache holding the serialized responses.
+            semantic (SemanticIndex, optional): Index used by the semantic tier.
+        """
+
+        self.cache = cache
+        self.semantic = semantic
+        self.stats: Dict[str, CacheStats] = defaultdict(CacheStats)
+
+    async def alookup(
+        self,
+        phase: str,
+        messages: Sequence[BaseMessage],
+        model: str,
+        tools: Optional[Sequence[str]] = None,
+        use_semantic: bool = False,
+    ) -> Tuple[Optional[AIMessage], str, Optional[List[float]]]:
+        """
+        Look up the response of an LLM call.
+
+        Args:
+            phase (str): The PDCA phase issuing the call.
+            messages (Sequence[BaseMessage]): The rendered prompt messages.
+            model (str): The fully specified model name.
+            tools (Sequence[str], optional): Names of the tools bound to the model.
+            use_semantic (bool): If True, fall back to the semantic tier on an exact miss.
+
+        Returns:
+            Tuple: The cached response (None on a miss), the exact cache key and the prompt
+                embedding (when computed), to be passed back to `update`.
+        """
+
+        key = make_cache_key(messages, model, tools)
+        value, status = self.cache.lookup(key)
+        if status != "miss":
+            self.stats[phase].hits += 1
+            return self._load(value), key, None
+
+        vector = None
+        if use_semantic and self.semantic is not None:
+            vector = await self.semantic.aembed(messages)
+            similar_key = self.semantic.search(make_cache_key([], model, tools), vector)
+            if similar_key is not None:
+                value, status = self.cache.lookup(similar_key)
+                if status != "miss":
+                    self.stats[phase].semantic_hits += 1
+                    return self._load(value), key, vector
+
+        self.stats[phase].misses += 1
+        return None, key, vector
+
+    def update(
+        self,
+        key: str,
+        response: AIMessage,
+        model: str,
+        tools: Optional[Sequence[str]] = None,
+        vector: Optional[List[float]] = None,
+    ) -> None:
+        """
+        Store the response of an LLM call.
+
+        Args:
+            key (str): The exact cache key returned by `alookup`.
+            response (AIMessage): The model response.
+            model (str): The fully specified model name.
+            tools (Sequence[str], optional): Names of the tools bound to the model.
+            vector (List[float], optional): The prompt embedding returned by `alookup`.
+        """
+
+        self.cache.put(key, message_to_dict(response))
+        if vector is not None and self.semantic is not None:
+            self.semantic.add(make_cache_key([], model, tools), vector, key)
+
+    @staticmethod
+    def _load(value: Dict[str, Any]) -> AIMessage:
+        """Deserialize a cached response."""
+
+        return messages_from_dict([value])[0]
+
+    def phase_stats(self) -> Dict[str, Dict[str, float]]:
+        """Return the statistics of every phase."""
+
+        return {phase: stats.to_dict() for phase, stats in self.stats.items()}
+
+
+_RESPONSE_CACHES: Dict[Tuple[Any, ...], ResponseCache] = {}
+_RESPONSE_CACHES_LOCK = threading.Lock()
+
+
+def get_response_cache(configuration: Configuration) -> ResponseCache:
+    """
+    Return the process-wide response cache matching the configuration.
+
+    Args:
+        configuration (Configuration): The agent configuration.
+
+    Returns:
+        ResponseCache: The response cache (created on first use).
+    """
+
+    key = (
+        configuration.llm_cache_store,
+        configuration.llm_cache_path,
+        configuration.llm_cache_size,
+        configuration.llm_cache_ttl,
+        configuration.llm_cache_embedding_model,
+        configuration.llm_cache_similarity_threshold,
+    )
+    with _RESPONSE_CACHES_LOCK:
+        if key not in _RESPONSE_CACHES:
+            store: CacheStore = MemoryStore(max_size=configuration.llm_cache_size)
+            if configuration.llm_cache_store != "memory":
+                if not configuration.llm_cache_path:
+                    raise ValueError(
+                        f"llm_cache_path is required for the '{configuration.llm_cache_store}' LLM cache store"
+                    )
+                persistent = (
+                    SqliteStore(configuration.llm_cache_path, table="responses")
+                    if configuration.llm_cache_store == "sqlite"
+                    else MmapStore(configuration.llm_cache_path)
+                )
+                store = TieredStore([store, persistent])
+
+            semantic = None
+            if configuration.llm_cache_embedding_model:
+                semantic = SemanticIndex(
+                    configuration.llm_cache_embedding_model,
+                    threshold=configuration.llm_cache_similarity_threshold,
+                    max_size=configuration.llm_cache_size,
+                )
+            _RESPONSE_CACHES[key] = ResponseCache(
+                TTLCache(store, ttl=configuration.llm_cache_ttl), semantic=semantic
+            )
+        return _RESPONSE_CACHES[key]
@@ -0,0 +1,331 @@
+"""Retrieval memory of the results of the finished steps.
+
+Instead of handing the whole (growing) task results to every phase, the results of
+each finished step and the snippets of its searches are split into chunks and
+indexed, along with the step they come from. The do and check phases then only
+receive the chunks most relevant to the step at hand, so their prompts stay flat as
+the task grows.
+
+Chunks are ranked with a local BM25 index and, when an embedding model is set, also
+with a NumPy vector index, fusing both rankings.
+"""
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from react_agent.configuration import Configuration
+from react_agent.ranking import BM25Index, tokenize
+from react_agent.utils import MAX_TRACKED_RUNS
+from src.settings import custom_logger
+from src.structs import PlanningStep
+
+
+logger = custom_logger("Memory")
+
+# Constant of the reciprocal rank fusion of the lexical and vector rankings
+RRF_K = 60
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class MemoryChunk:
+    """A chunk of the results of a finished step."""
+
+    text: str
+    step: str
+    expected_outcome: str
+    kind: str = "step_result"
+    step_id: Optional[str] = None
+    source: Optional[str] = None
+
+
+def chunk_text(text: str, max_chars: int = 800) -> List[str]:
+    """
+    Split a text into chunks of up to `max_chars`, at paragraph (or sentence) boundaries.
+
+    Args:
+        text (str): The text to split.
+        max_chars (int, optional): The maximum characters of each chunk. Defaults to 800.
+
+    Returns:
+        List[str]: The chunks.
+    """
+
+    pieces: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            # Sentences longer than a chunk are cut at word boundaries
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].strip()
+            pieces.append(sentence)
+
+    chunks: List[str] = []
+    for piece in filter(None, pieces):
+        if chunks and len(chunks[-1]) + len(piece) + 1 <= max_chars:
+            chunks[-1] = f"{chunks[-1]}\n{piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+class VectorIndex:
+    """Dense index of normalized embeddings, kept in a growing NumPy matrix."""
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty index.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+
+        # Imported on first use, as it is only needed by the vector index
+        try:
+            import numpy
+        except ImportError as e:
+            raise ImportError("The vector index of the retrieval memory requires numpy") from e
+        self._np = numpy
+        self._matrix = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Return the number of vectors of the index."""
+
+        return self._size
+
+    def add(self, vectors: Sequence[Sequence[float]]) -> None:
+        """Add vectors to the index, growing its matrix geometrically."""
+
+        if not vectors:
+            return
+        np = self._np
+        batch = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(batch, axis=1, keepdims=True)
+        batch /= np.where(norms == 0, 1.0, norms)
+        if self._matrix is None:
+            self._matrix = np.empty((max(len(batch), 64), batch.shape[1]), dtype=np.float32)
+        if self._size + len(batch) > len(self._matrix):
+            capacity = max(2 * len(self._matrix), self._size + len(batch))
+            matrix = np.empty((capacity, batch.shape[1]), dtype=np.float32)
+            matrix[: self._size] = self._matrix[: self._size]
+            self._matrix = matrix
+        self._matrix[self._size : self._size + len(batch)] = batch
+        self._size += len(batch)
+
+    def search(self, vector: Sequence[float], top_k: int) -> List[Tuple[int, float]]:
+        """
+        Return the most similar vectors to a query.
+
+        Args:
+            vector (Sequence[float]): The query vector.
+            top_k (int): The maximum number of vectors.
+
+        Returns:
+            List[Tuple[int, float]]: The (vector id, cosine similarity) pairs, the most similar first.
+        """
+
+        if not self._size:
+            return []
+        np = self._np
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = self._matrix[: self._size] @ query
+        top_k = min(top_k, self._size)
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(idx), float(scores[idx])) for idx in best]
+
+
+class RetrievalMemory:
+    """Chunks of the results of the finished steps, indexed for retrieval."""
+
+    def __init__(self, chunk_chars: int = 800, embeddings: Any = None) -> None:
+        """
+        Initialize an empty memory.
+
+        Args:
+            chunk_chars (int, optional): The maximum characters of each chunk. Defaults to 800.
+            embeddings (Embeddings, optional): Embedding model enabling the vector index. Defaults to None.
+        """
+
+        self.chunk_chars = chunk_chars
+        self.embeddings = embeddings
+        self.chunks: List[MemoryChunk] = []
+        self.lexical = BM25Index()
+        self.vectors = VectorIndex() if embeddings is not None else None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of chunks of the memory."""
+
+        return len(self.chunks)
+
+    async def add(self, chunks: Sequence[MemoryChunk]) -> None:
+        """Index chunks (embedding them first if the vector index is enabled)."""
+
+        if not chunks:
+            return
+        vectors = None
+        if self.vectors is not None:
+            vectors = await self.embeddings.aembed_documents([chunk.text for chunk in chunks])
+        with self._lock:
+            for chunk in chunks:
+                self.lexical.add(tokenize(f"{chunk.step} {chunk.text}"))
+                self.chunks.append(chunk)
+            if vectors is not None:
+                self.vectors.add(vectors)
+
+    async def add_step(
+        self,
+        step: PlanningStep,
+        results: Optional[str],
+        tool_outputs: Iterable[str] = (),
+    ) -> int:
+        """
+        Index the results of a finished step and the snippets of its searches.
+
+        Args:
+            step (PlanningStep): The finished step.
+            results (str, optional): The results of the step.
+            tool_outputs (Iterable[str], optional): The outputs of the step's tool calls
+                (JSON lists of search results). Defaults to none.
+
+        Returns:
+            int: The number of chunks added.
+        """
+
+        def _chunk(text: str, kind: str, source: Optional[str] = None) -> List[MemoryChunk]:
+            return [
+                MemoryChunk(
+                    text=piece,
+                    step=step.step,
+                    expected_outcome=step.expected_outcome,
+                    kind=kind,
+                    step_id=step.id,
+                    source=source,
+                )
+                for piece in chunk_text(text, self.chunk_chars)
+            ]
+
+        chunks = _chunk(results, "step_result") if results else []
+        for output in tool_outputs:
+            try:
+                search_results = json.loads(output)
+            except (TypeError, ValueError):
+                search_results = [{"content": output}]
+            if not isinstance(search_results, list):
+                continue
+            for result in search_results:
+                if isinstance(result, dict) and result.get("content"):
+                    chunks.extend(_chunk(result["content"], "search_result", result.get("url")))
+        await self.add(chunks)
+        return len(chunks)
+
+    async def search(self, query: str, top_k: int = 5) -> List[MemoryChunk]:
+        """
+        Return the chunks most relevant to a query.
+
+        With the vector index enabled, the lexical and vector rankings are combined
+        with reciprocal rank fusion.
+
+        Args:
+            query (str): The query (e.g. the step to execute and its expected outcome).
+            top_k (int, optional): The maximum number of chunks. Defaults to 5.
+
+        Returns:
+            List[MemoryChunk]: The most relevant chunks, the best first.
+        """
+
+        if not self.chunks:
+            return []
+        vector = None
+        if self.vectors is not None:
+            vector = await self.embeddings.aembed_query(query)
+        with self._lock:
+            candidates = 2 * top_k if vector is not None else top_k
+            rankings = [self.lexical.search(tokenize(query), candidates)]
+            if vector is not None:
+                rankings.append(self.vectors.search(vector, candidates))
+            chunks = list(self.chunks)
+
+        fused: Dict[int, float] = {}
+        for ranking in rankings:
+            for rank, (doc_id, _) in enumerate(ranking):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1 / (RRF_K + rank + 1)
+        best = sorted(fused, key=lambda doc_id: (-fused[doc_id], doc_id))[:top_k]
+        return [chunks[doc_id] for doc_id in best]
+
+
+def format_chunks(chunks: Sequence[MemoryChunk]) -> str:
+    """Render retrieved chunks for a prompt, with the step (and source) they come from."""
+
+    return "\n\n".join(
+        f"[{chunk.step}{f' - {chunk.source}' if chunk.source else ''}]\n{chunk.text}"
+        for chunk in chunks
+    )
+
+
+class RetrievalMemories:
+    """
+    Process-wide registry of the retrieval memory of each task.
+
+    Memories are dropped when their task finishes, and only the most recently used ones
+    are kept (`MAX_TRACKED_RUNS`), in case a task never finishes.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+
+        self._memories: "OrderedDict[str, RetrievalMemory]" = OrderedDict()
+        self._embeddings: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _embedder(self, embedding_model: str) -> Any:
+        """Load an embedding model, once per process."""
+
+        if embedding_model not in self._embeddings:
+            from langchain.embeddings import init_embeddings
+
+            provider, model = embedding_model.split("/", maxsplit=1)
+            self._embeddings[embedding_model] = init_embeddings(model, provider=provider)
+        return self._embeddings[embedding_model]
+
+    def get(self, task_id: str, configuration: Configuration) -> RetrievalMemory:
+        """Return the memory of a task (created on first use)."""
+
+        with self._lock:
+            if task_id not in self._memories:
+                embeddings = None
+                if configuration.retrieval_embedding_model:
+                    embeddings = self._embedder(configuration.retrieval_embedding_model)
+                self._memories[task_id] = RetrievalMemory(
+                    chunk_chars=configuration.retrieval_chunk_chars, embeddings=embeddings
+                )
+                while len(self._memories) > MAX_TRACKED_RUNS:
+                    self._memories.popitem(last=False)
+            self._memories.move_to_end(task_id)
+            return self._memories[task_id]
+
+    def clear(self, task_id: str = None) -> None:
+        """Clear the memory of a task, or every memory if no task is given."""
+
+        with self._lock:
+            if task_id is None:
+                self._memories.clear()
+            else:
+                self._memories.pop(task_id, None)
+
+
+RETRIEVAL_MEMORIES = RetrievalMemories()
@@ -0,0 +1,493 @@
+"""Metrics on the state size, the prompt caching, the tool calls, the checks, the retries and the phase costs.
+
+The size of each state channel is measured with the same serializer used by the
+LangGraph checkpointers, so it reflects the cost of checkpointing the state.
+"""
+
+import functools
+import inspect
+import threading
+from collections import Counter, defaultdict
+from dataclasses import fields
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from react_agent.configuration import Configuration
+from react_agent.state import State
+from react_agent.utils import RunRecords, get_run_id
+from src.settings import custom_logger
+
+
+logger = custom_logger("Metrics")
+
+_serializer = JsonPlusSerializer()
+
+
+def measure_state(state: State) -> Dict[str, int]:
+    """
+    Measure the serialized size (in bytes) of every channel of the state.
+
+    Args:
+        state (State): The state to measure.
+
+    Returns:
+        Dict[str, int]: The size of each channel, plus the total and the number of messages.
+    """
+
+    sizes = {}
+    for f in fields(state):
+        value = getattr(state, f.name)
+        if value is None or isinstance(value, type):
+            continue
+        sizes[f.name] = len(_serializer.dumps_typed(value)[1])
+    sizes["total"] = sum(sizes.values())
+    sizes["n_messages"] = len(state.messages)
+    return sizes
+
+
+class StateMetrics:
+    """Per-run record of the state size observed at every super-step."""
+
+    def __init__(self) -> None:
+        """Initialize an empty record."""
+
+        self._records: Dict[str, List[Dict[str, Any]]] = RunRecords(list)
+        self._lock = threading.Lock()
+
+    def record(self, run_id: str, node: str, state: State) -> Dict[str, Any]:
+        """Measure the state received by a node and record it for the run."""
+
+        sizes = {"node": node, **measure_state(state)}
+        with self._lock:
+            self._records[run_id].append(sizes)
+        logger.debug(
+            "State size before '%s': %s bytes (%s messages)",
+            node,
+            sizes["total"],
+            sizes["n_messages"],
+        )
+        return sizes
+
+    def get(self, run_id: str = "default") -> List[Dict[str, Any]]:
+        """Return the records of a run."""
+
+        with self._lock:
+            return list(self._records.get(run_id, []))
+
+    def clear(self, run_id: str = None) -> None:
+        """Clear the records of a run, or every record if no run is given."""
+
+        with self._lock:
+            if run_id is None:
+                self._records.clear()
+            else:
+                self._records.pop(run_id, None)
+
+
+STATE_METRICS = StateMetrics()
+
+
+def get_cached_tokens(response: AIMessage) -> int:
+    """
+    Return the number of input tokens of a response served from the provider's prompt cache.
+
+    Args:
+        response (AIMessage): The response of the model.
+
+    Returns:
+        int: The cached input tokens (0 if not reported by the provider).
+    """
+
+    details = (response.usage_metadata or {}).get("input_token_details") or {}
+    if details.get("cache_read") is not None:
+        return details["cache_read"]
+    token_usage = response.response_metadata.get("token_usage") or {}
+    return (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+
+class PromptCacheStats:
+    """Per-run record of the input tokens served from the provider's prompt cache, by phase."""
+
+    def __init__(self) -> None:
+        """Initialize an empty record."""
+
+        self._stats: Dict[str, Dict[str, Counter]] = RunRecords(lambda: defaultdict(Counter))
+        self._lock = threading.Lock()
+
+    def record(self, run_id: str, phase: str, response: AIMessage) -> int:
+        """Record the input and cached tokens of a response, returning the cached tokens."""
+
+        cached_tokens = get_cached_tokens(response)
+        with self._lock:
+            stats = self._stats[run_id][phase]
+            stats["calls"] += 1
+            stats["input_tokens"] += (response.usage_metadata or {}).get("input_tokens", 0)
+            stats["cached_tokens"] += cached_tokens
+        return cached_tokens
+
+    def get(self, run_id: str = None) -> Dict[str, Dict[str, float]]:
+        """Return the statistics of each phase for a run, or across every run if no run is given."""
+
+        with self._lock:
+            runs = [self._stats.get(run_id, {})] if run_id is not None else list(self._stats.values())
+            totals: Dict[str, Counter] = defaultdict(Counter)
+            for run in runs:
+                for phase, stats in run.items():
+                    totals[phase].update(stats)
+        return {
+            phase: {
+                **stats,
+                "cached_ratio": (
+                    stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] else 0.0
+                ),
+            }
+            for phase, stats in totals.items()
+        }
+
+    def clear(self, run_id: str = None) -> None:
+        """Clear the statistics of a run, or every statistic if no run is given."""
+
+        with self._lock:
+            if run_id is None:
+                self._stats.clear()
+            else:
+                self._stats.pop(run_id, None)
+
+
+PROMPT_CACHE_STATS = PromptCacheStats()
+
+
+class ToolMetrics:
+    """Per-run record of the tool calls, their latency and the deduplicated ones, by tool."""
+
+    def __init__(self) -> None:
+        """Initialize an empty record."""
+
+        self._latencies: Dict[str, Dict[str, List[float]]] = RunRecords(lambda: defaultdict(list))
+        self._counts: Dict[str, Dict[str, Counter]] = RunRecords(lambda: defaultdict(Counter))
+        self._lock = threading.Lock()
+
+    def record(self, run_id: str, tool: str, latency: float, error: bool = False) -> None:
+        """Record an executed tool call."""
+
+        with self._lock:
+            self._latencies[run_id][tool].append(latency)
+            self._counts[run_id][tool]["errors"] += int(error)
+
+    def record_processing(self, run_id: str, tool: str, chars_in: int, chars_out: int) -> None:
+        """Record the characters of a tool output before and after its post-processing."""
+
+        with self._lock:
+            self._counts[run_id][tool]["chars_in"] += chars_in
+            self._counts[run_id][tool]["chars_out"] += chars_out
+
+    def record_deduplicated(self, run_id: str, tool: str) -> None:
+        """Record a tool call answered with the output of an identical call of the step."""
+
+        with self._lock:
+            self._counts[run_id][tool]["deduplicated"] += 1
+
+    def get(self, run_id: str = None) -> Dict[str, Dict[str, float]]:
+        """Return the statistics of each tool for a run, or across every run if no run is given."""
+
+        with self._lock:
+            run_ids = [run_id] if run_id is not None else list(self._counts)
+            latencies: Dict[str, List[float]] = defaultdict(list)
+            counts: Dict[str, Counter] = defaultdict(Counter)
+            for run in run_ids:
+                for tool, values in self._latencies.get(run, {}).items():
+                    latencies[tool].extend(values)
+                for tool, values in self._counts.get(run, {}).items():
+                    counts[tool].update(values)
+        stats = {}
+        for tool in counts:
+            ordered = sorted(latencies[tool])
+            stats[tool] = {
+                "calls": len(ordered),
+                "deduplicated": counts[tool]["deduplicated"],
+                "errors": counts[tool]["errors"],
+                "chars_in": counts[tool]["chars_in"],
+                "chars_out": counts[tool]["chars_out"],
+                "latency_mean": sum(ordered) / len(ordered) if ordered else None,
+                "latency_p95": ordered[int(0.95 * (len(ordered) - 1))] if ordered else None,
+                "latency_max": ordered[-1] if ordered else None,
+            }
+        return stats
+
+    def clear(self, run_id: str = None) -> None:
+        """Clear the record of a run, or every record if no run is given."""
+
+        with self._lock:
+            if run_id is None:
+                self._latencies.clear()
+                self._counts.clear()
+            else:
+                self._latencies.pop(run_id, None)
+                self._counts.pop(run_id, None)
+
+
+TOOL_METRICS = ToolMetrics()
+
+
+class CheckTierStats:
+    """Per-run record of the step evaluations resolved by each tier of the check phase."""
+
+    def __init__(self) -> None:
+        """Initialize an empty record."""
+
+        self._counts: Dict[str, Dict[str, Counter]] = RunRecords(lambda: defaultdict(Counter))
+        self._lock = threading.Lock()
+
+    def record(self, run_id: str, tier: str, success: bool) -> None:
+        """Record an evaluation resolved by a tier ('heuristic', 'check_model' or 'model')."""
+
+        with self._lock:
+            counts = self._counts[run_id][tier]
+            counts["resolved"] += 1
+            counts["passed" if success else "failed"] += 1
+
+    def record_escalation(self, run_id: str, tier: str) -> None:
+        """Record an evaluation a tier was not confident about, left to the next tier."""
+
+        with self._lock:
+            self._counts[run_id][tier]["escalated"] += 1
+
+    def get(self, run_id: str = None) -> Dict[str, Dict[str, int]]:
+        """Return the counts of each tier for a run, or across every run if no run is given."""
+
+        with self._lock:
+            runs = [self._counts.get(run_id, {})] if run_id is not None else list(self._counts.values())
+            totals: Dict[str, Counter] = defaultdict(Counter)
+            for run in runs:
+                for tier, counts in run.items():
+                    totals[tier].update(counts)
+        return {
+            tier: {key: counts[key] for key in ("resolved", "passed", "failed", "escalated")}
+            for tier, counts in totals.items()
+        }
+
+    def clear(self, run_id: str = None) -> None:
+        """Clear the record of a run, or every record if no run is given."""
+
+        with self._lock:
+            if run_id is None:
+                self._counts.clear()
+            else:
+                self._counts.pop(run_id, None)
+
+
+CHECK_TIER_STATS = CheckTierStats()
+
+
+def estimate_cost(usage: Dict[str, Any], prices: Optional[Dict[str, float]]) -> Optional[float]:
+    """
+    Estimate the cost (USD) of an LLM call from its token usage.
+
+    Args:
+        usage (Dict[str, Any]): The usage metadata of the response.
+        prices (Dict[str, float], optional): The price (USD per million tokens) of the 'input',
+            'output' and optionally 'cached_input' tokens of the model.
+
+    Returns:
+        float, optional: The cost of the call, or None if the model has no prices.
+    """
+
+    if not prices:
+        return None
+    input_tokens = usage.get("input_tokens") or 0
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    input_price = prices.get("input", 0.0)
+    return (
+        (input_tokens - cached_tokens) * input_price
+        + cached_tokens * prices.get("cached_input", input_price)
+        + (usage.get("output_tokens") or 0) * prices.get("output", 0.0)
+    ) / 1_000_000
+
+
+class PhaseCostStats:
+    """Per-run record of the tokens, cost and latency of the LLM calls of each phase, by model serving them."""
+
+    def __init__(self) -> None:
+        """Initialize an empty record."""
+
+        self._calls: Dict[str, List[Dict[str, Any]]] = RunRecords(list)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        run_id: str,
+        phase: str,
+        model: str,
+        usage: Dict[str, Any],
+        latency: float,
+        cost: Optional[float],
+    ) -> None:
+        """Record an LLM call of a phase, served by `model` (a fallback, when the router failed over)."""
+
+        with self._lock:
+            self._calls[run_id].append(
+                {
+                    "phase": phase,
+                    "model": model,
+                    "input_tokens": usage.get("input_tokens") or 0,
+                    "output_tokens": usage.get("output_tokens") or 0,
+                    "latency": latency,
+                    "cost": cost,
+                }
+            )
+
+    def get(self, run_id: str = None) -> Dict[str, Dict[str, Any]]:
+        """Return the calls, tokens, cost, latency and models of each phase for a run, or across every run."""
+
+        with self._lock:
+            calls = (
+                list(self._calls.get(run_id, []))
+                if run_id is not None
+                else [call for run in self._calls.values() for call in run]
+            )
+        by_phase: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for call in calls:
+            by_phase[call["phase"]].append(call)
+
+        report = {}
+        for phase, phase_calls in by_phase.items():
+            latencies = sorted(call["latency"] for call in phase_calls)
+            costs = [call["cost"] for call in phase_calls if call["cost"] is not None]
+            report[phase] = {
+                "calls": len(phase_calls),
+                "input_tokens": sum(call["input_tokens"] for call in phase_calls),
+                "output_tokens": sum(call["output_tokens"] for call in phase_calls),
+                "cost_usd": sum(costs) if costs else None,
+                "unpriced_calls": len(phase_calls) - len(costs),
+                "latency_p50_s": latencies[int(0.50 * (len(latencies) - 1))],
+                "latency_p95_s": latencies[int(0.95 * (len(latencies) - 1))],
+                "models": dict(Counter(call["model"] for call in phase_calls)),
+            }
+        return report
+
+    def totals(self, run_id: str) -> Dict[str, int]:
+        """Return the number of calls and the tokens (input and output) of a run."""
+
+        with self._lock:
+            calls = self._calls.get(run_id, [])
+            return {
+                "calls": len(calls),
+                "tokens": sum(call["input_tokens"] + call["output_tokens"] for call in calls),
+            }
+
+    def clear(self, run_id: str = None) -> None:
+        """Clear the record of a run, or every record if no run is given."""
+
+        with self._lock:
+            if run_id is None:
+                self._calls.clear()
+            else:
+                self._calls.pop(run_id, None)
+
+
+PHASE_COSTS = PhaseCostStats()
+
+
+def record_llm_call(
+    config: RunnableConfig, phase: str, model_name: str, response: AIMessage, latency: float
+) -> str:
+    """
+    Record the tokens, cost and latency of an LLM call in `PHASE_COSTS`, which the LLM budgets read.
+
+    Args:
+        config (RunnableConfig): The configuration of the run.
+        phase (str): The phase issuing the call.
+        model_name (str): The model called.
+        response (AIMessage): The response of the call.
+        latency (float): The latency of the call, in seconds.
+
+    Returns:
+        str: The model that served the response (a fallback, if the router failed over).
+    """
+
+    usage = response.usage_metadata or {}
+    served_model = response.response_metadata.get("routed_model", model_name)
+    prices = Configuration.from_runnable_config(config).model_prices.get(served_model)
+    PHASE_COSTS.record(
+        get_run_id(config), phase, served_model, usage, latency, estimate_cost(usage, prices)
+    )
+    return served_model
+
+
+class RetryStats:
+    """Per-run record of the retries, by outcome, with the tokens of the retried do calls."""
+
+    def __init__(self) -> None:
+        """Initialize an empty record."""
+
+        self._counts: Dict[str, Dict[str, Counter]] = RunRecords(lambda: defaultdict(Counter))
+        self._lock = threading.Lock()
+
+    def record(self, run_id: str, event: str, usage: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Record a retry event, with the token usage of its call if any.
+
+        Events are 'failed_check' (a step failing its check), 'full' and 'patch' (a failed
+        step retried by running the do phase again or by patching its result),
+        'patch_failed' (a patch that could not be applied), 'transport' (an LLM call retried
+        after a transport error), 'given_up' (a step failing after all its retries) and
+        'budget_exhausted' (a task stopped for using up its LLM calls or tokens).
+        """
+
+        with self._lock:
+            counts = self._counts[run_id][event]
+            counts["count"] += 1
+            if usage:
+                counts["input_tokens"] += usage.get("input_tokens") or 0
+                counts["output_tokens"] += usage.get("output_tokens") or 0
+
+    def get(self, run_id: str = None) -> Dict[str, Dict[str, int]]:
+        """Return the counts (and tokens) of each event for a run, or across every run if no run is given."""
+
+        with self._lock:
+            runs = [self._counts.get(run_id, {})] if run_id is not None else list(self._counts.values())
+            totals: Dict[str, Counter] = defaultdict(Counter)
+            for run in runs:
+                for event, counts in run.items():
+                    totals[event].update(counts)
+        return {event: dict(counts) for event, counts in totals.items()}
+
+    def clear(self, run_id: str = None) -> None:
+        """Clear the record of a run, or every record if no run is given."""
+
+        with self._lock:
+            if run_id is None:
+                self._counts.clear()
+            else:
+                self._counts.pop(run_id, None)
+
+
+RETRY_STATS = RetryStats()
+
+
+def track_state_size(node: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap a graph node so the size of its input state is recorded at every super-step.
+
+    Measuring is only done when `track_state_size` is enabled in the configuration.
+
+    Args:
+        node (Callable): The node function, taking the state and the config.
+
+    Returns:
+        Callable: The wrapped (async) node.
+    """
+
+    @functools.wraps(node)
+    async def wrapper(state: State, config: RunnableConfig) -> Any:
+        if Configuration.from_runnable_config(config).track_state_size:
+            STATE_METRICS.record(get_run_id(config, state), node.__name__, state)
+        result = node(state, config)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    return wrapper
@@ -0,0 +1,278 @@
+"""Structured output parsing of the phase responses.
+
+Model outputs are parsed with a tolerant JSON parser, which extracts the JSON object
+from surrounding text or code fences and repairs common defects (raw newlines in
+strings, trailing commas, outputs truncated mid-stream). If the output still does not
+validate, the model is re-asked with a short targeted prompt containing only the faulty
+output and the error, instead of repeating the whole phase call. Parse failure rates
+are tracked per phase.
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar
+
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.runnables import RunnableConfig
+from pydantic import BaseModel, ValidationError
+
+from react_agent.configuration import Configuration
+from react_agent.metrics import record_llm_call
+from react_agent.ratelimit import throttle
+from react_agent.utils import get_message_text, load_routed_model
+from src.prompts import FIX_OUTPUT_PROMPT
+from src.settings import custom_logger
+
+
+logger = custom_logger("Parsing")
+
+T = TypeVar("T", bound=BaseModel)
+
+_CLOSING = {"{": "}", "[": "]"}
+_CONTROL_CHARACTERS = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class OutputParsingError(ValueError):
+    """Raised when a model output cannot be parsed into the expected structure."""
+
+
+def _scan(text: str) -> str:
+    """
+    Extract the first JSON value of a text, repairing it while scanning.
+
+    Raw control characters inside strings are escaped, trailing commas are dropped,
+    and unterminated strings, objects and arrays (e.g. from a truncated stream) are
+    closed at the end of the text, dropping the last incomplete member if needed.
+    """
+
+    start = min(
+        (idx for idx in (text.find("{"), text.find("[")) if idx != -1), default=-1
+    )
+    if start == -1:
+        raise OutputParsingError("No JSON object found in the output")
+
+    out: List[str] = []
+    stack: List[str] = []
+    # Positions where a truncated output can be cut, with the containers open there
+    cut_points: List[Tuple[int, List[str]]] = []
+    in_string = escaped = False
+    for char in text[start:]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char in _CONTROL_CHARACTERS:
+                char = _CONTROL_CHARACTERS[char]
+            out.append(char)
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in _CLOSING:
+            stack.append(_CLOSING[char])
+            out.append(char)
+            cut_points.append((len(out), list(stack)))
+            continue
+        elif char == ",":
+            cut_points.append((len(out), list(stack)))
+        elif char in "}]":
+            # Drop trailing commas before closing a container
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if not stack or stack[-1] != char:
+                break
+            stack.pop()
+            out.append(char)
+            if not stack:
+                return "".join(out)
+            continue
+        out.append(char)
+
+    # Truncated output: close whatever was left open
+    if escaped:
+        out.pop()
+    if in_string:
+        out.append('"')
+    candidates = [(len(out), stack)] + list(reversed(cut_points))
+    for position, open_containers in candidates:
+        candidate = "".join(out[:position]).rstrip().rstrip(",")
+        candidate += "".join(reversed(open_containers))
+        try:
+            json.loads(candidate)
+            return candidate
+        except ValueError:
+            continue
+    return "".join(out)
+
+
+def repair_json(content: str) -> Any:
+    """
+    Parse the JSON value contained in a model output, repairing it if needed.
+
+    Args:
+        content (str): The model output (possibly wrapped in text or code fences, or truncated).
+
+    Returns:
+        Any: The parsed JSON value.
+
+    Raises:
+        OutputParsingError: If no JSON value can be recovered from the output.
+    """
+
+    try:
+        return json.loads(content.strip().removeprefix("```json").strip("`\n "))
+    except ValueError:
+        pass
+    try:
+        return json.loads(_scan(content))
+    except ValueError as e:
+        raise OutputParsingError(f"JSON could not be extracted: {e}") from e
+
+
+@dataclass
+class ParseStats:
+    """Parsing outcomes of a phase."""
+
+    parsed: int = 0
+    repaired: int = 0
+    reasked: int = 0
+    failed: int = 0
+
+    @property
+    def failure_rate(self) -> float:
+        """Return the ratio of outputs that could not be parsed on the first try."""
+
+        total = self.parsed + self.reasked + self.failed
+        return (self.reasked + self.failed) / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        """Return the counters (and failure rate) as a dictionary."""
+
+        return {**asdict(self), "failure_rate": self.failure_rate}
+
+
+class ParseStatsRegistry:
+    """Process-wide parsing statistics, by phase."""
+
+    def __init__(self) -> None:
+        """Initialize empty statistics."""
+
+        self._stats: Dict[str, ParseStats] = defaultdict(ParseStats)
+        self._lock = threading.Lock()
+
+    def increment(self, phase: str, outcome: str) -> None:
+        """Count a parsing outcome of a phase."""
+
+        with self._lock:
+            stats = self._stats[phase]
+            setattr(stats, outcome, getattr(stats, outcome) + 1)
+
+    def get(self) -> Dict[str, Dict[str, float]]:
+        """Return the statistics of every phase."""
+
+        with self._lock:
+            return {phase: stats.to_dict() for phase, stats in self._stats.items()}
+
+    def clear(self) -> None:
+        """Reset the statistics."""
+
+        with self._lock:
+            self._stats.clear()
+
+
+PARSE_STATS = ParseStatsRegistry()
+
+
+def _validate(content: str, schema: Type[T]) -> T:
+    """Parse and validate an output against a schema."""
+
+    value = repair_json(content)
+    try:
+        return schema.model_validate(value)
+    except ValidationError as e:
+        raise OutputParsingError(str(e)) from e
+
+
+async def parse_output(
+    response: AIMessage,
+    schema: Type[T],
+    phase: str,
+    model_name: str,
+    config: Optional[RunnableConfig] = None,
+    max_reasks: int = 1,
+) -> T:
+    """
+    Parse a phase response into its structured output.
+
+    The output is first parsed with the tolerant JSON parser. If it still fails to
+    validate, the model is re-asked (up to `max_reasks` times) to fix only the faulty
+    output, which is much cheaper than repeating the whole phase call.
+
+    Args:
+        response (AIMessage): The response of the phase.
+        schema (Type[T]): The Pydantic model of the structured output.
+        phase (str): The phase of the response (for the statistics).
+        model_name (str): The model re-asked on failures ('provider/model').
+        config (RunnableConfig, optional): The configuration of the run.
+        max_reasks (int): Maximum number of targeted re-asks.
+
+    Returns:
+        T: The validated structured output.
+
+    Raises:
+        OutputParsingError: If the output cannot be parsed after every re-ask.
+    """
+
+    content = get_message_text(response)
+    try:
+        output = _validate(content, schema)
+        try:
+            json.loads(content.strip().removeprefix("```json").strip("`\n "))
+            PARSE_STATS.increment(phase, "parsed")
+        except ValueError:
+            PARSE_STATS.increment(phase, "repaired")
+        return output
+    except OutputParsingError as e:
+        error = e
+
+    parser = PydanticOutputParser(pydantic_object=schema)
+    for attempt in range(max_reasks):
+        logger.warning(
+            "Output of phase '%s' could not be parsed, re-asking (%s/%s): %s",
+            phase,
+            attempt + 1,
+            max_reasks,
+            error,
+        )
+        configuration = Configuration.from_runnable_config(config)
+        await throttle("llm", configuration)
+        start = time.perf_counter()
+        fixed = await load_routed_model(model_name, configuration).ainvoke(
+            FIX_OUTPUT_PROMPT.format(
+                output=content,
+                error=error,
+                format_instructions=parser.get_format_instructions(),
+            ),
+            config,
+        )
+        # Counted in the costs of the phase (and in the LLM budgets of the task)
+        record_llm_call(config, phase, model_name, fixed, time.perf_counter() - start)
+        content = get_message_text(fixed)
+        try:
+            output = _validate(content, schema)
+            PARSE_STATS.increment(phase, "reasked")
+            return output
+        except OutputParsingError as e:
+            error = e
+
+    PARSE_STATS.increment(phase, "failed")
+    raise OutputParsingError(f"Output of phase '{phase}' could not be parsed: {error}")
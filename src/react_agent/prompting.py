@@ -0,0 +1,154 @@
+"""Precompiled prompt templates.
+
+Templates are parsed once into literal chunks and fields, with the values known ahead
+of time (e.g. the format instructions of a phase, serialized from its Pydantic schema)
+folded into the literal chunks. Rendering a prompt then only joins the cached chunks
+with the dynamic values, instead of building and formatting new templates on every call.
+Values are inserted as is, so braces in them (e.g. JSON results) are never interpreted.
+
+For the 'cache_friendly' layout, a prompt can also be split into its static text, where
+the dynamic fields are replaced by references to tagged sections, and a state block
+holding the values of those sections. The static text is byte-stable across calls, so
+the prompt prefix can be served from the provider's prompt cache.
+"""
+
+import functools
+from datetime import datetime, timezone
+from string import Formatter
+from typing import Any, List, Mapping, Optional, Tuple
+
+
+_formatter = Formatter()
+
+
+class CompiledPrompt:
+    """A prompt template parsed once, rendering only its dynamic fields."""
+
+    def __init__(self, template: str, **partial_variables: Any) -> None:
+        """
+        Compile a template.
+
+        Args:
+            template (str): The template, using `{field}` placeholders.
+            **partial_variables: Values of the fields known at compile time.
+        """
+
+        self.template = template
+        chunks: List[Tuple[str, Optional[str], str, Optional[str]]] = []
+        literal = ""
+        for text, name, format_spec, conversion in _formatter.parse(template):
+            literal += text
+            if name is None:
+                continue
+            if name in partial_variables:
+                value = partial_variables[name]
+                if conversion:
+                    value = _formatter.convert_field(value, conversion)
+                literal += format(value, format_spec or "")
+                continue
+            chunks.append((literal, name, format_spec or "", conversion))
+            literal = ""
+        self._chunks = chunks
+        self._tail = literal
+        self.input_variables = list(dict.fromkeys(name for _, name, _, _ in chunks))
+
+    @functools.cached_property
+    def static_text(self) -> str:
+        """Return the prompt with its dynamic fields replaced by references to their sections."""
+
+        parts = []
+        for literal, name, _, _ in self._chunks:
+            parts.append(literal)
+            parts.append(f"<{name}>")
+        parts.append(self._tail)
+        return "".join(parts)
+
+    @property
+    def static_prefix(self) -> str:
+        """Return the rendered text preceding the first dynamic field."""
+
+        return self._chunks[0][0] if self._chunks else self._tail
+
+    def render(self, variables: Mapping[str, Any]) -> str:
+        """
+        Render the prompt with the values of its dynamic fields.
+
+        Args:
+            variables (Mapping[str, Any]): The values of the dynamic fields (extra keys are ignored).
+
+        Returns:
+            str: The rendered prompt.
+
+        Raises:
+            KeyError: If the value of a dynamic field is missing.
+        """
+
+        parts = []
+        for literal, name, format_spec, conversion in self._chunks:
+            value = variables[name]
+            if conversion:
+                value = _formatter.convert_field(value, conversion)
+            parts.append(literal)
+            parts.append(format(value, format_spec) if format_spec else str(value))
+        parts.append(self._tail)
+        return "".join(parts)
+
+
+@functools.lru_cache(maxsize=32)
+def compile_prompt(template: str, **partial_variables: Any) -> CompiledPrompt:
+    """
+    Compile a template, reusing the compiled prompt of previous calls.
+
+    Used for the templates coming from the configuration (e.g. the system prompt),
+    which are compiled once per distinct template.
+
+    Args:
+        template (str): The template, using `{field}` placeholders.
+        **partial_variables: Values of the fields known at compile time (must be hashable).
+
+    Returns:
+        CompiledPrompt: The compiled prompt.
+    """
+
+    return CompiledPrompt(template, **partial_variables)
+
+
+# Truncation of the system time, by resolution
+TIME_RESOLUTIONS = {
+    "second": {"microsecond": 0},
+    "minute": {"second": 0, "microsecond": 0},
+    "hour": {"minute": 0, "second": 0, "microsecond": 0},
+    "day": {"hour": 0, "minute": 0, "second": 0, "microsecond": 0},
+}
+
+
+def format_system_time(resolution: Optional[str] = None) -> str:
+    """
+    Return the current UTC time in ISO format, truncated to the given resolution.
+
+    Args:
+        resolution (str, optional): One of 'second', 'minute', 'hour' or 'day'.
+            Defaults to None (microseconds).
+
+    Returns:
+        str: The formatted time.
+    """
+
+    now = datetime.now(tz=timezone.utc)
+    if resolution is not None:
+        now = now.replace(**TIME_RESOLUTIONS[resolution])
+    return now.isoformat()
+
+
+def render_state_block(values: Mapping[str, Any]) -> str:
+    """
+    Render the values referenced by the static text of the prompts as tagged sections.
+
+    Args:
+        values (Mapping[str, Any]): The values of the sections, in the order to render them.
+
+    Returns:
+        str: The sections, e.g. `<context>\n...\n</context>`.
+    """
+
+    return "\n".join(f"<{name}>\n{value}\n</{name}>" for name, value in values.items())
@@ -0,0 +1,143 @@
+"""Cheap local lexical ranking (Okapi BM25).
+
+Used to rank texts (e.g. search results) against the description of a step without
+calling any model. The index is incremental, so documents can be added over time.
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was "
+    "were what when where which who will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a text into lowercase word tokens, without stopwords.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        List[str]: The tokens.
+    """
+
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Incremental inverted index scoring documents with Okapi BM25."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        """
+        Initialize an empty index.
+
+        Args:
+            k1 (float, optional): Term frequency saturation. Defaults to 1.5.
+            b (float, optional): Document length normalization. Defaults to 0.75.
+        """
+
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths: List[int] = []
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._total_length = 0
+        self._length_norms: List[float] = []
+
+    def __len__(self) -> int:
+        """Return the number of documents of the index."""
+
+        return len(self.doc_lengths)
+
+    def add(self, tokens: Sequence[str]) -> int:
+        """
+        Add a document to the index.
+
+        Args:
+            tokens (Sequence[str]): The tokens of the document.
+
+        Returns:
+            int: The id of the document (its insertion order).
+        """
+
+        doc_id = len(self.doc_lengths)
+        for term, frequency in Counter(tokens).items():
+            self._postings[term][doc_id] = frequency
+        self.doc_lengths.append(len(tokens))
+        self._total_length += len(tokens)
+        return doc_id
+
+    def scores(self, query_tokens: Sequence[str]) -> Dict[int, float]:
+        """
+        Score the documents containing any of the query terms.
+
+        Args:
+            query_tokens (Sequence[str]): The tokens of the query.
+
+        Returns:
+            Dict[int, float]: The BM25 score of each matching document, by id.
+        """
+
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return {}
+        # The length normalization of every document only changes when documents are added
+        if len(self._length_norms) != n_docs:
+            average_length = self._total_length / n_docs or 1.0
+            self._length_norms = [
+                self.k1 * (1 - self.b + self.b * length / average_length)
+                for length in self.doc_lengths
+            ]
+        length_norms = self._length_norms
+        scores: Dict[int, float] = {}
+        for term in set(query_tokens):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            weight = (self.k1 + 1) * math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * frequency / (
+                    frequency + length_norms[doc_id]
+                )
+        return scores
+
+    def search(self, query_tokens: Sequence[str], top_k: int) -> List[Tuple[int, float]]:
+        """
+        Return the best scoring documents for a query.
+
+        Args:
+            query_tokens (Sequence[str]): The tokens of the query.
+            top_k (int): The maximum number of documents.
+
+        Returns:
+            List[Tuple[int, float]]: The (document id, score) pairs, the best first.
+        """
+
+        scores = self.scores(query_tokens)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+
+def rank_texts(texts: Sequence[str], query: str) -> List[float]:
+    """
+    Score each text against a query with BM25 (the texts being the whole corpus).
+
+    Args:
+        texts (Sequence[str]): The texts to rank.
+        query (str): The query.
+
+    Returns:
+        List[float]: The score of each text, in the same order.
+    """
+
+    index = BM25Index()
+    for text in texts:
+        index.add(tokenize(text))
+    scores = index.scores(tokenize(query))
+    return [scores.get(doc_id, 0.0) for doc_id in range(len(texts))]
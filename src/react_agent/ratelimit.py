@@ -0,0 +1,143 @@
+"""Process-wide token-bucket rate limiting of the LLM provider and the search tool.
+
+Every task running in the process (e.g. in a batch) shares the same bucket of each
+resource, so the limits hold globally. Acquiring a token reserves it immediately and
+waits until the bucket refills, so callers are served in order and the waiting itself
+applies backpressure to the tasks.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from react_agent.configuration import Configuration
+from src.settings import custom_logger
+
+
+logger = custom_logger("Rate Limit")
+
+
+class TokenBucket:
+    """Token bucket refilled at a constant rate, up to its capacity."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Initialize a full bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): Maximum number of tokens (i.e. the allowed burst).
+        """
+
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self.acquired = 0
+        self.waited = 0.0
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens from the bucket, returning the seconds to wait until they are available.
+
+        Args:
+            tokens (float, optional): Number of tokens to take. Defaults to 1.
+
+        Returns:
+            float: The seconds to wait before using the tokens.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # The balance goes negative while tokens are reserved ahead of time
+            self._tokens -= tokens
+            wait = max(0.0, -self._tokens / self.rate)
+            self.acquired += 1
+            self.waited += wait
+            return wait
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Wait until the tokens are available.
+
+        Args:
+            tokens (float, optional): Number of tokens to take. Defaults to 1.
+
+        Returns:
+            float: The seconds waited.
+        """
+
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def stats(self) -> Dict[str, float]:
+        """Return the number of acquisitions and the total seconds waited."""
+
+        with self._lock:
+            return {"acquired": self.acquired, "waited": self.waited}
+
+
+class RateLimiters:
+    """Process-wide buckets, by resource (e.g. 'llm' or 'search')."""
+
+    def __init__(self) -> None:
+        """Initialize the registry without buckets."""
+
+        self._buckets: Dict[str, Tuple[Tuple[float, float], TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, resource: str, rate: float, capacity: float) -> TokenBucket:
+        """Return the bucket of a resource, replacing it if its limits changed."""
+
+        with self._lock:
+            limits, bucket = self._buckets.get(resource, (None, None))
+            if limits != (rate, capacity):
+                bucket = TokenBucket(rate, capacity)
+                self._buckets[resource] = ((rate, capacity), bucket)
+            return bucket
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return the statistics of every bucket."""
+
+        with self._lock:
+            buckets = {resource: bucket for resource, (_, bucket) in self._buckets.items()}
+        return {resource: bucket.stats() for resource, bucket in buckets.items()}
+
+    def clear(self) -> None:
+        """Drop every bucket."""
+
+        with self._lock:
+            self._buckets.clear()
+
+
+RATE_LIMITERS = RateLimiters()
+
+
+async def throttle(resource: str, configuration: Configuration) -> Optional[float]:
+    """
+    Wait for the rate limit of a resource, if one is configured.
+
+    Args:
+        resource (str): The limited resource ('llm' or 'search').
+        configuration (Configuration): The configuration with the `rate_limits`.
+
+    Returns:
+        Optional[float]: The seconds waited, or None if the resource is not limited.
+    """
+
+    rate = configuration.rate_limits.get(resource)
+    if not rate:
+        return None
+    bucket = RATE_LIMITERS.get(resource, rate, max(configuration.rate_limit_burst, 1))
+    wait = await bucket.acquire()
+    if wait > 0:
+        logger.debug("Waited %.3fs for the '%s' rate limit", wait, resource)
+    return wait
@@ -0,0 +1,74 @@
+"""Retention policies bounding the size of the `messages` channel.
+
+Every phase appends its full response to the messages of the state, so on long tasks
+the state (and each checkpoint of it) grows linearly. These policies are applied once
+a step is finished, removing the messages that are no longer needed.
+"""
+
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import AIMessage, AnyMessage, RemoveMessage, ToolMessage
+
+from react_agent.configuration import Configuration
+from react_agent.state import State
+
+
+def _is_tool_traffic(message: AnyMessage) -> bool:
+    """Return True for tool outputs and for the model messages requesting them."""
+
+    return isinstance(message, ToolMessage) or (
+        isinstance(message, AIMessage) and bool(message.tool_calls)
+    )
+
+
+def _remove(messages: Sequence[AnyMessage]) -> List[RemoveMessage]:
+    """Build the removal updates for the given messages."""
+
+    return [RemoveMessage(id=message.id) for message in messages if message.id]
+
+
+def apply_message_retention(state: State, configuration: Configuration) -> Dict[str, Any]:
+    """
+    Compute the state updates enforcing the configured message retention policy.
+
+    Policies (`message_retention` in the configuration):
+    - 'all': keep every message.
+    - 'last_n': keep the first message (the task) and the last `max_messages` messages.
+    - 'step': drop the tool calls and tool results once the step using them is finished.
+    - 'summarize': drop every message of the finished step (except the task), folding a
+      short digest of the step into the context.
+
+    Args:
+        state (State): The current state of the agent, at the end of a step.
+        configuration (Configuration): The agent configuration.
+
+    Returns:
+        Dict[str, Any]: The updates to apply to the state (possibly empty).
+    """
+
+    policy = configuration.message_retention
+    messages = list(state.messages)
+    if policy == "all" or len(messages) <= 1:
+        return {}
+
+    history = messages[1:]
+    if policy == "last_n":
+        keep = max(configuration.max_messages - 1, 0)
+        dropped = history[: len(history) - keep] if keep else history
+        return {"messages": _remove(dropped)} if dropped else {}
+
+    if policy == "step":
+        dropped = [message for message in history if _is_tool_traffic(message)]
+        return {"messages": _remove(dropped)} if dropped else {}
+
+    if policy == "summarize":
+        updates: Dict[str, Any] = {"messages": _remove(history)}
+        if state.next_steps:
+            step = state.next_steps[0]
+            outcome = "succeeded" if state.success else "failed"
+            comments = state.feedback.comments if state.feedback is not None else ""
+            digest = f"Step '{step.step}' {outcome}. {comments}".strip()
+            updates["context"] = f"{state.context}\n{digest}" if state.context else digest
+        return updates
+
+    raise ValueError(f"Unknown message retention policy: {policy}")
@@ -0,0 +1,164 @@
+"""Retry policy of the LLM calls and of the do/check loop.
+
+The policy of a task is built from its configuration and decides:
+
+- how LLM calls failing on transport errors (or rate limits) are retried, with
+  exponential backoff and jitter,
+- whether a step failing its check is retried, counting the failed checks of the
+  step and stopping once the task used up its budget of LLM calls or tokens,
+- how a failed step is retried: by running the whole do phase again ('full'), or,
+  when the review suggests fixes, by only asking for edits of the previous result
+  ('patch'), which are applied to it.
+"""
+
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Literal, Optional, Sequence, TypeVar
+
+from react_agent.configuration import Configuration
+from react_agent.metrics import PHASE_COSTS
+from react_agent.routing import is_retryable
+from src.settings import custom_logger
+from src.structs import CheckingOutput, PatchEdit
+
+
+logger = custom_logger("Retry")
+
+T = TypeVar("T")
+
+
+class PatchError(ValueError):
+    """An edit of a patch could not be applied to the previous result."""
+
+
+def apply_patch(text: str, edits: Sequence[PatchEdit]) -> str:
+    """
+    Apply the edits of a patch to a text, in order.
+
+    Args:
+        text (str): The previous result.
+        edits (Sequence[PatchEdit]): The edits, each replacing the first occurrence of its
+            `find` passage (or appending its text when `find` is empty).
+
+    Returns:
+        str: The revised text.
+
+    Raises:
+        PatchError: If the passage of an edit is not found in the text.
+    """
+
+    for edit in edits:
+        if not edit.find:
+            text = f"{text.rstrip()}\n{edit.replace.strip()}" if text.strip() else edit.replace
+        elif edit.find in text:
+            text = text.replace(edit.find, edit.replace, 1)
+        else:
+            raise PatchError(f"Passage not found in the previous result: {edit.find[:80]!r}")
+    return text
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Retry policy of a task (see the module docstring)."""
+
+    max_step_retries: int = 3
+    mode: Literal["full", "patch"] = "full"
+    llm_max_retries: int = 0
+    backoff: float = 0.5
+    max_backoff: float = 8.0
+    max_llm_calls: Optional[int] = None
+    max_llm_tokens: Optional[int] = None
+
+    @classmethod
+    def from_configuration(cls, configuration: Configuration) -> "RetryPolicy":
+        """Build the policy of a task from its configuration."""
+
+        return cls(
+            max_step_retries=configuration.max_step_retries,
+            mode=configuration.retry_mode,
+            llm_max_retries=configuration.llm_max_retries,
+            backoff=configuration.llm_retry_backoff,
+            max_llm_calls=configuration.max_llm_calls,
+            max_llm_tokens=configuration.max_llm_tokens,
+        )
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Return the seconds to wait before a retry (doubled at each attempt, with jitter)."""
+
+        return min(self.max_backoff, self.backoff * 2**attempt) * random.uniform(0.5, 1.5)
+
+    async def call_with_backoff(
+        self,
+        make_call: Callable[[], Awaitable[T]],
+        on_retry: Optional[Callable[[BaseException], None]] = None,
+    ) -> T:
+        """
+        Await a call, retrying it with exponential backoff on transport errors and rate limits.
+
+        Args:
+            make_call (Callable[[], Awaitable[T]]): Starts a new call.
+            on_retry (Callable[[BaseException], None], optional): Called with the error before each retry.
+
+        Returns:
+            T: The response of the call.
+        """
+
+        attempt = 0
+        while True:
+            try:
+                return await make_call()
+            except Exception as e:
+                if attempt >= self.llm_max_retries or not is_retryable(e):
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(
+                    "LLM call failed (%r), retrying in %.2fs (%s/%s)",
+                    e,
+                    delay,
+                    attempt + 1,
+                    self.llm_max_retries,
+                )
+                if on_retry is not None:
+                    on_retry(e)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def budget_exhausted(self, run_id: str, baseline: Optional[Dict[str, int]] = None) -> bool:
+        """
+        Return whether a task used up its budget of LLM calls or tokens.
+
+        Args:
+            run_id (str): The run of the task.
+            baseline (Dict[str, int], optional): The calls and tokens of the run when the task
+                started (see `PhaseCostStats.totals`), so only the usage of the task counts.
+
+        Returns:
+            bool: Whether the budget is used up.
+        """
+
+        if self.max_llm_calls is None and self.max_llm_tokens is None:
+            return False
+        totals = PHASE_COSTS.totals(run_id)
+        usage = {name: max(0, value - (baseline or {}).get(name, 0)) for name, value in totals.items()}
+        return (self.max_llm_calls is not None and usage["calls"] >= self.max_llm_calls) or (
+            self.max_llm_tokens is not None and usage["tokens"] >= self.max_llm_tokens
+        )
+
+    def should_retry_step(
+        self, n_failures: int, run_id: str, baseline: Optional[Dict[str, int]] = None
+    ) -> bool:
+        """Return whether a step that failed its check `n_failures` times is retried."""
+
+        return n_failures <= self.max_step_retries and not self.budget_exhausted(run_id, baseline)
+
+    def use_patch(self, previous_result: Optional[str], feedback: Optional[CheckingOutput]) -> bool:
+        """Return whether a failed step is retried by patching its previous result."""
+
+        return (
+            self.mode == "patch"
+            and bool(previous_result and previous_result.strip())
+            and feedback is not None
+            and not feedback.success
+            and bool(feedback.suggestions)
+        )
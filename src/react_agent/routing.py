@@ -0,0 +1,406 @@
+"""Failover between chat models of several providers, with circuit breakers and health scores.
+
+A `ModelRouter` wraps a primary model and its fallbacks (e.g. the same tier of model
+from other providers). Each call goes to the first healthy candidate, and fails over
+to the next one when the provider errors out or rate-limits the call. The health of
+every model is tracked process-wide:
+
+- a circuit breaker per model, opened after `failure_threshold` consecutive failures,
+  so the model is skipped (without waiting for it to fail) until `reset_timeout`
+  seconds passed, when a single probe call is let through (half-open),
+- a health score, the moving average of the successes of its calls, so a flaky model
+  is tried after the healthier ones even while its circuit is closed. The penalty of
+  the failures fades with a half-life of `reset_timeout`, so a demoted model is tried
+  first again once it had time to recover.
+"""
+
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import ConfigDict, Field
+
+from react_agent.utils import to_message_chunk
+from src.settings import custom_logger
+
+
+logger = custom_logger("Routing")
+
+# HTTP statuses of client errors worth retrying with another provider (timeout, conflict, rate limit)
+_RETRYABLE_CLIENT_STATUSES = {408, 409, 429}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Return whether an error of a provider is worth failing over to another one.
+
+    Client errors (bad request, authentication, ...) would fail the same way on any
+    provider, except for timeouts and rate limits. Any other error (transport errors,
+    server errors) is retryable.
+    """
+
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in _RETRYABLE_CLIENT_STATUSES
+    return True
+
+
+class CircuitBreaker:
+    """Circuit breaker of a model: 'closed' (calls allowed), 'open' (skipped) or 'half_open' (probing)."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0) -> None:
+        """
+        Initialize a closed breaker.
+
+        Args:
+            failure_threshold (int, optional): Consecutive failures opening the circuit. Defaults to 3.
+            reset_timeout (float, optional): Seconds before an open circuit lets a probe call through. Defaults to 30.0.
+        """
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    def allow(self, now: float) -> bool:
+        """Return whether a call can be made, moving an open circuit to half-open after its timeout."""
+
+        if self.state == "open" and now - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probe_started = None
+        if self.state == "half_open":
+            # A single probe at a time (another one if the previous probe never reported back)
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                return False
+            self._probe_started = now
+            return True
+        return self.state == "closed"
+
+    def record_success(self) -> None:
+        """Close the circuit."""
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_started = None
+
+    def record_failure(self, now: float) -> bool:
+        """Count a failure, returning whether it opened the circuit."""
+
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            opened = self.state != "open"
+            self.state = "open"
+            self.opened_at = now
+            self._probe_started = None
+            return opened
+        return False
+
+
+class ProviderHealth:
+    """Process-wide health of each model: circuit breaker, success score, latency and call counts."""
+
+    def __init__(self, alpha: float = 0.2) -> None:
+        """
+        Initialize an empty record.
+
+        Args:
+            alpha (float, optional): Weight of the latest call in the moving averages. Defaults to 0.2.
+        """
+
+        self.alpha = alpha
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._scores: Dict[str, float] = {}
+        self._updated_at: Dict[str, float] = {}
+        self._latencies: Dict[str, float] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _breaker(self, model: str, failure_threshold: int, reset_timeout: float) -> CircuitBreaker:
+        """Return the breaker of a model (created on first use, with the given settings)."""
+
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(failure_threshold, reset_timeout)
+            self._counts[model] = {
+                "calls": 0,
+                "failures": 0,
+                "failovers": 0,
+                "short_circuits": 0,
+                "circuit_opened": 0,
+            }
+        return self._breakers[model]
+
+    def _score(self, model: str, now: float) -> float:
+        """Return the health score of a model, its failures fading with a half-life of `reset_timeout`."""
+
+        if model not in self._scores:
+            return 1.0
+        half_life = self._breakers[model].reset_timeout
+        if half_life <= 0:
+            return 1.0
+        decay = 0.5 ** ((now - self._updated_at[model]) / half_life)
+        return 1.0 - (1.0 - self._scores[model]) * decay
+
+    def _update_score(self, model: str, success: bool, now: float) -> None:
+        """Move the health score of a model towards the outcome of its latest call."""
+
+        self._scores[model] = (1 - self.alpha) * self._score(model, now) + self.alpha * float(success)
+        self._updated_at[model] = now
+
+    def score(self, model: str) -> float:
+        """Return the health score of a model (the moving average of its successes, 1.0 if never called)."""
+
+        with self._lock:
+            return self._score(model, time.monotonic())
+
+    def order(self, models: Sequence[str], min_score: float = 0.5) -> List[str]:
+        """
+        Order candidate models for a call.
+
+        The configured order is kept for the healthy models, those scoring below
+        `min_score` come last, the healthiest first.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            scores = [self._score(model, now) for model in models]
+        healthy = [model for model, score in zip(models, scores) if score >= min_score]
+        unhealthy = sorted(
+            ((score, idx) for idx, score in enumerate(scores) if score < min_score),
+            key=lambda item: -item[0],
+        )
+        return healthy + [models[idx] for _, idx in unhealthy]
+
+    def allow(self, model: str, failure_threshold: int = 3, reset_timeout: float = 30.0) -> bool:
+        """Return whether the circuit of a model lets a call through, counting the skipped calls."""
+
+        with self._lock:
+            allowed = self._breaker(model, failure_threshold, reset_timeout).allow(time.monotonic())
+            if not allowed:
+                self._counts[model]["short_circuits"] += 1
+            return allowed
+
+    def record_success(self, model: str, latency: float) -> None:
+        """Record a successful call of a model (let through by `allow`)."""
+
+        with self._lock:
+            self._breakers[model].record_success()
+            self._counts[model]["calls"] += 1
+            self._update_score(model, True, time.monotonic())
+            previous = self._latencies.get(model)
+            self._latencies[model] = (
+                latency if previous is None else (1 - self.alpha) * previous + self.alpha * latency
+            )
+
+    def record_failure(self, model: str, failover: bool) -> None:
+        """Record a failed call of a model (let through by `allow`), and whether another model was tried next."""
+
+        with self._lock:
+            now = time.monotonic()
+            breaker = self._breakers[model]
+            counts = self._counts[model]
+            counts["calls"] += 1
+            counts["failures"] += 1
+            counts["failovers"] += int(failover)
+            if breaker.record_failure(now):
+                counts["circuit_opened"] += 1
+                logger.warning("Circuit of model '%s' opened after %s failures", model, breaker.consecutive_failures)
+            self._update_score(model, False, now)
+
+    def get(self) -> Dict[str, Dict[str, Any]]:
+        """Return the state of the circuit, the health score, the latency (EWMA) and the counts of each model."""
+
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model: {
+                    "circuit": breaker.state,
+                    "score": self._score(model, now),
+                    "latency_ewma_s": self._latencies.get(model),
+                    **self._counts[model],
+                }
+                for model, breaker in self._breakers.items()
+            }
+
+    def clear(self) -> None:
+        """Forget the health of every model."""
+
+        with self._lock:
+            self._breakers.clear()
+            self._scores.clear()
+            self._updated_at.clear()
+            self._latencies.clear()
+            self._counts.clear()
+
+
+PROVIDER_HEALTH = ProviderHealth()
+
+
+class AllModelsFailedError(RuntimeError):
+    """Every candidate model of a router failed (or had its circuit open)."""
+
+
+class ModelRouter(BaseChatModel):
+    """Chat model routing each call to the healthiest of a primary model and its fallbacks."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    names: List[str] = Field(description="Names of the candidate models, the primary one first")
+    models: List[Any] = Field(description="The candidate models (possibly tool-bound)", exclude=True)
+    failure_threshold: int = Field(default=3, description="Consecutive failures opening the circuit of a model")
+    reset_timeout: float = Field(default=30.0, description="Seconds before an open circuit is probed again")
+    min_health: float = Field(default=0.5, description="Health score under which a model is tried last")
+
+    @property
+    def _llm_type(self) -> str:
+        """Return the type of the model."""
+
+        return "model-router"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ModelRouter":
+        """Return a router over the candidate models bound to the tools."""
+
+        return self.model_copy(
+            update={"models": [model.bind_tools(tools, **kwargs) for model in self.models]}
+        )
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Any:
+        """
+        Return a runnable getting the structured output of the first candidate able to answer.
+
+        Every candidate is bound up front, so a provider not supporting the structured output
+        raises here (like a single model would) instead of on each call.
+        """
+
+        bound = {id(model): model.with_structured_output(schema, **kwargs) for model in self.models}
+
+        async def _call(value: Any, config: Any = None) -> Any:
+            return await self._aroute(lambda model: bound[id(model)].ainvoke(value, config))
+
+        return RunnableLambda(_call, name="ModelRouter.structured_output")
+
+    def _candidates(self) -> List[Tuple[str, Any]]:
+        """Return the candidate (name, model) pairs, in the order they are tried."""
+
+        models = dict(zip(self.names, self.models))
+        return [(name, models[name]) for name in PROVIDER_HEALTH.order(self.names, self.min_health)]
+
+    def _failed(self, name: str, error: Exception, has_next: bool) -> None:
+        """Record a failed call of a candidate, re-raising the error if it cannot be failed over."""
+
+        retryable = is_retryable(error)
+        PROVIDER_HEALTH.record_failure(name, failover=retryable and has_next)
+        if not retryable:
+            raise error
+        logger.warning("Model '%s' failed, trying the next one: %r", name, error)
+
+    def _tag(self, message: BaseMessage, name: str) -> BaseMessage:
+        """Record the model that served a response in its metadata."""
+
+        if isinstance(message, AIMessage):
+            message.response_metadata["routed_model"] = name
+        return message
+
+    async def _aroute(self, call: Callable[[Any], Awaitable[Any]]) -> Any:
+        """Make a call with the first candidate that succeeds, failing over on retryable errors."""
+
+        candidates = self._candidates()
+        error: Optional[Exception] = None
+        for idx, (name, model) in enumerate(candidates):
+            if not PROVIDER_HEALTH.allow(name, self.failure_threshold, self.reset_timeout):
+                continue
+            start = time.perf_counter()
+            try:
+                result = await call(model)
+            except Exception as e:
+                error = e
+                self._failed(name, e, idx + 1 < len(candidates))
+                continue
+            PROVIDER_HEALTH.record_success(name, time.perf_counter() - start)
+            if isinstance(result, dict) and isinstance(result.get("raw"), BaseMessage):
+                self._tag(result["raw"], name)
+            return self._tag(result, name) if isinstance(result, BaseMessage) else result
+        raise AllModelsFailedError(f"Every model failed or is unavailable: {self.names}") from error
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """Answer the messages synchronously with the first candidate that succeeds."""
+
+        candidates = self._candidates()
+        error: Optional[Exception] = None
+        for idx, (name, model) in enumerate(candidates):
+            if not PROVIDER_HEALTH.allow(name, self.failure_threshold, self.reset_timeout):
+                continue
+            start = time.perf_counter()
+            try:
+                message = model.invoke(messages, stop=stop, **kwargs)
+            except Exception as e:
+                error = e
+                self._failed(name, e, idx + 1 < len(candidates))
+                continue
+            PROVIDER_HEALTH.record_success(name, time.perf_counter() - start)
+            return ChatResult(generations=[ChatGeneration(message=self._tag(message, name))])
+        raise AllModelsFailedError(f"Every model failed or is unavailable: {self.names}") from error
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """Answer the messages asynchronously with the first candidate that succeeds."""
+
+        message = await self._aroute(lambda model: model.ainvoke(messages, stop=stop, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """
+        Stream the answer of the first candidate that succeeds.
+
+        A candidate failing before its first token is failed over, while a failure
+        in the middle of the stream is raised (the tokens were already emitted).
+        """
+
+        candidates = self._candidates()
+        error: Optional[Exception] = None
+        for idx, (name, model) in enumerate(candidates):
+            if not PROVIDER_HEALTH.allow(name, self.failure_threshold, self.reset_timeout):
+                continue
+            start = time.perf_counter()
+            started = False
+            try:
+                async for chunk in model.astream(messages, stop=stop, **kwargs):
+                    chunk = to_message_chunk(chunk)
+                    if not started:
+                        chunk.response_metadata["routed_model"] = name
+                        started = True
+                    yield ChatGenerationChunk(message=chunk)
+            except Exception as e:
+                if started:
+                    PROVIDER_HEALTH.record_failure(name, failover=False)
+                    raise
+                error = e
+                self._failed(name, e, idx + 1 < len(candidates))
+                continue
+            PROVIDER_HEALTH.record_success(name, time.perf_counter() - start)
+            return
+        raise AllModelsFailedError(f"Every model failed or is unavailable: {self.names}") from error
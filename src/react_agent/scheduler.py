@@ -0,0 +1,117 @@
+"""Concurrent scheduler for executing a plan as a dependency graph (DAG).
+
+Steps returned by the planning phase may declare the ids of the steps they depend on.
+Steps whose dependencies are already satisfied are executed concurrently, bounded by a
+configurable concurrency limit.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, TypeVar
+
+from src.settings import custom_logger
+from src.structs import PlanningStep
+
+
+logger = custom_logger("Scheduler")
+
+T = TypeVar("T")
+
+
+def assign_step_ids(steps: List[PlanningStep]) -> List[PlanningStep]:
+    """
+    Make sure every step has a unique id.
+
+    Steps without an id (or with a repeated one) get a positional id, and dependencies
+    pointing to unknown ids or to the step itself are dropped.
+
+    Args:
+        steps (List[PlanningStep]): The steps proposed by the planning phase.
+
+    Returns:
+        List[PlanningStep]: Copies of the steps with unique ids and valid dependencies.
+    """
+
+    seen = set()
+    with_ids = []
+    for idx, step in enumerate(steps, start=1):
+        step_id = step.id
+        if not step_id or step_id in seen:
+            step_id = f"step-{idx}"
+            while step_id in seen:
+                step_id = f"{step_id}-{idx}"
+        seen.add(step_id)
+        with_ids.append(step.model_copy(update={"id": step_id}))
+
+    return [
+        step.model_copy(
+            update={
+                "depends_on": [
+                    dep for dep in step.depends_on if dep in seen and dep != step.id
+                ]
+            }
+        )
+        for step in with_ids
+    ]
+
+
+async def run_dag(
+    steps: List[PlanningStep],
+    run_step: Callable[[PlanningStep, Dict[str, T]], Awaitable[T]],
+    max_concurrency: int = 4,
+) -> Dict[str, T]:
+    """
+    Execute the steps of a plan concurrently, respecting their dependencies.
+
+    Each step is started as soon as all of its dependencies are finished. The results
+    of the dependencies are passed to `run_step`, so that a step can build on them.
+    If the declared dependencies contain a cycle, the remaining steps are executed
+    ignoring their dependencies, so the plan is never left half-run.
+
+    Args:
+        steps (List[PlanningStep]): The steps to execute (with unique ids).
+        run_step (Callable): Coroutine function executing a single step.
+        max_concurrency (int): Maximum number of steps executed at the same time.
+
+    Returns:
+        Dict[str, T]: The result of each step, keyed by step id.
+    """
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    pending = {step.id: step for step in steps}
+    results: Dict[str, T] = {}
+    running: Dict[asyncio.Task, str] = {}
+
+    async def _run(step: PlanningStep, dependency_results: Dict[str, T]) -> T:
+        async with semaphore:
+            return await run_step(step, dependency_results)
+
+    def _start(step: PlanningStep) -> None:
+        dependency_results = {dep: results[dep] for dep in step.depends_on if dep in results}
+        running[asyncio.ensure_future(_run(step, dependency_results))] = step.id
+        del pending[step.id]
+
+    try:
+        while pending or running:
+            ready = [
+                step
+                for step in pending.values()
+                if all(dep in results for dep in step.depends_on)
+            ]
+            if not ready and not running:
+                logger.warning(
+                    "Cyclic dependencies between steps %s, running them without dependencies",
+                    list(pending),
+                )
+                ready = list(pending.values())
+            for step in ready:
+                _start(step)
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                results[running.pop(task)] = task.result()
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    return results
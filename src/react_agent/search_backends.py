@@ -0,0 +1,303 @@
+"""Search backends used by the `search` tool.
+
+The Tavily backend keeps a long-lived async HTTP client, so every search reuses the
+pooled (keep-alive) connections instead of paying a new TCP/TLS handshake. Requests
+have a timeout and are retried with exponential backoff on transport errors, rate
+limiting (429) and server errors.
+
+Local backends stand in for Tavily when testing without network access: a fixture
+file of recorded results, or a SQLite full-text index of documents.
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from react_agent.configuration import Configuration
+from react_agent.search_cache import normalize_query
+from src.settings import custom_logger
+
+
+logger = custom_logger("Search Backends")
+
+TAVILY_API_URL = "https://api.tavily.com"
+
+# Status codes worth retrying (rate limiting and transient server errors)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class SearchBackend(ABC):
+    """A source of web search results."""
+
+    @abstractmethod
+    async def search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        """
+        Search for a query.
+
+        Args:
+            query (str): The search query.
+            max_results (int): The maximum number of results.
+
+        Returns:
+            List[Dict[str, Any]]: The results, each with (at least) a 'url' and a 'content'.
+        """
+
+    async def aclose(self) -> None:
+        """Release the resources of the backend."""
+
+
+class TavilyBackend(SearchBackend):
+    """Tavily search API over a pooled, keep-alive async HTTP client."""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        max_connections: int = 20,
+    ) -> None:
+        """
+        Initialize the backend (the HTTP client is created on first use).
+
+        Args:
+            api_key (str, optional): The Tavily API key. Defaults to the TAVILY_API_KEY env variable.
+            timeout (float, optional): Seconds before a request times out. Defaults to 10.
+            max_retries (int, optional): Retries of a failed request. Defaults to 2.
+            backoff (float, optional): Seconds of the first retry delay, doubled on each retry. Defaults to 0.5.
+            max_connections (int, optional): Size of the connection pool. Defaults to 20.
+        """
+
+        self.api_key = api_key or os.getenv("TAVILY_API_KEY")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the HTTP client, creating it for the running event loop if needed."""
+
+        loop = asyncio.get_running_loop()
+        # Pooled connections are bound to the event loop that opened them
+        if self._client is None or self._loop is not loop:
+            self._close_stale_client()
+            self._client = httpx.AsyncClient(
+                base_url=TAVILY_API_URL,
+                timeout=self.timeout,
+                limits=self.limits,
+            )
+            self._loop = loop
+        return self._client
+
+    def _close_stale_client(self) -> None:
+        """Close the client of the previous event loop, on that loop while it is still alive."""
+
+        client, loop = self._client, self._loop
+        self._client = self._loop = None
+        if client is None:
+            return
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            # A closed loop can no longer close its connections: `close_search_backends` closes
+            # the client before the end of the loop instead
+            logger.debug("Dropping the search HTTP client of a finished event loop")
+
+    async def search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        """Search for a query with the Tavily API, retrying transient failures."""
+
+        if not self.api_key:
+            raise ValueError("The Tavily backend requires the TAVILY_API_KEY env variable")
+        payload = {
+            "api_key": self.api_key,
+            "query": query,
+            "max_results": max_results,
+            "search_depth": "advanced",
+        }
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._get_client().post("/search", json=payload)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    return [
+                        {
+                            "title": result.get("title"),
+                            "url": result["url"],
+                            "content": result["content"],
+                            "score": result.get("score"),
+                        }
+                        for result in response.json().get("results", [])
+                    ]
+                error: Exception = httpx.HTTPStatusError(
+                    f"Error {response.status_code}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            delay = self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+            logger.warning(
+                "Search for '%s' failed (%r), retrying in %.2fs (%s/%s)",
+                query,
+                error,
+                delay,
+                attempt + 1,
+                self.max_retries,
+            )
+            await asyncio.sleep(delay)
+        return []
+
+    async def aclose(self) -> None:
+        """Close the HTTP client and its pooled connections."""
+
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+            self._client = self._loop = None
+        else:
+            self._close_stale_client()
+
+
+class FixtureBackend(SearchBackend):
+    """Recorded search results read from a JSON file, by (normalized) query."""
+
+    def __init__(self, path: str) -> None:
+        """
+        Load the fixtures.
+
+        Args:
+            path (str): JSON file mapping each query to its list of results.
+        """
+
+        with open(path) as file:
+            fixtures = json.load(file)
+        self.results = {normalize_query(query): results for query, results in fixtures.items()}
+
+    async def search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        """Return the recorded results of a query (none if it was not recorded)."""
+
+        results = self.results.get(normalize_query(query))
+        if results is None:
+            logger.debug("No fixture for the search '%s'", query)
+            return []
+        return results[:max_results]
+
+
+class SqliteFTSBackend(SearchBackend):
+    """Local full-text index of documents, ranked with the SQLite FTS5 BM25."""
+
+    def __init__(self, path: str) -> None:
+        """
+        Open (or create) the index.
+
+        Args:
+            path (str): Path of the SQLite database holding the index.
+        """
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(title, url UNINDEXED, content)"
+        )
+
+    def add_documents(self, documents: Iterable[Dict[str, Any]]) -> None:
+        """
+        Add documents to the index.
+
+        Args:
+            documents (Iterable[Dict[str, Any]]): Documents with a 'url', a 'content' and optionally a 'title'.
+        """
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO documents (title, url, content) VALUES (?, ?, ?)",
+                ((doc.get("title", ""), doc["url"], doc["content"]) for doc in documents),
+            )
+
+    def _query(self, query: str, max_results: int) -> List[Tuple[Any, ...]]:
+        """Run the full-text query, matching any of the query terms."""
+
+        terms = normalize_query(query).split()
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            return self._conn.execute(
+                "SELECT title, url, content, bm25(documents) FROM documents "
+                "WHERE documents MATCH ? ORDER BY bm25(documents) LIMIT ?",
+                (match, max_results),
+            ).fetchall()
+
+    async def search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        """Return the best matching documents of the index."""
+
+        return [
+            # FTS5 BM25 scores are negative, the lower the better
+            {"title": title, "url": url, "content": content, "score": -score}
+            for title, url, content, score in self._query(query, max_results)
+        ]
+
+
+_SEARCH_BACKENDS: Dict[Tuple[Any, ...], SearchBackend] = {}
+_SEARCH_BACKENDS_LOCK = threading.Lock()
+
+
+def get_search_backend(configuration: Configuration) -> SearchBackend:
+    """
+    Return the process-wide search backend matching the configuration.
+
+    Args:
+        configuration (Configuration): The agent configuration.
+
+    Returns:
+        SearchBackend: The search backend (created on first use).
+
+    Raises:
+        ValueError: If a local backend is selected without a search_backend_path.
+    """
+
+    key = (
+        configuration.search_backend,
+        configuration.search_backend_path,
+        configuration.search_timeout,
+        configuration.search_max_retries,
+    )
+    with _SEARCH_BACKENDS_LOCK:
+        if key not in _SEARCH_BACKENDS:
+            if configuration.search_backend == "tavily":
+                backend: SearchBackend = TavilyBackend(
+                    timeout=configuration.search_timeout,
+                    max_retries=configuration.search_max_retries,
+                )
+            elif not configuration.search_backend_path:
+                raise ValueError(
+                    f"The '{configuration.search_backend}' search backend requires a search_backend_path"
+                )
+            elif configuration.search_backend == "fixture":
+                backend = FixtureBackend(configuration.search_backend_path)
+            else:
+                backend = SqliteFTSBackend(configuration.search_backend_path)
+            _SEARCH_BACKENDS[key] = backend
+        return _SEARCH_BACKENDS[key]
+
+
+async def close_search_backends() -> None:
+    """Close the resources of every search backend (call it before the event loop ends)."""
+
+    with _SEARCH_BACKENDS_LOCK:
+        backends = list(_SEARCH_BACKENDS.values())
+    for backend in backends:
+        await backend.aclose()
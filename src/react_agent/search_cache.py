@@ -0,0 +1,184 @@
+"""Caching layer for the web search tool.
+
+Queries are normalized before being used as cache keys, so that retries of the same
+step (or re-plans) issuing the same or nearly the same query are served from the cache.
+Results are kept in an in-memory LRU, optionally backed by a persistent SQLite store,
+which can also be replayed fully offline (e.g. for deterministic benchmarks).
+"""
+
+import asyncio
+import re
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from react_agent.cache import CacheStats, MemoryStore, SqliteStore, TieredStore, TTLCache
+from react_agent.configuration import Configuration
+from react_agent.utils import RunRecords
+from src.settings import custom_logger
+
+
+logger = custom_logger("Search Cache")
+
+_PUNCTUATION = re.compile(r"[^\w\s+#.-]", flags=re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query for using it as a cache key.
+
+    Unicode forms, case, punctuation and whitespace differences are ignored, so
+    'What is  LangGraph?' and 'what is langgraph' share the same key.
+
+    Args:
+        query (str): The raw search query.
+
+    Returns:
+        str: The normalized query.
+    """
+
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = _PUNCTUATION.sub(" ", query)
+    return _WHITESPACE.sub(" ", query).strip(" .-")
+
+
+class SearchCache:
+    """
+    Cache of search results, with per-run statistics.
+
+    Concurrent lookups of the same key share a single request, and stale entries
+    (when a stale-while-revalidate window is configured) are served immediately while
+    being refreshed in the background.
+    """
+
+    def __init__(self, cache: TTLCache) -> None:
+        """
+        Initialize the search cache.
+
+        Args:
+            cache (TTLCache): The TTL cache holding the search results.
+        """
+
+        self.cache = cache
+        self.stats: Dict[str, CacheStats] = RunRecords(CacheStats)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def make_key(query: str, max_results: int) -> str:
+        """Build the cache key of a query."""
+
+        return f"{max_results}:{normalize_query(query)}"
+
+    async def get_or_fetch(
+        self,
+        query: str,
+        max_results: int,
+        fetch: Callable[[], Awaitable[Any]],
+        run_id: str = "default",
+        offline: bool = False,
+    ) -> Any:
+        """
+        Return the cached results of a query, fetching them on a miss.
+
+        Args:
+            query (str): The search query.
+            max_results (int): The maximum number of results requested.
+            fetch (Callable): Coroutine function performing the actual search.
+            run_id (str): Identifier of the run, used for the statistics.
+            offline (bool): If True, never fetch: misses return an empty list and entries never expire.
+
+        Returns:
+            Any: The search results.
+        """
+
+        key = self.make_key(query, max_results)
+        stats = self.stats[run_id]
+        value, status = self.cache.lookup(key, ignore_ttl=offline)
+
+        if status == "fresh":
+            stats.hits += 1
+            return value
+        if status == "stale":
+            stats.stale_hits += 1
+            if not offline and key not in self._inflight:
+                task = asyncio.ensure_future(self._fetch(key, fetch))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return value
+
+        stats.misses += 1
+        if offline:
+            logger.warning("Offline search cache miss for query: '%s'", query)
+            return []
+        return await self._fetch(key, fetch)
+
+    async def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Fetch the results of a key, sharing the request between concurrent callers."""
+
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+            if value:
+                self.cache.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Avoid "exception never retrieved" warnings when nobody else awaited it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def run_stats(self, run_id: Optional[str] = None) -> Dict[str, float]:
+        """Return the statistics of a run, or the aggregated ones if no run is given."""
+
+        if run_id is not None:
+            return self.stats[run_id].to_dict()
+        total = CacheStats()
+        for stats in self.stats.values():
+            total.hits += stats.hits
+            total.stale_hits += stats.stale_hits
+            total.misses += stats.misses
+        return total.to_dict()
+
+
+_SEARCH_CACHES: Dict[Tuple[Any, ...], SearchCache] = {}
+
+
+def get_search_cache(configuration: Configuration) -> SearchCache:
+    """
+    Return the process-wide search cache matching the configuration.
+
+    Args:
+        configuration (Configuration): The agent configuration.
+
+    Returns:
+        SearchCache: The search cache (created on first use).
+    """
+
+    key = (
+        configuration.search_cache_path,
+        configuration.search_cache_size,
+        configuration.search_cache_ttl,
+        configuration.search_cache_stale_ttl,
+    )
+    if key not in _SEARCH_CACHES:
+        store = MemoryStore(max_size=configuration.search_cache_size)
+        if configuration.search_cache_path:
+            store = TieredStore(
+                [store, SqliteStore(configuration.search_cache_path, table="search")]
+            )
+        _SEARCH_CACHES[key] = SearchCache(
+            TTLCache(
+                store,
+                ttl=configuration.search_cache_ttl,
+                stale_ttl=configuration.search_cache_stale_ttl,
+            )
+        )
+    return _SEARCH_CACHES[key]
@@ -0,0 +1,175 @@
+"""Post-processing of the search results before they enter the prompts.
+
+Results are deduplicated (by normalized URL, and by the word shingles of their
+snippets for near-duplicates such as mirrors and syndicated pages), ranked with BM25
+against the step being executed, and only the best ones are kept within a character
+budget. This keeps the do prompts small even when many results are requested.
+"""
+
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from react_agent.ranking import rank_texts, tokenize
+
+
+# Query parameters that do not change the page (tracking), by prefix and by exact name
+TRACKING_PREFIXES = ("utm_", "mc_")
+TRACKING_PARAMS = frozenset({"fbclid", "gclid", "ref"})
+
+# Minimum characters left in the budget for including a (truncated) result
+MIN_SNIPPET_CHARS = 200
+
+
+def _is_tracking_param(name: str) -> bool:
+    """Return whether a (lowercased) query parameter only tracks the visit."""
+
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a URL for detecting duplicates.
+
+    The scheme, the 'www.' prefix, the fragment, trailing slashes and tracking
+    parameters are ignored, and the host is lowercased.
+
+    Args:
+        url (str): The URL.
+
+    Returns:
+        str: The normalized URL.
+    """
+
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    query = urlencode(
+        [
+            (name, value)
+            for name, value in parse_qsl(parts.query)
+            if not _is_tracking_param(name.lower())
+        ]
+    )
+    return urlunsplit(("", host, parts.path.rstrip("/"), query, ""))
+
+
+def shingles(text: str, size: int = 5) -> Set[int]:
+    """
+    Return the hashed word shingles (k-grams of tokens) of a text.
+
+    Args:
+        text (str): The text.
+        size (int, optional): The number of words of each shingle. Defaults to 5.
+
+    Returns:
+        Set[int]: The hashes of the shingles.
+    """
+
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return {zlib.crc32(" ".join(tokens).encode())} if tokens else set()
+    return {
+        zlib.crc32(" ".join(tokens[i : i + size]).encode())
+        for i in range(len(tokens) - size + 1)
+    }
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    """Return the Jaccard similarity of two sets."""
+
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ResultDeduplicator:
+    """Detects results already seen, by URL or by near-duplicate snippet."""
+
+    def __init__(self, threshold: float = 0.8) -> None:
+        """
+        Initialize the deduplicator.
+
+        Args:
+            threshold (float, optional): Minimum Jaccard similarity of the shingles of two
+                snippets for considering them near-duplicates. Defaults to 0.8.
+        """
+
+        self.threshold = threshold
+        self.urls: Set[str] = set()
+        self.snippets: List[Set[int]] = []
+
+    def is_duplicate(self, result: Dict[str, Any]) -> bool:
+        """Return whether a result was already seen, recording it otherwise."""
+
+        url = normalize_url(result.get("url") or "")
+        if url and url in self.urls:
+            return True
+        snippet = shingles(result.get("content") or "")
+        if any(jaccard(snippet, seen) >= self.threshold for seen in self.snippets):
+            return True
+        if url:
+            self.urls.add(url)
+        self.snippets.append(snippet)
+        return False
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Truncate a text at a word boundary."""
+
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "…"
+
+
+def process_search_results(
+    results: Sequence[Dict[str, Any]],
+    rank_text: str,
+    top_k: int = 5,
+    max_chars: Optional[int] = 4000,
+    deduplicator: Optional[ResultDeduplicator] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Deduplicate, rank and trim the results of a search.
+
+    Args:
+        results (Sequence[Dict[str, Any]]): The search results, each with a 'url' and a 'content'.
+        rank_text (str): The text the results are ranked against (e.g. the step and its expected outcome).
+        top_k (int, optional): The maximum number of results kept. Defaults to 5.
+        max_chars (int, optional): The character budget of the kept snippets (None for no budget). Defaults to 4000.
+        deduplicator (ResultDeduplicator, optional): Deduplicator shared with other searches (e.g. of
+            the same step). Defaults to a new one.
+
+    Returns:
+        List[Dict[str, Any]]: The kept results (url, title and content), the most relevant first.
+    """
+
+    deduplicator = deduplicator or ResultDeduplicator()
+    unique = [result for result in results if not deduplicator.is_duplicate(result)]
+    scores = rank_texts(
+        [f"{result.get('title') or ''} {result.get('content') or ''}" for result in unique],
+        rank_text,
+    )
+    ranked = [
+        result
+        for _, _, result in sorted(
+            zip(scores, range(len(unique)), unique), key=lambda item: (-item[0], item[1])
+        )
+    ]
+
+    kept = []
+    remaining = max_chars
+    for result in ranked[:top_k]:
+        content = result.get("content") or ""
+        if remaining is not None:
+            if remaining < min(MIN_SNIPPET_CHARS, len(content)):
+                break
+            content = _truncate(content, remaining)
+            remaining -= len(content)
+        kept.append(
+            {
+                "url": result.get("url"),
+                **({"title": result["title"]} if result.get("title") else {}),
+                "content": content,
+            }
+        )
+    return kept
@@ -2,8 +2,10 @@
 
 from __future__ import annotations
 
+import hashlib
+import operator
 from dataclasses import dataclass, field
-from typing import List, Sequence
+from typing import Dict, Iterable, List, Optional, Sequence
 
 from langchain_core.messages import AnyMessage
 from langgraph.graph import add_messages
@@ -17,7 +19,64 @@ from src.structs import (
 )
 
 
-@dataclass
+def append_unique(left: Optional[Sequence[str]], right: Optional[Sequence[str]]) -> List[str]:
+    """
+    Reducer appending the ids not already present (nodes only return the new ones).
+
+    Args:
+        left (Sequence[str], optional): The current ids.
+        right (Sequence[str], optional): The ids returned by a node.
+
+    Returns:
+        List[str]: The current ids followed by the new ones, without duplicates.
+    """
+
+    merged = list(left or [])
+    seen = set(merged)
+    for item in right or []:
+        if item not in seen:
+            seen.add(item)
+            merged.append(item)
+    return merged
+
+
+def step_key(step: PlanningStep) -> str:
+    """
+    Return the interned key of a step, the same for identical steps of different plans.
+
+    Plan-level ids ('step-1', ...) are reused by every new plan, so the key is derived
+    from the description of the step instead.
+    """
+
+    text = f"{step.step}\n{step.details}\n{step.expected_outcome}"
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+def record_processed_steps(
+    state: "State", steps: Iterable[PlanningStep]
+) -> Dict[str, object]:
+    """
+    Return the state update recording steps as processed, only with the ones not seen before.
+
+    Args:
+        state (State): The current state of the agent.
+        steps (Iterable[PlanningStep]): The processed steps.
+
+    Returns:
+        Dict[str, object]: The new step keys and records (empty if every step was already recorded).
+    """
+
+    new_records: Dict[str, str] = {}
+    for step in steps:
+        key = step_key(step)
+        if key not in state.step_records and key not in new_records:
+            new_records[key] = step.step
+    if not new_records:
+        return {}
+    return {"processed_step_ids": list(new_records), "step_records": new_records}
+
+
+@dataclass(slots=True)
 class InputState:
     """
     Defines the input state for the agent, representing a narrower interface to the outside world.
@@ -29,7 +88,7 @@ class InputState:
     )
 
 
-@dataclass
+@dataclass(slots=True)
 class State(InputState):
     """
     Represents the complete state of the agent, extending InputState with additional attributes.
@@ -39,22 +98,33 @@ class State(InputState):
     # Steps
     is_last_step: IsLastStep = field(default=False)
     current_action: DemingAction = field(default=None)
-    steps_taken: List[PlanningStep] = field(default=list)
 
     # Input
+    task_id: Optional[str] = field(default=None)
+    task_message_id: Optional[str] = field(default=None)
     task_description: str = field(default=None)
+    deadline_at: Optional[float] = field(default=None)
+    llm_usage_baseline: Optional[Dict[str, int]] = field(default=None)
 
     # Output
     final_answer: str = field(default=None)
+    time_to_first_token: Annotated[Dict[str, float], operator.or_] = field(
+        default_factory=dict
+    )
 
     # Plan
-    next_steps: List[PlanningStep] = field(default=list)
-    already_processed_steps: List[PlanningStep] = field(default=list)
+    next_steps: List[PlanningStep] = field(default_factory=list)
+    plan_calls_avoided: int = 0
+
+    # Step history: append-only keys of the processed steps, and their descriptions interned by key
+    processed_step_ids: Annotated[List[str], append_unique] = field(default_factory=list)
+    step_records: Annotated[Dict[str, str], operator.or_] = field(default_factory=dict)
 
     # Do
     step_results: str = field(default=None)
     step_obstacles: str = field(default=None)
-    step_search_triggered: bool = field(default=False)
+    step_tool_rounds: int = 0
+    step_tool_results: Dict[str, str] = field(default_factory=dict)
     n_retries: int = 0
 
     # Check
@@ -65,3 +135,4 @@ class State(InputState):
     current_status: str = field(default=None)
     context: str = field(default=None)
     results: str = field(default=None)
+    replan: bool = field(default=False)
@@ -1,26 +1,40 @@
 """This module provides example tools for web scraping and search functionality.
 
-It includes a basic Tavily search function (as an example)
+It includes a web search function (as an example), backed by Tavily or by a local stand-in
+(see `search_backends`)
 
 These tools are intended as free examples to get started. For production use,
 consider implementing more robust and specialized tools tailored to your needs.
 """
 
-from typing import Any, Callable, List, Optional, cast
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, cast
 
-from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.messages import ToolCall, ToolMessage
 from langchain_core.runnables import RunnableConfig
-from langchain_core.tools import InjectedToolArg
+from langchain_core.tools import BaseTool, InjectedToolArg, StructuredTool
 from typing_extensions import Annotated
 
 from react_agent.configuration import Configuration
+from react_agent.metrics import TOOL_METRICS
+from react_agent.ratelimit import throttle
+from react_agent.search_backends import get_search_backend
+from react_agent.search_cache import get_search_cache, normalize_query
+from react_agent.search_processing import ResultDeduplicator, process_search_results
+from react_agent.utils import get_run_id
+from src.settings import tracer
 
 
 async def search(
     query: str, *, config: Annotated[RunnableConfig, InjectedToolArg]
 ) -> Optional[list[dict[str, Any]]]:
     """
-    Perform an asynchronous web search using the Tavily search tool.
+    Perform an asynchronous web search using the configured search backend (Tavily by default).
+
+    Results are served from the search cache when possible (see `search_cache`
+    in the configuration), including fully offline replays of a recorded cache.
 
     Args:
         query (str): The search query string.
@@ -32,9 +46,202 @@ async def search(
     """
 
     configuration = Configuration.from_runnable_config(config)
-    wrapped = TavilySearchResults(max_results=configuration.max_search_results)
-    result = await wrapped.ainvoke({"query": query})
+
+    async def _search() -> Optional[list[dict[str, Any]]]:
+        await throttle("search", configuration)
+        return await get_search_backend(configuration).search(
+            query, configuration.max_search_results
+        )
+
+    if configuration.search_cache == "off":
+        result = await _search()
+    else:
+        result = await get_search_cache(configuration).get_or_fetch(
+            query,
+            configuration.max_search_results,
+            _search,
+            run_id=get_run_id(config),
+            offline=configuration.search_cache == "offline",
+        )
     return cast(list[dict[str, Any]], result)
 
 
 TOOLS: List[Callable[..., Any]] = [search]
+
+
+TOOLS_BY_NAME: dict[str, BaseTool] = {
+    tool.name: tool
+    for tool in (StructuredTool.from_function(coroutine=fn) for fn in TOOLS)
+}
+
+
+async def run_tool_call(tool_call: ToolCall, config: RunnableConfig) -> ToolMessage:
+    """
+    Execute a single tool call outside of the graph's tools node.
+
+    Args:
+        tool_call (ToolCall): The tool call emitted by the model.
+        config (RunnableConfig): Configuration forwarded to the tool.
+
+    Returns:
+        ToolMessage: The tool output (or error) associated to the tool call id.
+    """
+
+    tool = TOOLS_BY_NAME.get(tool_call["name"])
+    if tool is None:
+        return ToolMessage(
+            content=f"Error: tool '{tool_call['name']}' does not exist.",
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+            status="error",
+        )
+    try:
+        return await tool.ainvoke({**tool_call, "type": "tool_call"}, config)
+    except Exception as e:
+        return ToolMessage(
+            content=f"Error: {e!r}",
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+            status="error",
+        )
+
+
+def tool_call_key(tool_call: ToolCall) -> str:
+    """
+    Return the key identifying a tool call by its tool and (normalized) arguments.
+
+    Args:
+        tool_call (ToolCall): The tool call emitted by the model.
+
+    Returns:
+        str: The key, shared by calls of the same tool with equivalent arguments.
+    """
+
+    args = {
+        name: normalize_query(value) if isinstance(value, str) else value
+        for name, value in tool_call["args"].items()
+    }
+    return f"{tool_call['name']}:{json.dumps(args, sort_keys=True, default=str)}"
+
+
+def process_search_output(
+    message: ToolMessage,
+    tool_call: ToolCall,
+    rank_text: str,
+    configuration: Configuration,
+    deduplicator: ResultDeduplicator,
+) -> ToolMessage:
+    """
+    Deduplicate, rank and trim the results of a search (see `search_processing`).
+
+    Args:
+        message (ToolMessage): The output of the search.
+        tool_call (ToolCall): The search call.
+        rank_text (str): The text the results are ranked against, along with the query.
+        configuration (Configuration): The agent configuration.
+        deduplicator (ResultDeduplicator): Deduplicator shared by the searches of the round.
+
+    Returns:
+        ToolMessage: The message with the processed results.
+    """
+
+    try:
+        results = json.loads(message.content)
+    except (TypeError, ValueError):
+        return message
+    if not isinstance(results, list):
+        return message
+    processed = process_search_results(
+        results,
+        f"{rank_text} {tool_call['args'].get('query', '')}",
+        top_k=configuration.search_results_top_k,
+        max_chars=configuration.search_results_max_chars,
+        deduplicator=deduplicator,
+    )
+    return message.model_copy(update={"content": json.dumps(processed, ensure_ascii=False)})
+
+
+async def run_tool_calls(
+    tool_calls: Sequence[ToolCall],
+    config: RunnableConfig,
+    max_concurrency: int = 4,
+    known_results: Optional[Dict[str, str]] = None,
+    rank_text: Optional[str] = None,
+) -> Tuple[List[ToolMessage], Dict[str, str]]:
+    """
+    Execute the tool calls of a response concurrently, deduplicating identical calls.
+
+    Calls equivalent to another call of the response, or to a call already executed
+    in the step (`known_results`), are answered with its output instead of being
+    executed again. The latency of every executed call is recorded per tool. Search
+    results are post-processed (when `search_result_processing` is enabled) against
+    `rank_text`, deduplicating them across the searches of the round.
+
+    Args:
+        tool_calls (Sequence[ToolCall]): The tool calls emitted by the model.
+        config (RunnableConfig): Configuration forwarded to the tools.
+        max_concurrency (int, optional): Maximum number of calls running at the same time. Defaults to 4.
+        known_results (Dict[str, str], optional): Outputs of the calls already executed in the step,
+            by `tool_call_key`. Defaults to None.
+        rank_text (str, optional): Text the search results are ranked against (e.g. the step and
+            its expected outcome). Defaults to None (only the query).
+
+    Returns:
+        Tuple[List[ToolMessage], Dict[str, str]]: A message for each tool call (in order), and the
+            outputs of the newly executed calls (excluding errors), by `tool_call_key`.
+    """
+
+    known_results = known_results or {}
+    run_id = get_run_id(config)
+    semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+    async def _run(tool_call: ToolCall) -> ToolMessage:
+        async with semaphore:
+            with tracer.span(f"tool:{tool_call['name']}", kind="tool", **tool_call["args"]) as span:
+                start = time.perf_counter()
+                message = await run_tool_call(tool_call, config)
+                latency = time.perf_counter() - start
+                span.set(status=message.status)
+        TOOL_METRICS.record(run_id, tool_call["name"], latency, error=message.status == "error")
+        return message
+
+    unique_calls: Dict[str, ToolCall] = {}
+    for tool_call in tool_calls:
+        key = tool_call_key(tool_call)
+        if key not in known_results and key not in unique_calls:
+            unique_calls[key] = tool_call
+    executed = dict(
+        zip(unique_calls, await asyncio.gather(*(_run(call) for call in unique_calls.values())))
+    )
+
+    configuration = Configuration.from_runnable_config(config)
+    if configuration.search_result_processing:
+        deduplicator = ResultDeduplicator(configuration.search_results_dedupe_threshold)
+        for key, tool_call in unique_calls.items():
+            message = executed[key]
+            if tool_call["name"] != "search" or message.status == "error":
+                continue
+            executed[key] = process_search_output(
+                message, tool_call, rank_text or "", configuration, deduplicator
+            )
+            TOOL_METRICS.record_processing(
+                run_id, "search", len(str(message.content)), len(str(executed[key].content))
+            )
+
+    messages = []
+    for tool_call in tool_calls:
+        key = tool_call_key(tool_call)
+        if key in unique_calls and unique_calls[key] is tool_call:
+            messages.append(executed[key])
+            continue
+        TOOL_METRICS.record_deduplicated(run_id, tool_call["name"])
+        content = known_results[key] if key in known_results else executed[key].content
+        messages.append(
+            ToolMessage(content=content, name=tool_call["name"], tool_call_id=tool_call["id"])
+        )
+    new_results = {
+        key: str(message.content)
+        for key, message in executed.items()
+        if message.status != "error"
+    }
+    return messages, new_results
@@ -1,8 +1,24 @@
 """Utility & helper functions."""
 
-from langchain.chat_models import init_chat_model
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple, TypeVar
+
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    BaseMessageChunk,
+    message_chunk_to_message,
+)
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.runnables import RunnableConfig
 
 
 def get_message_text(msg: BaseMessage) -> str:
@@ -30,21 +46,455 @@ def get_message_text(msg: BaseMessage) -> str:
         return "".join(txts).strip()
 
 
-def load_chat_model(fully_specified_name: str) -> BaseChatModel:
+def _get_stream_writer() -> Optional[Callable[[Any], None]]:
+    """Return LangGraph's custom stream writer, or None outside of a graph run."""
+
+    try:
+        from langgraph.config import get_stream_writer
+
+        return get_stream_writer()
+    except (ImportError, RuntimeError):
+        return None
+
+
+def to_message_chunk(message: BaseMessage) -> BaseMessageChunk:
+    """
+    Return a message as a chunk.
+
+    Models without native streaming yield their whole response as a single message
+    (not a chunk) when streamed, which can't be concatenated with other chunks.
+
+    Args:
+        message: A streamed message or chunk.
+
+    Returns:
+        The message as a chunk (the chunk itself if it already is one).
+    """
+
+    if isinstance(message, BaseMessageChunk):
+        return message
+    return AIMessageChunk(
+        content=message.content,
+        id=message.id,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=getattr(message, "usage_metadata", None),
+        tool_call_chunks=[
+            tool_call_chunk(name=call["name"], args=json.dumps(call["args"]), id=call["id"], index=idx)
+            for idx, call in enumerate(getattr(message, "tool_calls", None) or [])
+        ],
+    )
+
+
+async def stream_chat_model(
+    model: BaseChatModel,
+    messages: Any,
+    config: Optional[RunnableConfig] = None,
+    stream_name: Optional[str] = None,
+) -> AIMessage:
+    """
+    Call a chat model streaming its output, measuring the time to first token.
+
+    Tokens are emitted through LangGraph's `messages` stream mode (as the model is
+    called with the run config), and also through the `custom` stream mode as
+    `{"stream": stream_name, "delta": ...}` events. The time to first token (in seconds)
+    is stored in the `time_to_first_token` entry of the response metadata.
+
+    Args:
+        model: The chat model to call.
+        messages: The input of the model (prompt value or messages).
+        config: The configuration of the run.
+        stream_name: Name identifying the stream in the custom events.
+
+    Returns:
+        The complete response of the model.
+    """
+
+    writer = _get_stream_writer()
+    start = time.perf_counter()
+    time_to_first_token = None
+    response = None
+    async for chunk in model.astream(messages, config):
+        chunk = to_message_chunk(chunk)
+        text = get_message_text(chunk)
+        if time_to_first_token is None and (text or chunk.tool_call_chunks):
+            time_to_first_token = time.perf_counter() - start
+        if writer is not None and text:
+            writer({"stream": stream_name, "delta": text})
+        response = chunk if response is None else response + chunk
+
+    response = message_chunk_to_message(response) if response is not None else AIMessage(content="")
+    response.response_metadata["time_to_first_token"] = (
+        time_to_first_token
+        if time_to_first_token is not None
+        else time.perf_counter() - start
+    )
+    return response
+
+
+V = TypeVar("V")
+
+# Maximum number of runs kept by the per-run registries (statistics, token reports, memories)
+MAX_TRACKED_RUNS = 1024
+
+# Task of the graph node being run (see `bind_task`), identifying the runs without a thread id
+_current_task_id: ContextVar[Optional[str]] = ContextVar("current_task_id", default=None)
+
+
+def get_run_id(config: Optional[RunnableConfig], state: Any = None) -> str:
+    """
+    Return an identifier of the current run, used for keeping per-run statistics.
+
+    Runs without a thread id are identified by their task, so concurrent (or successive)
+    tasks don't share their statistics and budgets.
+
+    Args:
+        config: The configuration of the run.
+        state: The state of the agent, if available (e.g. in the routers, which are run
+            outside of the nodes wrapped by `bind_task`).
+
+    Returns:
+        The thread id of the run if set, otherwise 'task:<task id>' within a task, and
+        "default" outside of one.
+    """
+
+    configurable = (config or {}).get("configurable") or {}
+    if configurable.get("thread_id"):
+        return str(configurable["thread_id"])
+    task_id = getattr(state, "task_id", None) or _current_task_id.get()
+    return f"task:{task_id}" if task_id else "default"
+
+
+def bind_task_id(task_id: Optional[str]) -> None:
+    """Set the task of the node being run (e.g. once the plan node started a new task)."""
+
+    _current_task_id.set(task_id)
+
+
+def bind_task(node: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap a graph node so the calls it makes are attributed to the task of its state.
+
+    Args:
+        node (Callable): The node function, taking the state and the config.
+
+    Returns:
+        Callable: The wrapped (async) node.
+    """
+
+    @functools.wraps(node)
+    async def wrapper(state: Any, config: RunnableConfig) -> Any:
+        token = _current_task_id.set(getattr(state, "task_id", None))
+        try:
+            result = node(state, config)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        finally:
+            _current_task_id.reset(token)
+
+    return wrapper
+
+
+class RunRecords(OrderedDict):
+    """
+    Records of the most recent runs, keyed by run id and created on first access.
+
+    The least recently used runs are evicted beyond `max_runs`, so the per-run registries
+    stay bounded in long-lived processes (servers, batch runs). Not thread-safe: the
+    registries guard it with their own lock.
+    """
+
+    def __init__(self, factory: Callable[[], V], max_runs: int = MAX_TRACKED_RUNS) -> None:
+        """
+        Initialize the records.
+
+        Args:
+            factory (Callable): Builds the record of a new run.
+            max_runs (int): Maximum number of runs kept before evicting the least recently used.
+        """
+
+        super().__init__()
+        self.factory = factory
+        self.max_runs = max_runs
+
+    def __getitem__(self, run_id: str) -> V:
+        """Return the record of a run, creating it (and evicting the oldest runs) if needed."""
+
+        if run_id in self:
+            self.move_to_end(run_id)
+            return super().__getitem__(run_id)
+        record = self.factory()
+        self[run_id] = record
+        while len(self) > self.max_runs:
+            self.popitem(last=False)
+        return record
+
+
+def _freeze(value: Any) -> Hashable:
+    """Convert model kwargs into a hashable, order-independent representation."""
+
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def _tool_name(tool: Any) -> str:
+    """Return a stable name for a tool (function, BaseTool or schema)."""
+
+    return getattr(tool, "name", None) or getattr(tool, "__name__", None) or repr(tool)
+
+
+# Key of a cached model: its name, the names of its bound tools and its (frozen) kwargs
+_ModelKey = Tuple[str, Optional[Tuple[str, ...]], Hashable]
+
+# Custom providers (e.g. local fakes), resolved before the ones known by `init_chat_model`
+MODEL_PROVIDERS: Dict[str, Callable[..., BaseChatModel]] = {}
+
+
+def register_model_provider(name: str, factory: Callable[..., BaseChatModel]) -> None:
+    """
+    Register a custom chat model provider.
+
+    Models named 'name/model' are then built with `factory(model, **model_kwargs)`.
+
+    Args:
+        name: The provider name.
+        factory: Callable building a chat model from its name and keyword arguments.
+    """
+
+    MODEL_PROVIDERS[name] = factory
+
+
+class ModelRegistry:
+    """
+    Process-wide LRU registry of warm chat model clients.
+
+    Chat models are keyed by (provider/model, bound tools, model kwargs). Reusing
+    the same instance keeps its underlying HTTP client (and thus its connection
+    pool) alive across PDCA phases, and avoids re-serializing the tool schemas
+    with `bind_tools` on every call.
+
+    Lookups are guarded by a lock and never await, so the registry is safe to share
+    between threads and between tasks running on the same event loop.
+    """
+
+    def __init__(self, max_size: int = 16) -> None:
+        """
+        Initialize the registry.
+
+        Args:
+            max_size (int): Maximum number of models kept before evicting the least recently used.
+        """
+
+        if max_size < 1:
+            raise ValueError("max_size must be a positive integer")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._models: "OrderedDict[_ModelKey, BaseChatModel]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(
+        self,
+        fully_specified_name: str,
+        tools: Optional[Sequence[Any]] = None,
+        factory: Optional[Callable[[], BaseChatModel]] = None,
+        **model_kwargs: Any,
+    ) -> BaseChatModel:
+        """
+        Return a cached chat model, creating it on a miss.
+
+        Args:
+            fully_specified_name (str): Model name in the format 'provider/model'.
+            tools (Sequence[Any], optional): Tools to bind to the model. Defaults to None.
+            factory (Callable, optional): Builder used on a miss instead of `init_chat_model`.
+            **model_kwargs: Extra keyword arguments forwarded to the model constructor.
+
+        Returns:
+            BaseChatModel: The (possibly tool-bound) chat model.
+        """
+
+        key: _ModelKey = (
+            fully_specified_name,
+            tuple(_tool_name(t) for t in tools) if tools else None,
+            _freeze(model_kwargs),
+        )
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self.hits += 1
+                self._models.move_to_end(key)
+                return model
+
+            self.misses += 1
+            if tools:
+                # Share the unbound client so both variants reuse the same connection pool
+                base = self._unbound(fully_specified_name, factory, model_kwargs)
+                model = base.bind_tools(list(tools))
+            else:
+                model = self._build(fully_specified_name, factory, model_kwargs)
+            self._store(key, model)
+            return model
+
+    def _unbound(
+        self,
+        fully_specified_name: str,
+        factory: Optional[Callable[[], BaseChatModel]],
+        model_kwargs: Dict[str, Any],
+    ) -> BaseChatModel:
+        """Return the unbound variant of a model, creating it if needed (not counted as a lookup)."""
+
+        key: _ModelKey = (fully_specified_name, None, _freeze(model_kwargs))
+        model = self._models.get(key)
+        if model is not None:
+            self._models.move_to_end(key)
+            return model
+        model = self._build(fully_specified_name, factory, model_kwargs)
+        self._store(key, model)
+        return model
+
+    @staticmethod
+    def _build(
+        fully_specified_name: str,
+        factory: Optional[Callable[[], BaseChatModel]],
+        model_kwargs: Dict[str, Any],
+    ) -> BaseChatModel:
+        """Create an (unbound) model."""
+
+        if factory is not None:
+            return factory()
+        provider, model_name = fully_specified_name.split("/", maxsplit=1)
+        if provider in MODEL_PROVIDERS:
+            return MODEL_PROVIDERS[provider](model_name, **model_kwargs)
+        # Imported on first use, as it loads the integrations of the providers
+        from langchain.chat_models import init_chat_model
+
+        return init_chat_model(model_name, model_provider=provider, **model_kwargs)
+
+    def _store(self, key: _ModelKey, model: BaseChatModel) -> None:
+        """Cache a model, evicting the least recently used ones beyond the maximum size."""
+
+        self._models[key] = model
+        while len(self._models) > self.max_size:
+            self._models.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, max_size: int) -> None:
+        """Change the maximum size of the registry, evicting entries if needed."""
+
+        if max_size < 1:
+            raise ValueError("max_size must be a positive integer")
+        with self._lock:
+            self.max_size = max_size
+            while len(self._models) > self.max_size:
+                self._models.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every cached model and reset the counters."""
+
+        with self._lock:
+            self._models.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit/miss/eviction counters and the current size."""
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._models),
+            }
+
+
+MODEL_REGISTRY = ModelRegistry()
+
+
+def load_chat_model(
+    fully_specified_name: str,
+    tools: Optional[Sequence[Any]] = None,
+    fallbacks: Optional[Sequence[str]] = None,
+    circuit_breaker: Optional[Dict[str, float]] = None,
+    **model_kwargs: Any,
+) -> BaseChatModel:
     """
     Loads a chat model based on the specified fully qualified name.
 
     The function expects a string that specifies the provider and model name
-    in the format 'provider/model'. It splits this string to extract the provider
-    and model name, then initializes the chat model using these details.
+    in the format 'provider/model'. Models are served from the process-wide
+    `MODEL_REGISTRY`, so repeated calls reuse the same warm client instead of
+    initializing a new one for every PDCA phase.
+
+    With fallbacks, a `ModelRouter` is returned instead, failing over from the model
+    to its fallbacks (in order) when its provider errors out or rate-limits the call.
 
     Args:
         fully_specified_name: A string in the format 'provider/model', indicating
                               the provider and model to be loaded.
+        tools: Optional tools to bind to the model.
+        fallbacks: Optional models (in the format 'provider/model') to fail over to.
+        circuit_breaker: Optional settings of the router ('failure_threshold',
+                         'reset_timeout' and 'min_health').
+        **model_kwargs: Extra keyword arguments forwarded to the model constructor.
 
     Returns:
         An instance of BaseChatModel initialized with the specified model and provider.
     """
 
-    provider, model = fully_specified_name.split("/", maxsplit=1)
-    return init_chat_model(model, model_provider=provider)
+    if not fallbacks:
+        return MODEL_REGISTRY.get(fully_specified_name, tools=tools, **model_kwargs)
+
+    from react_agent.routing import ModelRouter
+
+    names = list(dict.fromkeys([fully_specified_name, *fallbacks]))
+    # Routers with different settings are cached apart
+    settings = ",".join(f"{key}={value}" for key, value in sorted((circuit_breaker or {}).items()))
+    return MODEL_REGISTRY.get(
+        f"router:{','.join(names)}:{settings}",
+        tools=tools,
+        factory=lambda: ModelRouter(
+            names=names,
+            models=[MODEL_REGISTRY.get(name, **model_kwargs) for name in names],
+            **(circuit_breaker or {}),
+        ),
+        **model_kwargs,
+    )
+
+
+def load_routed_model(
+    fully_specified_name: str,
+    configuration: Any,
+    tools: Optional[Sequence[Any]] = None,
+) -> BaseChatModel:
+    """
+    Loads a chat model along with the fallbacks and router settings of the configuration.
+
+    Args:
+        fully_specified_name: The model to load, in the format 'provider/model'.
+        configuration: The agent configuration (`model_fallbacks` and the circuit breaker settings).
+        tools: Optional tools to bind to the model.
+
+    Returns:
+        The chat model, or a `ModelRouter` if the model has fallbacks.
+    """
+
+    return load_chat_model(
+        fully_specified_name,
+        tools=tools,
+        fallbacks=configuration.model_fallbacks.get(fully_specified_name),
+        circuit_breaker={
+            "failure_threshold": configuration.circuit_breaker_failures,
+            "reset_timeout": configuration.circuit_breaker_reset,
+            "min_health": configuration.router_min_health,
+        },
+    )
@@ -1 +1,2 @@
 from src.settings.logger import custom_logger
+from src.settings.tracing import configure_tracing, trace_node, tracer
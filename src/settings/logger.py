@@ -1,34 +1,95 @@
-from logging import Logger, Formatter, StreamHandler
-from logging import getLogger
-from logging import DEBUG
+import atexit
+import os
+from logging import Formatter, Handler, Logger, LogRecord, StreamHandler
+from logging import getLevelName, getLogger
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import List
 
 
-def custom_logger(logger_name: str) -> Logger:
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+_listeners: List[QueueListener] = []
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Queue handler deferring the formatting of the records to the listener thread.
+
+    The default `QueueHandler` formats every record before enqueuing it, which would
+    serialize large messages in the caller (e.g. on the event loop).
+    """
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        """Enqueue the record as is, leaving its formatting to the listener."""
+
+        return record
+
+
+def queue_handler(*handlers: Handler) -> QueueHandler:
+    """
+    Create a handler that enqueues records for the given handlers.
+
+    The records are handled by a `QueueListener` running in a background thread, so
+    logging never blocks the caller on I/O. The listener is stopped (flushing the
+    pending records) when the interpreter exits.
+
+    Args:
+        *handlers (Handler): The handlers processing the records in the background.
+
+    Returns:
+        QueueHandler: The handler to attach to the loggers.
+    """
+
+    queue = SimpleQueue()
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    listener.start()
+    if not _listeners:
+        atexit.register(lambda: [listener.stop() for listener in _listeners])
+    _listeners.append(listener)
+    return LazyQueueHandler(queue)
+
+
+_console_handler = None
+
+
+def _get_console_handler() -> QueueHandler:
+    """Return the (shared) queue handler writing to the console."""
+
+    global _console_handler
+    if _console_handler is None:
+        console_handler = StreamHandler()
+        formatter = Formatter(
+            "%(asctime)s - %(name)s%(levelname)s: %(message)s",
+            datefmt="%m/%d/%Y %I:%M:%S%p",
+        )
+        console_handler.setFormatter(formatter)
+        _console_handler = queue_handler(console_handler)
+    return _console_handler
+
+
+def custom_logger(logger_name: str, level: str = None) -> Logger:
     """
     Create and configure a logger with a specified name.
 
     This function initializes a logger with the given name, sets its logging level
-    to DEBUG, and configures a StreamHandler with a specific format for log messages.
-    If the logger does not already have handlers, a new StreamHandler is added.
+    (the `LOG_LEVEL` environment variable, INFO by default), and configures a console
+    handler with a specific format for log messages. Records are written by a background
+    thread, so logging never blocks the caller (e.g. the event loop).
+    If the logger does not already have handlers, the console handler is added.
     The logger's propagation is disabled to prevent logs from being passed to ancestor loggers.
 
     Args:
         logger_name (str): The name to assign to the logger.
+        level (str, optional): The logging level. Defaults to the `LOG_LEVEL` environment variable.
 
     Returns:
         Logger: A configured logger instance with the specified name.
     """
 
     logger = getLogger(f"{logger_name} - ")
-    logger.setLevel(DEBUG)
+    logger.setLevel(getLevelName(level or LOG_LEVEL))
     if not logger.hasHandlers():
-        console_handler = StreamHandler()
-        console_handler.setLevel(DEBUG)
-        formatter = Formatter(
-            "%(asctime)s - %(name)s%(levelname)s: %(message)s",
-            datefmt="%m/%d/%Y %I:%M:%S%p",
-        )
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        logger.addHandler(_get_console_handler())
     logger.propagate = False
     return logger
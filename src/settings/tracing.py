@@ -0,0 +1,283 @@
+"""Structured, level-gated tracing of the graph nodes and LLM calls.
+
+Spans are recorded per node and per LLM call, carrying their duration and attributes
+such as token counts, cache hits or retries. Finished spans are emitted as records of
+the "Tracing" logger: they are only built when its level is enabled (DEBUG by default
+when tracing is configured) and are written by a background thread, either to the
+console or exported as JSON lines or as OpenTelemetry (OTLP/JSON) files.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import time
+from dataclasses import asdict, dataclass, field
+from logging import DEBUG, Handler, LogRecord
+from typing import Any, Callable, Dict, Iterator, Optional
+from contextlib import contextmanager
+
+from src.settings.logger import custom_logger, queue_handler
+
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+@dataclass
+class Span:
+    """A timed operation (graph node, LLM call...) with its attributes."""
+
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str = field(default_factory=lambda: secrets.token_hex(8))
+    parent_id: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+    end_time: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Return the duration of the span in seconds (None while running)."""
+
+        return None if self.end_time is None else self.end_time - self.start_time
+
+    def set(self, **attributes: Any) -> None:
+        """Set attributes of the span (None values are ignored)."""
+
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the span as a JSON-serializable dictionary."""
+
+        return {**asdict(self), "duration": self.duration}
+
+
+class _NoopSpan:
+    """Span returned when tracing is disabled, ignoring every attribute."""
+
+    def set(self, **attributes: Any) -> None:
+        """Ignore the attributes."""
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class JSONLinesExporter(Handler):
+    """Logging handler writing each finished span as a JSON line."""
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize the exporter.
+
+        Args:
+            path (str): Path of the JSON lines file (appended to).
+        """
+
+        super().__init__()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def emit(self, record: LogRecord) -> None:
+        """Write the span of the record."""
+
+        span = getattr(record, "span", None)
+        if span is not None:
+            self._file.write(json.dumps(span.to_dict(), default=str) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        """Close the file."""
+
+        self._file.close()
+        super().close()
+
+
+class OTLPFileExporter(JSONLinesExporter):
+    """
+    Logging handler writing each finished span in the OTLP/JSON format.
+
+    Every line is an `ExportTraceServiceRequest`, as written by the OpenTelemetry
+    collector file exporter, so the file can be loaded by OpenTelemetry tooling.
+    """
+
+    def __init__(self, path: str, service_name: str = "deming-agent") -> None:
+        """
+        Initialize the exporter.
+
+        Args:
+            path (str): Path of the OTLP/JSON file (appended to).
+            service_name (str): The service name reported in the resource attributes.
+        """
+
+        super().__init__(path)
+        self.service_name = service_name
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        """Encode an attribute as an OTLP key-value pair."""
+
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def emit(self, record: LogRecord) -> None:
+        """Write the span of the record as an OTLP/JSON request."""
+
+        span = getattr(record, "span", None)
+        if span is None:
+            return
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 3 if span.kind == "llm" else 1,
+            "startTimeUnixNano": str(int(span.start_time * 1e9)),
+            "endTimeUnixNano": str(int((span.end_time or span.start_time) * 1e9)),
+            "attributes": [
+                self._attribute(key, value) for key, value in span.attributes.items()
+            ]
+            + [self._attribute("span.kind", span.kind)],
+            "status": {"code": 2 if span.status == "error" else 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [self._attribute("service.name", self.service_name)]
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": "deming-agent"}, "spans": [otlp_span]}
+                    ],
+                }
+            ]
+        }
+        self._file.write(json.dumps(request) + "\n")
+        self._file.flush()
+
+
+class Tracer:
+    """Records spans, emitting them through the "Tracing" logger once finished."""
+
+    def __init__(self) -> None:
+        """Initialize the tracer, gated by the level of the "Tracing" logger."""
+
+        self.logger = custom_logger("Tracing")
+
+    @property
+    def enabled(self) -> bool:
+        """Return True if spans are recorded (the "Tracing" logger is enabled for DEBUG)."""
+
+        return self.logger.isEnabledFor(DEBUG)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes: Any) -> Iterator[Any]:
+        """
+        Record a span around a block of code.
+
+        Spans opened within the block (including in tasks created from it) are
+        recorded as its children. When tracing is disabled, a no-op span is returned.
+
+        Args:
+            name (str): The name of the span.
+            kind (str): The kind of operation (e.g. 'node' or 'llm').
+            **attributes: Initial attributes of the span.
+
+        Yields:
+            Span: The span, whose attributes can be set within the block.
+        """
+
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            kind=kind,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            parent_id=parent.span_id if parent else None,
+        )
+        span.set(**attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set(error=repr(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_time = time.time()
+            self.logger.debug(
+                "%s span '%s' finished in %.3fs %s",
+                span.kind,
+                span.name,
+                span.duration,
+                span.attributes,
+                extra={"span": span},
+            )
+
+
+tracer = Tracer()
+
+
+def configure_tracing(exporter: Optional[str] = None) -> None:
+    """
+    Enable tracing, optionally exporting the spans to a file.
+
+    Args:
+        exporter (str, optional): Either 'jsonl:<path>' or 'otlp:<path>'. If None, spans
+            are only written to the console. Defaults to the `TRACE_EXPORT` environment variable.
+    """
+
+    tracer.logger.setLevel(DEBUG)
+    exporter = exporter or os.getenv("TRACE_EXPORT")
+    if not exporter:
+        return
+
+    kind, _, path = exporter.partition(":")
+    if kind == "jsonl":
+        handler = JSONLinesExporter(path)
+    elif kind == "otlp":
+        handler = OTLPFileExporter(path)
+    else:
+        raise ValueError(f"Unknown trace exporter: {exporter}")
+    tracer.logger.addHandler(queue_handler(handler))
+
+
+def trace_node(node: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap a graph node so every execution is recorded as a span.
+
+    Args:
+        node (Callable): The node function, taking the state and the config.
+
+    Returns:
+        Callable: The wrapped (async) node.
+    """
+
+    @functools.wraps(node)
+    async def wrapper(state: Any, config: Any) -> Any:
+        with tracer.span(node.__name__, kind="node") as span:
+            span.set(n_retries=getattr(state, "n_retries", None))
+            result = node(state, config)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+
+    return wrapper
+
+
+if os.getenv("TRACE_EXPORT"):
+    configure_tracing()
@@ -11,3 +11,7 @@ class ActingOutput(BaseModel):
     result: str = Field(
         description="Answer or result to the main task (not the current step) based on the information gathered from all the previous steps. It is not an evaluation, is the content of the answer (e.g a research report)."
     )
+    replan: bool = Field(
+        default=False,
+        description="whether the context changed materially, so the remaining planned steps are no longer valid and a new plan is needed",
+    )
@@ -13,3 +13,7 @@ class CheckingOutput(BaseModel):
     suggestions: Optional[str] = Field(
         description="suggestions to take into account in a re-run if the task failed"
     )
+    confidence: Optional[float] = Field(
+        default=None,
+        description="confidence in the evaluation, from 0 (a guess) to 1 (certain)",
+    )
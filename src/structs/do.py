@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import List
 
 from pydantic import BaseModel, Field
 
@@ -8,3 +8,19 @@ class DoingOutput(BaseModel):
     obstacles: str = Field(
         description="obstacles found during executing the task for further reference"
     )
+
+
+class PatchEdit(BaseModel):
+    find: str = Field(
+        description="the exact passage of the previous result to replace (empty for appending to the result)"
+    )
+    replace: str = Field(description="the revised text replacing the passage")
+
+
+class PatchOutput(BaseModel):
+    edits: List[PatchEdit] = Field(
+        description="the minimal edits revising the previous result, applied in order"
+    )
+    obstacles: str = Field(
+        description="obstacles found during revising the result for further reference"
+    )
@@ -4,6 +4,10 @@ from pydantic import BaseModel, Field
 
 
 class PlanningStep(BaseModel):
+    id: Optional[str] = Field(
+        default=None,
+        description="short unique identifier of the step (e.g. 'step-1'), used by other steps to declare dependencies",
+    )
     step: str = Field(description="short description of the step (action) to take")
     details: str = Field(
         description="details of the step (action) to take in order to provider more context and being more precise"
@@ -11,6 +15,10 @@ class PlanningStep(BaseModel):
     expected_outcome: str = Field(
         description="details of the expected outcome, for being able to evaluate after its success"
     )
+    depends_on: List[str] = Field(
+        default_factory=list,
+        description="ids of the steps whose results are needed before this step can start (empty if it is independent)",
+    )
 
 
 class PlanningOutput(BaseModel):